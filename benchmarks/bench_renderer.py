@@ -0,0 +1,62 @@
+"""
+Micro-benchmark of VK markup rendering on long posts with many links.
+Compares the renderer with the old findall/replace conversion.
+Old conversion is quadratic in count of links, but its greedy pattern merges all links
+of a line into one broken link, so on short posts it does less work than the renderer
+
+Usage:
+    python benchmarks/bench_renderer.py [--links 50 200 1000] [--repeat 5]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram_bot.renderer import render_vk_text
+
+
+def legacy_render(text: str) -> str:
+    """
+    Conversion used by _generate_post before the renderer, without escaping
+    """
+    hyper_links = re.findall(r'(\[.*\|.*\])', text)
+    for link in hyper_links:
+        group_domain, hyper_text = re.findall(r'\[(.*?)\|(.*)\]', link)[0]
+        text = text.replace(link, f'<a href="https://vk.com/{group_domain}">{hyper_text}</a>')
+    return text
+
+
+def make_post(links_count: int) -> str:
+    """
+    Generate post text with given count of vk links, urls and hashtags, one of each per line
+    """
+    lines: List[str] = list()
+    for index in range(links_count):
+        lines.append(
+            f'Line {index} mentions [id{index}|user {index}] & [club{index}|club <{index}>], '
+            f'see https://example.com/page?id={index}&ref=vk. #tag{index}@club{index}'
+        )
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, nargs='+', default=[50, 200, 1000], help='count of links lines in post')
+    parser.add_argument('--repeat', type=int, default=5, help='count of measurements, the best one is shown')
+    args = parser.parse_args()
+
+    print(f'{"lines":>8} {"chars":>10} {"legacy, ms":>12} {"renderer, ms":>14} {"speedup":>8}')
+    for links_count in args.links:
+        text: str = make_post(links_count)
+        number: int = max(1, 2000 // links_count)
+        legacy: float = min(timeit.repeat(lambda: legacy_render(text), number=number, repeat=args.repeat)) / number
+        current: float = min(timeit.repeat(lambda: render_vk_text(text), number=number, repeat=args.repeat)) / number
+        print(f'{links_count:>8} {len(text):>10} {legacy * 1000:>12.3f} {current * 1000:>14.3f} {legacy / current:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
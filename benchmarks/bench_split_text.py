@@ -0,0 +1,103 @@
+"""
+Benchmark of tools.split_text on multi-megabyte posts in telegram HTML markup.
+Checks that every message fits the limit and has balanced tags.
+The old slicing splitter is measured only on inputs up to --legacy-max-mb, it is quadratic
+
+Usage:
+    python benchmarks/bench_split_text.py [--sizes 1 4 16] [--legacy-max-mb 4]
+"""
+import argparse
+import html
+import os
+import random
+import re
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import split_text, utf16_length
+
+TAG = re.compile(r'<[^<>]*>')
+WORDS = [
+    'post', 'text', 'новость', 'группы', '😀', '&amp;', '&lt;3', '\n',
+    '<a href="https://vk.com/wall-1_1?a=1&amp;b=2">link to 😀 post</a>',
+    '<b>bold <i>italic words</i></b>',
+]
+
+
+def legacy_split_text(text: str, first_limit: int, other_limits: int) -> List[str]:
+    """
+    Splitter used before, it copies the rest of text on every message
+    """
+    splited_texts = list()
+    while True:
+        limit = other_limits if splited_texts else first_limit
+        if len(text) > limit:
+            space_index: int = text[:limit].rfind(' ')
+            if space_index == -1:
+                space_index = limit
+            splited_texts.append(text[:space_index])
+            text = text[space_index:].strip()
+        else:
+            splited_texts.append(text)
+            return splited_texts
+
+
+def make_text(size_mb: float) -> str:
+    """
+    Generate text of about given size in megabytes of UTF-8
+    """
+    random.seed(size_mb)
+    words: List[str] = list()
+    size: int = 0
+    while size < size_mb * 1024 * 1024:
+        word: str = random.choice(WORDS)
+        words.append(word)
+        size += len(word.encode()) + 1
+    return ' '.join(words)
+
+
+def check_message(message: str, limit: int) -> None:
+    """
+    Raise AssertionError if message exceeds the limit or tags of message are not balanced
+    """
+    visible: int = utf16_length(html.unescape(TAG.sub('', message)))
+    assert visible <= limit, f'message has {visible} characters, limit is {limit}'
+    depth: int = 0
+    for tag in TAG.findall(message):
+        depth += -1 if tag.startswith('</') else 1
+        assert depth >= 0, 'closing tag without opening tag'
+    assert depth == 0, 'tag is not closed'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='sizes of text in megabytes')
+    parser.add_argument('--first-limit', type=int, default=1000, help='limit of the first message')
+    parser.add_argument('--other-limits', type=int, default=4000, help='limit of other messages')
+    parser.add_argument('--legacy-max-mb', type=float, default=4, help='max size measured with old splitter')
+    args = parser.parse_args()
+
+    print(f'{"size, MB":>9} {"messages":>9} {"split_text, s":>14} {"MB/s":>7} {"legacy, s":>10}')
+    for size_mb in args.sizes:
+        text: str = make_text(size_mb)
+
+        started: float = time.perf_counter()
+        messages: List[str] = list(split_text(text, args.first_limit, args.other_limits))
+        elapsed: float = time.perf_counter() - started
+
+        for index, message in enumerate(messages):
+            check_message(message, args.first_limit if index == 0 else args.other_limits)
+
+        legacy: str = '-'
+        if size_mb <= args.legacy_max_mb:
+            started = time.perf_counter()
+            legacy_split_text(text, args.first_limit, args.other_limits)
+            legacy = f'{time.perf_counter() - started:.3f}'
+        print(f'{size_mb:>9} {len(messages):>9} {elapsed:>14.3f} {size_mb / elapsed:>7.1f} {legacy:>10}')
+
+
+if __name__ == '__main__':
+    main()
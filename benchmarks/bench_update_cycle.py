@@ -0,0 +1,187 @@
+"""
+End-to-end benchmark of update cycle and delivery without network.
+The bot works with synthetic database, fake VK api and fake Telegram Bot API on localhost.
+Each cycle new posts are published in part of groups, then posting() runs and outbox is drained.
+Reports time of update cycle, time until all posts are delivered, sends per second and peak RSS.
+Each scenario runs in a separate process, so its peak RSS is not affected by others
+
+Usage:
+    python benchmarks/bench_update_cycle.py [--scenario small medium large] [--cycles 3]
+    python benchmarks/bench_update_cycle.py --scenario medium --telegram-flood-rate 0.05 --telegram-rate 30
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram import FakeTelegramServer
+from fake_vk import FakeVkServer
+from synthetic_db import DISTRIBUTIONS, generate_database
+from modules.database import SqliteProfile
+from telegram_bot.bot import TelegramBot
+from telegram_bot.delivery import DeliveryScheduler
+
+SCENARIOS: Dict[str, dict] = {
+    'small': {'users': 200, 'groups': 100, 'subscriptions': 5},
+    'medium': {'users': 2000, 'groups': 500, 'subscriptions': 10},
+    'large': {'users': 10000, 'groups': 2000, 'subscriptions': 10},
+}
+# Posts must be delivered in this time, otherwise cycle is reported as unfinished
+DRAIN_TIMEOUT = 600
+
+
+async def wait_outbox_empty(telegram_bot: TelegramBot, timeout: float) -> bool:
+    """
+    Waits until all posts of outbox are delivered, dropped or failed
+
+    Returns:
+        bool: False if outbox is not empty after timeout
+    """
+    deadline: float = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if telegram_bot.outbox.queue_size == 0 and await telegram_bot.database.get_outbox_size() == 0:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def run_scenario(options: dict) -> List[dict]:
+    """
+    Runs cycles of update on new bot, database and fake servers
+
+    Args:
+        options (dict): parameters of scenario, see command line arguments
+
+    Returns:
+        List[dict]: results of each cycle
+    """
+    vk_server = FakeVkServer(
+        options['groups'], photos_per_post=options['photos'], latency=options['vk_latency'],
+        error_rate=options['vk_error_rate'], flood_rate=options['vk_flood_rate'], seed=options['seed'])
+    telegram_server = FakeTelegramServer(
+        latency=options['telegram_latency'], error_rate=options['telegram_error_rate'],
+        flood_rate=options['telegram_flood_rate'], seed=options['seed'])
+    await vk_server.start()
+    await telegram_server.start()
+    results: List[dict] = list()
+    with tempfile.TemporaryDirectory() as directory:
+        database_url: str = f'sqlite:///{os.path.join(directory, "bench.db")}'
+        # Posts which are on walls at start are already seen by users
+        subscriptions_count: int = generate_database(
+            database_url, options['users'], options['groups'], options['subscriptions'], options['distribution'],
+            last_post_id=vk_server.last_post_id, seed=options['seed'])
+        telegram_bot = TelegramBot(
+            database_url, '123456:benchmark', 'benchmark', admin_id=0,
+            update_concurrency=options['update_concurrency'],
+            sqlite_profile=SqliteProfile() if options['sqlite_tuning'] else None,
+            outbox_workers=options['outbox_workers'], fetch_mode=options['fetch_mode'],
+            ingestion_engine=options['ingestion_engine'],
+            telegram_api_url=telegram_server.url, vk_api_url=vk_server.url)
+        # Limits of real VK and Telegram are kept only if they are set
+        telegram_bot.vk_api_parser.requests_delay = 1 / options['vk_rate'] if options['vk_rate'] else 0
+        telegram_rate: float = options['telegram_rate'] or 10 ** 9
+        telegram_bot.delivery = DeliveryScheduler(
+            messages_per_second=telegram_rate,
+            chat_messages_per_second=telegram_rate if not options['telegram_rate'] else 1,
+            metrics=telegram_bot.metrics)
+        await telegram_bot.database.init()
+        await telegram_bot.subscriptions.load()
+        outbox_task: asyncio.Task = asyncio.create_task(telegram_bot.outbox.run())
+        try:
+            for cycle in range(options['cycles']):
+                updated_count: int = vk_server.publish(options['new_posts'], options['posts_per_group'])
+                telegram_server.reset_counters()
+                vk_requests: int = sum(vk_server.requests_count.values())
+                started: float = time.perf_counter()
+                await telegram_bot.posting()
+                cycle_time: float = time.perf_counter() - started
+                is_drained: bool = await wait_outbox_empty(telegram_bot, DRAIN_TIMEOUT)
+                delivery_time: float = time.perf_counter() - started
+                results.append({
+                    'cycle': cycle + 1,
+                    'subscriptions': subscriptions_count,
+                    'updated_groups': updated_count,
+                    'vk_requests': sum(vk_server.requests_count.values()) - vk_requests,
+                    'cycle_time': cycle_time,
+                    'delivery_time': delivery_time if is_drained else float('inf'),
+                    'messages': telegram_server.messages_count,
+                    'telegram_errors': telegram_server.errors_count + telegram_server.flood_errors_count,
+                    'sends_per_second': telegram_server.messages_count / delivery_time,
+                    # Kilobytes on linux
+                    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                })
+        finally:
+            await telegram_bot.outbox.close()
+            await asyncio.gather(outbox_task, return_exceptions=True)
+            await telegram_bot.delivery.close()
+            await telegram_bot.vk_api_parser.close()
+            await (await telegram_bot.bot_api.get_session()).close()
+            await telegram_bot.database.close()
+            await vk_server.close()
+            await telegram_server.close()
+    return results
+
+
+def run_scenario_process(options: dict) -> List[dict]:
+    logging.basicConfig(level=logging.INFO if options['verbose'] else logging.ERROR,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    return asyncio.run(run_scenario(options))
+
+
+def print_results(name: str, results: List[dict]) -> None:
+    print(f'Scenario "{name}", {results[0]["subscriptions"]} subscriptions' if results else f'Scenario "{name}"')
+    print(f'{"cycle":>5} {"groups":>7} {"vk req":>7} {"cycle s":>8} {"deliver s":>9} '
+          f'{"messages":>9} {"errors":>7} {"sends/s":>8} {"peak RSS MB":>11}')
+    for result in results:
+        print(f'{result["cycle"]:>5} {result["updated_groups"]:>7} {result["vk_requests"]:>7} '
+              f'{result["cycle_time"]:>8.2f} {result["delivery_time"]:>9.2f} {result["messages"]:>9} '
+              f'{result["telegram_errors"]:>7} {result["sends_per_second"]:>8.0f} {result["peak_rss_mb"]:>11.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of update cycle with fake VK and Telegram servers')
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=['small', 'medium'], help='scenarios to run')
+    parser.add_argument('--users', type=int, help='count of users, overrides scenario')
+    parser.add_argument('--groups', type=int, help='count of groups, overrides scenario')
+    parser.add_argument('--subscriptions', type=int, help='count of groups of each user, overrides scenario')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='zipf', help='popularity of groups')
+    parser.add_argument('--cycles', type=int, default=3, help='count of update cycles')
+    parser.add_argument('--new-posts', type=float, default=0.2, help='part of groups with new post in each cycle')
+    parser.add_argument('--photos', type=int, default=1, help='count of photos in each post')
+    parser.add_argument('--posts-per-group', type=int, default=1, help='count of new posts of updated group in each cycle')
+    parser.add_argument('--fetch-mode', choices=('latest', 'incremental'), default='latest', help='fetch_mode of bot')
+    parser.add_argument('--ingestion-engine', choices=('wall', 'newsfeed'), default='wall', help='ingestion_engine of bot')
+    parser.add_argument('--update-concurrency', type=int, default=4, help='update_concurrency of bot')
+    parser.add_argument('--outbox-workers', type=int, default=30, help='outbox_workers of bot')
+    parser.add_argument('--sqlite-tuning', action='store_true', help='use sqlite_tuning profile')
+    parser.add_argument('--vk-latency', type=float, default=0.05, help='delay of VK answers in seconds')
+    parser.add_argument('--vk-error-rate', type=float, default=0, help='part of VK requests failed by internal error')
+    parser.add_argument('--vk-flood-rate', type=float, default=0, help='part of VK requests failed by flood error')
+    parser.add_argument('--vk-rate', type=float, default=0, help='VK requests per second limit of bot, 0 is unlimited')
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help='delay of Telegram answers in seconds')
+    parser.add_argument('--telegram-error-rate', type=float, default=0, help='part of sends failed by server error')
+    parser.add_argument('--telegram-flood-rate', type=float, default=0, help='part of sends answered by error 429')
+    parser.add_argument('--telegram-rate', type=float, default=0,
+                        help='messages per second limit of bot, 0 is unlimited, real limit is 30')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random generators')
+    parser.add_argument('--verbose', action='store_true', help='show logs of bot')
+    args = parser.parse_args()
+
+    for scenario_name in args.scenario:
+        scenario_options: dict = dict(vars(args), **SCENARIOS[scenario_name])
+        for key in ('users', 'groups', 'subscriptions'):
+            if getattr(args, key) is not None:
+                scenario_options[key] = getattr(args, key)
+        # New process for each scenario gives own peak RSS
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            scenario_results: List[dict] = executor.submit(run_scenario_process, scenario_options).result()
+        print_results(scenario_name, scenario_results)
@@ -0,0 +1,148 @@
+"""
+Local stand-in of Telegram Bot API for benchmarks. Answers sendMessage, sendPhoto, sendMediaGroup
+and service methods of bot like real api, so aiogram may be pointed to it by TelegramAPIServer.
+Latency, server errors and "too many requests" answers with retry_after may be simulated
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+class FakeTelegramServer:
+    """
+    Telegram Bot API which accepts any token and counts sent messages
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.03,
+        error_rate: float = 0,
+        flood_rate: float = 0,
+        retry_after: int = 1,
+        seed: int = 0
+    ) -> None:
+        """
+        Constructor
+
+        Args:
+            latency (float, optional): delay of each answer in seconds. Defaults to 0.03.
+            error_rate (float, optional): part of sends answered by internal server error. Defaults to 0.
+            flood_rate (float, optional): part of sends answered by error 429. Defaults to 0.
+            retry_after (int, optional): seconds to wait given with error 429. Defaults to 1.
+            seed (int, optional): seed of random generator. Defaults to 0.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests_count: Dict[str, int] = dict()
+        # Count of messages received by users, message of media group is counted for each photo
+        self.messages_count: int = 0
+        self.errors_count: int = 0
+        self.flood_errors_count: int = 0
+        self.__message_ids = itertools.count(1)
+        self.__runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        """
+        Base url for TelegramAPIServer.from_base
+        """
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        """
+        Starts http server, free port is taken if port is 0
+        """
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, host, port)
+        await site.start()
+        self.host, self.port = site._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    def reset_counters(self) -> None:
+        self.requests_count.clear()
+        self.messages_count = 0
+        self.errors_count = 0
+        self.flood_errors_count = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method: str = request.match_info['method'].lower()
+        params: Dict[str, Any] = dict(await request.post())
+        self.requests_count[method] = self.requests_count.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.startswith('send'):
+            if self.random.random() < self.flood_rate:
+                self.flood_errors_count += 1
+                return self.__error(429, f'Too Many Requests: retry after {self.retry_after}',
+                                    {'retry_after': self.retry_after})
+            if self.random.random() < self.error_rate:
+                self.errors_count += 1
+                return self.__error(500, 'Internal Server Error')
+
+        if method == 'getme':
+            return self.__result({'id': 1, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'})
+        if method in ('deletewebhook', 'setwebhook'):
+            return self.__result(True)
+        if method == 'getchat':
+            return self.__result(self.__get_chat(params['chat_id']))
+        if method == 'sendmessage':
+            self.messages_count += 1
+            return self.__result(self.__get_message(params['chat_id'], text=params.get('text', '')))
+        if method == 'sendphoto':
+            self.messages_count += 1
+            return self.__result(self.__get_message(
+                params['chat_id'], caption=params.get('caption'), photo=self.__get_photo(params['photo'])))
+        if method == 'sendmediagroup':
+            media: List[dict] = json.loads(params['media'])
+            self.messages_count += len(media)
+            return self.__result([
+                self.__get_message(params['chat_id'], caption=item.get('caption'), photo=self.__get_photo(item['media']))
+                for item in media
+            ])
+        return self.__error(404, 'Not Found: method not found')
+
+    def __get_message(self, chat_id: str, **fields) -> dict:
+        message: dict = {
+            'message_id': next(self.__message_ids),
+            'date': int(time.time()),
+            'chat': self.__get_chat(chat_id),
+        }
+        message.update({key: value for key, value in fields.items() if value is not None})
+        return message
+
+    @staticmethod
+    def __get_chat(chat_id: str) -> dict:
+        return {'id': int(chat_id), 'type': 'private', 'first_name': f'User {chat_id}', 'username': f'user{chat_id}'}
+
+    @staticmethod
+    def __get_photo(photo: str) -> List[dict]:
+        # Photo sent by url gets new file id, photo sent by file id keeps it
+        file_id: str = photo if photo.startswith('file_') else f'file_{abs(hash(photo))}'
+        return [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 720}]
+
+    @staticmethod
+    def __result(result: Any) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def __error(code: int, description: str, parameters: Optional[dict] = None) -> web.Response:
+        answer: dict = {'ok': False, 'error_code': code, 'description': description}
+        if parameters is not None:
+            answer['parameters'] = parameters
+        return web.json_response(answer, status=code)
@@ -0,0 +1,233 @@
+"""
+Local stand-in of VK api for benchmarks. Serves wall.get, newsfeed.get, groups.getById and execute
+with posts generated in memory, so benchmarks don't need network and VK token.
+Latency, internal errors and flood errors of VK may be simulated
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# Calls inside VKScript code built by BaseApiParser._build_execute_code
+EXECUTE_CALL = re.compile(r'API\.([\w.]+)\((\{[^{}]*\})\)')
+
+WORDS = ['новость', 'группы', 'post', 'text', 'сегодня', '😀', 'фото', 'видео', '&', '<3']
+
+
+class FakeVkError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        self.code = code
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self) -> str:
+        return f'[{self.code}] {self.message}'
+
+
+class FakeVkServer:
+    """
+    VK api with groups named group1, group2, ... which ids are 1, 2, ...
+    Each group starts with initial_posts posts, new posts are added by publish method
+    """
+
+    def __init__(
+        self,
+        groups_count: int,
+        initial_posts: int = 3,
+        photos_per_post: int = 1,
+        text_length: int = 500,
+        pinned_ratio: float = 0.1,
+        latency: float = 0.05,
+        error_rate: float = 0,
+        flood_rate: float = 0,
+        seed: int = 0
+    ) -> None:
+        """
+        Constructor
+
+        Args:
+            groups_count (int): count of groups
+            initial_posts (int, optional): count of posts on each wall at start. Defaults to 3.
+            photos_per_post (int, optional): count of photos attached to post. Defaults to 1.
+            text_length (int, optional): approximate length of post text in chars. Defaults to 500.
+            pinned_ratio (float, optional): part of groups which have old pinned post. Defaults to 0.1.
+            latency (float, optional): delay of each answer in seconds. Defaults to 0.05.
+            error_rate (float, optional): part of requests answered by internal error. Defaults to 0.
+            flood_rate (float, optional): part of requests answered by "too many requests" error. Defaults to 0.
+            seed (int, optional): seed of random generator. Defaults to 0.
+        """
+        self.groups_count = groups_count
+        self.photos_per_post = photos_per_post
+        self.text_length = text_length
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.random = random.Random(seed)
+        # Errors have own generator, so posts don't depend on count of requests
+        self.errors_random = random.Random(seed + 1)
+        self.requests_count: Dict[str, int] = dict()
+        self.__runner: Optional[web.AppRunner] = None
+        self.last_post_id: int = 0
+        # Posts of each group, the newest is the last
+        self.__walls: Dict[int, List[dict]] = {group_id: list() for group_id in range(1, groups_count + 1)}
+        self.__pinned: Dict[int, dict] = dict()
+        for group_id in self.__walls:
+            for _ in range(initial_posts):
+                # Posts which are on walls at start are published a day ago
+                self.__add_post(group_id, int(time.time()) - 86400)
+            if self.__walls[group_id] and self.random.random() < pinned_ratio:
+                self.__pinned[group_id] = dict(self.__walls[group_id][0], is_pinned=1)
+
+    @property
+    def url(self) -> str:
+        """
+        Base url of api methods like https://api.vk.com/method/
+        """
+        return f'http://{self.host}:{self.port}/method/'
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        """
+        Starts http server, free port is taken if port is 0
+        """
+        app = web.Application()
+        app.router.add_post('/method/{method}', self.handle)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, host, port)
+        await site.start()
+        self.host, self.port = site._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    def publish(self, ratio: float, posts_count: int = 1) -> int:
+        """
+        Adds new posts to random groups
+
+        Args:
+            ratio (float): part of groups which get new posts
+            posts_count (int, optional): count of new posts of each group. Defaults to 1.
+
+        Returns:
+            int: count of groups which got new post
+        """
+        group_ids: List[int] = self.random.sample(list(self.__walls), round(self.groups_count * ratio))
+        for group_id in group_ids:
+            for _ in range(posts_count):
+                self.__add_post(group_id, int(time.time()))
+        return len(group_ids)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method: str = request.match_info['method']
+        params: Dict[str, str] = dict(await request.post())
+        self.requests_count[method] = self.requests_count.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            if self.errors_random.random() < self.flood_rate:
+                raise FakeVkError(6, 'Too many requests per second')
+            if self.errors_random.random() < self.error_rate:
+                raise FakeVkError(10, 'Internal server error')
+            response: Any = self.call(method, params)
+        except FakeVkError as e:
+            return web.json_response({'error': {'error_code': e.code, 'error_msg': e.message}})
+        return web.json_response({'response': response}, dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    def call(self, method: str, params: Dict[str, Any]) -> Any:
+        """
+        Return response of api method
+
+        Raises:
+            FakeVkError: called if method is unknown or group does not exist
+        """
+        if method == 'wall.get':
+            return self.wall_get(-int(params['owner_id']), int(params.get('count', 20)), int(params.get('offset', 0)))
+        if method == 'newsfeed.get':
+            source_ids: List[int] = [-int(source_id) for source_id in str(params['source_ids']).split(',')]
+            return self.newsfeed_get(source_ids, int(params.get('start_time', 0)), int(params.get('count', 50)),
+                                     int(params.get('start_from', 0)))
+        if method == 'groups.getById':
+            group_ids: str = str(params.get('group_ids') or params.get('group_id'))
+            return [self.__get_group(group_uniq) for group_uniq in group_ids.split(',')]
+        if method == 'execute':
+            responses: List[Any] = list()
+            for call_method, call_params in EXECUTE_CALL.findall(params['code']):
+                try:
+                    responses.append(self.call(call_method, json.loads(call_params)))
+                except FakeVkError:
+                    # Execute returns false for failed calls
+                    responses.append(False)
+            return responses
+        raise FakeVkError(3, 'Unknown method passed')
+
+    def wall_get(self, group_id: int, count: int, offset: int = 0) -> dict:
+        if group_id not in self.__walls:
+            raise FakeVkError(100, 'One of the parameters specified was missing or invalid')
+        # Pinned post goes first, other posts from the newest
+        posts: List[dict] = list(reversed(self.__walls[group_id]))
+        if group_id in self.__pinned:
+            posts.insert(0, self.__pinned[group_id])
+        return {'count': len(posts), 'items': posts[offset:offset + count]}
+
+    def newsfeed_get(self, group_ids: List[int], start_time: int, count: int, start_from: int = 0) -> dict:
+        # Newsfeed has posts of all groups from the newest, start_from is offset in it
+        posts: List[dict] = [
+            post for group_id in group_ids for post in self.__walls.get(group_id, ()) if post['date'] >= start_time
+        ]
+        posts.sort(key=lambda post: (post['date'], post['id']), reverse=True)
+        items: List[dict] = [
+            {'type': 'post', 'source_id': post['owner_id'], 'post_id': post['id'], 'date': post['date'],
+             'text': post['text'], 'attachments': post['attachments']}
+            for post in posts[start_from:start_from + count]
+        ]
+        response: dict = {'items': items, 'profiles': [], 'groups': []}
+        if start_from + count < len(posts):
+            response['next_from'] = str(start_from + count)
+        return response
+
+    def __get_group(self, group_uniq: str) -> dict:
+        group_id: int = int(group_uniq[5:]) if group_uniq.startswith('group') else int(group_uniq)
+        if group_id not in self.__walls:
+            raise FakeVkError(100, 'One of the parameters specified was missing or invalid')
+        return {
+            'id': group_id,
+            'name': f'Group {group_id}',
+            'screen_name': f'group{group_id}',
+            'is_closed': 0,
+            'photo_200': f'https://example.com/group{group_id}.jpg',
+        }
+
+    def __add_post(self, group_id: int, date: int) -> None:
+        self.last_post_id += 1
+        post_id: int = self.last_post_id
+        words: List[str] = list()
+        length: int = 0
+        while length < self.text_length:
+            word: str = self.random.choice(WORDS)
+            if self.random.random() < 0.02:
+                word = f'[club{self.random.randint(1, self.groups_count)}|ссылка]'
+            words.append(word)
+            length += len(word) + 1
+        photos: List[dict] = [
+            {'type': 'photo', 'photo': {
+                'id': post_id * 10 + index, 'owner_id': -group_id,
+                'sizes': [{'url': f'https://example.com/photo{post_id}_{index}.jpg', 'width': 1280, 'height': 720}],
+            }}
+            for index in range(self.photos_per_post)
+        ]
+        self.__walls[group_id].append({
+            'id': post_id,
+            'from_id': -group_id,
+            'owner_id': -group_id,
+            'date': date,
+            'text': ' '.join(words),
+            'attachments': photos,
+        })
+        # Wall keeps only latest posts to save memory
+        del self.__walls[group_id][:-20]
@@ -0,0 +1,127 @@
+"""
+Generator of synthetic bot database with given count of users, groups and subscriptions.
+Groups are named group1, group2, ... like in fake VK server.
+Popularity of groups is uniform or follows Zipf's law, where a few groups have most of subscribers
+
+Usage:
+    python benchmarks/synthetic_db.py sqlite:///bench.db --users 10000 --groups 2000 --subscriptions 10 --distribution zipf
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Set
+
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.database import Base, Groups, Users, UsersGroup, upgrade_schema
+
+DISTRIBUTIONS = ('uniform', 'zipf')
+# Rows inserted by one statement
+CHUNK_SIZE = 10000
+
+
+def get_group_weights(groups_count: int, distribution: str, zipf_exponent: float = 1.0) -> List[float]:
+    """
+    Return popularity of each group
+
+    Args:
+        groups_count (int): count of groups
+        distribution (str): "uniform" or "zipf"
+        zipf_exponent (float, optional): the more exponent the more popular are the first groups. Defaults to 1.0.
+
+    Raises:
+        ValueError: called if distribution is unknown
+    """
+    if distribution == 'uniform':
+        return [1.0] * groups_count
+    if distribution == 'zipf':
+        return [1 / rank ** zipf_exponent for rank in range(1, groups_count + 1)]
+    raise ValueError(f'Unknown distribution "{distribution}", use one of {DISTRIBUTIONS}')
+
+
+def generate_subscriptions(users_count: int, groups_count: int, subscriptions_per_user: int,
+                           distribution: str = 'uniform', seed: int = 0) -> Dict[int, Set[int]]:
+    """
+    Return ids of groups of each user. Each user has subscriptions_per_user different groups
+
+    Args:
+        users_count (int): count of users, ids are 1, 2, ...
+        groups_count (int): count of groups, ids are 1, 2, ...
+        subscriptions_per_user (int): count of groups of each user
+        distribution (str, optional): popularity of groups, "uniform" or "zipf". Defaults to 'uniform'.
+        seed (int, optional): seed of random generator. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    subscriptions_per_user = min(subscriptions_per_user, groups_count)
+    cumulative_weights: List[float] = list(itertools.accumulate(get_group_weights(groups_count, distribution)))
+    total_weight: float = cumulative_weights[-1]
+    subscriptions: Dict[int, Set[int]] = dict()
+    for user_id in range(1, users_count + 1):
+        group_ids: Set[int] = set()
+        while len(group_ids) < subscriptions_per_user:
+            group_ids.add(bisect.bisect_left(cumulative_weights, rng.random() * total_weight) + 1)
+        subscriptions[user_id] = group_ids
+    return subscriptions
+
+
+def generate_database(database_url: str, users_count: int, groups_count: int, subscriptions_per_user: int,
+                      distribution: str = 'uniform', last_post_id: int = 0, seed: int = 0) -> int:
+    """
+    Creates database of bot and fills it by synthetic users and groups
+
+    Args:
+        database_url (str): url of new database like sqlite:///bench.db
+        users_count (int): count of users
+        groups_count (int): count of groups
+        subscriptions_per_user (int): count of groups of each user
+        distribution (str, optional): popularity of groups, "uniform" or "zipf". Defaults to 'uniform'.
+        last_post_id (int, optional): id of the last post seen by groups and users. Defaults to 0.
+        seed (int, optional): seed of random generator. Defaults to 0.
+
+    Returns:
+        int: count of subscriptions
+    """
+    subscriptions: Dict[int, Set[int]] = generate_subscriptions(
+        users_count, groups_count, subscriptions_per_user, distribution, seed)
+    used_group_ids: Set[int] = set().union(*subscriptions.values())
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+        # Groups without users are deleted by bot, so they are not created
+        groups: List[dict] = [
+            {'group_id': group_id, 'domain': f'group{group_id}', 'name': f'Group {group_id}', 'date_of_last_post': last_post_id}
+            for group_id in sorted(used_group_ids)
+        ]
+        users: List[dict] = [{'user_id': user_id} for user_id in subscriptions]
+        members: List[dict] = [
+            {'user_id': user_id, 'domain': f'group{group_id}', 'last_update_date': last_post_id}
+            for user_id, group_ids in subscriptions.items() for group_id in sorted(group_ids)
+        ]
+        for table, rows in ((Groups, groups), (Users, users), (UsersGroup, members)):
+            for start in range(0, len(rows), CHUNK_SIZE):
+                connection.execute(insert(table), rows[start:start + CHUNK_SIZE])
+    engine.dispose()
+    return len(members)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates database of bot with synthetic subscriptions')
+    parser.add_argument('database_url', help='url of new database, e.g. sqlite:///bench.db')
+    parser.add_argument('--users', type=int, default=1000, help='count of users')
+    parser.add_argument('--groups', type=int, default=200, help='count of groups')
+    parser.add_argument('--subscriptions', type=int, default=5, help='count of groups of each user')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform', help='popularity of groups')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random generator')
+    args = parser.parse_args()
+
+    started: float = time.perf_counter()
+    subscriptions_count: int = generate_database(
+        args.database_url, args.users, args.groups, args.subscriptions, args.distribution, seed=args.seed)
+    print(f'Created {args.users} users and {subscriptions_count} subscriptions in {time.perf_counter() - started:.1f} s')
@@ -1,5 +1,4 @@
 import dataclasses
-from aiogram.types.input_media import MediaGroup
 from typing import Tuple, List, Optional, Dict
 
 @dataclasses.dataclass
@@ -21,6 +20,15 @@ class VkVideo:
     title: str = None
 
 
+@dataclasses.dataclass(frozen=True)
+class VkPhoto:
+    """
+    VK photo with url of the biggest size and stable key like owner_id_id
+    """
+    url: str = None
+    key: str = None
+
+
 @dataclasses.dataclass
 class VkPost:
     """
@@ -31,7 +39,7 @@ class VkPost:
     owner_id: Optional[int] = None
     date: Optional[int] = None
     text: Optional[str] = None
-    photos: Optional[List[str]] = None
+    photos: Optional[List[VkPhoto]] = None
     videos: Optional[List[VkVideo]] = None
     external_link: Optional[VkLink] = None
     is_pinned: bool = False
@@ -58,6 +66,8 @@ class DataBaseGroup:
     group_name: str
     post_date: int
     members: List[int]
+    # Date of the last post received by each member, filled only by bulk loading
+    members_dates: Dict[int, int] = dataclasses.field(default_factory=dict)
 
 @dataclasses.dataclass
 class DataBaseUserGroup:
@@ -73,11 +83,65 @@ class DataBaseUser:
     groups : Optional[List[DataBaseUserGroup]]
 
 @dataclasses.dataclass
+class DataBaseOutboxItem:
+    """
+    Post from outbox waiting for delivery to user
+    """
+    id: int
+    user_id: int
+    domain: str
+    post_key: str
+    post_date: int
+    payload: str
+    attempts: int
+
+@dataclasses.dataclass
+class DataBaseGroupStats:
+    """
+    Posting statistics of group used by adaptive polling
+    """
+    domain: str
+    # Average interval between posts in seconds
+    interval: float
+    # Unix time of the latest seen post
+    last_post_time: int = 0
+    # Unix time of the next poll
+    next_poll_at: int = 0
+
+@dataclasses.dataclass
+class DataBaseFsmRecord:
+    """
+    State of conversation with user saved in database
+    """
+    chat: str
+    user: str
+    state: Optional[str] = None
+    data: Dict = dataclasses.field(default_factory=dict)
+    bucket: Dict = dataclasses.field(default_factory=dict)
+
+@dataclasses.dataclass(frozen=True)
 class TelegramPost:
     """
-    Information about vk group 
+    Rendered post shared by all recipients, so it is immutable
     """
     date: int = None
-    group_name: int = None
-    texts: List[str] = None
-    media: MediaGroup = None
\ No newline at end of file
+    group_name: str = None
+    texts: Tuple[str, ...] = ()
+    # Photos of post, the first text is their caption
+    photos: Tuple[VkPhoto, ...] = ()
+
+@dataclasses.dataclass
+class ProfileReport:
+    """
+    Result of profiled update cycles
+    """
+    # File with profile in pstats format
+    path: str
+    # Total duration of profiled cycles in seconds
+    duration: float
+    # Top functions in text
+    summary: str
+    # Count of cycles joined in the profile
+    cycles_count: int = 1
+    # Profile was requested by admin, not started by settings
+    is_requested: bool = False
@@ -59,6 +59,8 @@ telegram_token = $tg_bot_token
 vk_token = $vk_token
 database_path = sqlite:///databases/release.db
 admin_id = $admin_id
+update_concurrency = 4
+sqlite_tuning = true
 " >> settings.ini
 
 # Offer to run a bot
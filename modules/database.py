@@ -1,12 +1,18 @@
-from typing import List
+import dataclasses
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
 
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import create_engine, event, exists, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine, URL, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 import logging
 
-from data_classes import DataBaseGroup, DataBaseUser, DataBaseUserGroup
+from data_classes import DataBaseFsmRecord, DataBaseGroup, DataBaseGroupStats, DataBaseOutboxItem, DataBaseUser, DataBaseUserGroup
 
 
 Base = declarative_base()
@@ -53,20 +59,30 @@ class DataBaseUsersGroupError(Exception):
     pass
 
 
+class DataBaseSchemaError(Exception):
+    pass
+
+
 class UsersGroup(Base):
     __tablename__ = 'Users_group'
+    __table_args__ = (
+        # Membership lookups go by group and user together
+        Index('ix_Users_group_domain_user_id', 'domain', 'user_id', unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('Users.user_id'))
-    domain = Column(Integer, ForeignKey('Groups.domain'))
+    user_id = Column(Integer, ForeignKey('Users.user_id'), index=True)
+    domain = Column(String, ForeignKey('Groups.domain'))
     last_update_date = Column(Integer, nullable=False)
 
 
 class Groups(Base):
     __tablename__ = 'Groups'
     group_id = Column(Integer, primary_key=True)
-    domain = Column(String, nullable=False)
+    domain = Column(String, nullable=False, unique=True, index=True)
     name = Column(String, nullable=False)
     date_of_last_post = Column(Integer, nullable=False)
+    # Unix time up to which newsfeed of group is read, 0 if newsfeed was not read
+    newsfeed_cursor = Column(Integer, nullable=False, default=0)
 
 
 class Users(Base):
@@ -74,26 +90,220 @@ class Users(Base):
     user_id = Column(Integer, primary_key=True)
 
 
+class MediaFiles(Base):
+    __tablename__ = 'Media_files'
+    # VK photo key like owner_id_id or url of photo
+    photo_key = Column(String, primary_key=True)
+    file_id = Column(String, nullable=False)
+    last_used = Column(Integer, nullable=False, index=True)
+
+
+class GroupStats(Base):
+    __tablename__ = 'Group_stats'
+    domain = Column(String, ForeignKey('Groups.domain'), primary_key=True)
+    interval = Column(Float, nullable=False)
+    last_post_time = Column(Integer, nullable=False)
+    next_poll_at = Column(Integer, nullable=False)
+
+
+class FsmStates(Base):
+    __tablename__ = 'Fsm_states'
+    chat = Column(String, primary_key=True)
+    user = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=False)
+    bucket = Column(Text, nullable=False)
+    updated_at = Column(Integer, nullable=False, index=True)
+
+
+class OutboxPosts(Base):
+    __tablename__ = 'Outbox_posts'
+    # Rendered post shared by all its recipients in outbox
+    post_key = Column(String, primary_key=True)
+    payload = Column(Text, nullable=False)
+    # Time of the last enqueuing, posts without recipients are deleted only when they are old
+    created_at = Column(Integer, nullable=False, default=0)
+
+
+class Outbox(Base):
+    __tablename__ = 'Outbox'
+    __table_args__ = (
+        # Idempotency key, the same post is enqueued for user only once
+        Index('ix_Outbox_user_id_post_key', 'user_id', 'post_key', unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    domain = Column(String, nullable=False)
+    post_key = Column(String, ForeignKey('Outbox_posts.post_key'), nullable=False)
+    post_date = Column(Integer, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(Integer, nullable=False, index=True)
+    # Row is being sent until this time, expired lease means the sender died
+    lease_until = Column(Integer, nullable=False, default=0)
+
+
+@dataclasses.dataclass
+class SqliteProfile:
+    """
+    Pragmas applied to every new SQLite connection
+    """
+    journal_mode: str = 'WAL'
+    synchronous: str = 'NORMAL'
+    # Negative value is the size in KiB, so -64000 is 64 MB of page cache
+    cache_size: int = -64000
+    mmap_size: int = 268435456
+    busy_timeout: int = 5000
+
+    def pragmas(self) -> Dict[str, Union[str, int]]:
+        return dataclasses.asdict(self)
+
+
+def apply_sqlite_profile(engine: Engine, profile: SqliteProfile) -> None:
+    """
+    Registers pragmas of profile for each connection of engine
+
+    Args:
+        engine (Engine): sync engine, for async engine pass its sync_engine
+        profile (SqliteProfile): pragmas values
+    """
+    def set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.pragmas().items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+
+
+def check_sqlite_profile(connection: Connection, profile: SqliteProfile) -> Dict[str, Union[str, int]]:
+    """
+    Reads active pragmas of connection and reports them to log
+
+    Args:
+        connection (Connection): connection to SQLite database
+        profile (SqliteProfile): expected pragmas values
+
+    Returns:
+        Dict[str, Union[str, int]]: active pragmas values
+    """
+    active_pragmas: Dict[str, Union[str, int]] = {
+        pragma: connection.execute(text(f'PRAGMA {pragma}')).scalar()
+        for pragma in profile.pragmas()
+    }
+    log.info(f'SQLite profile: {active_pragmas}')
+    if str(active_pragmas['journal_mode']).upper() != profile.journal_mode.upper():
+        # In-memory databases can't use WAL
+        log.warning(f'SQLite journal mode is "{active_pragmas["journal_mode"]}" instead of "{profile.journal_mode}"')
+    return active_pragmas
+
+
+# Columns added to existing tables by later versions of bot: table -> column -> definition
+ADDED_COLUMNS: Dict[str, Dict[str, str]] = {
+    'Outbox_posts': {'created_at': 'INTEGER NOT NULL DEFAULT 0'},
+    'Groups': {'newsfeed_cursor': 'INTEGER NOT NULL DEFAULT 0'},
+}
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """
+    Brings tables created by previous versions of bot to the current schema in place:
+    fixes type of Users_group.domain, adds missing columns, removes duplicates and creates missing indexes
+
+    Args:
+        connection (Connection): connection inside transaction
+    """
+    inspector = inspect(connection)
+    tables: List[str] = inspector.get_table_names()
+
+    if UsersGroup.__tablename__ in tables:
+        domain_column: dict = next(filter(
+            lambda column: column['name'] == 'domain',
+            inspector.get_columns(UsersGroup.__tablename__)
+        ))
+        if not isinstance(domain_column['type'], String):
+            if connection.dialect.name != 'sqlite':
+                raise DataBaseSchemaError(f'Can not migrate column Users_group.domain on {connection.dialect.name}')
+            log.info('Migrate Users_group table to string domain column')
+            # SQLite can't change column type, so the table is rebuilt
+            for index in inspector.get_indexes(UsersGroup.__tablename__):
+                connection.execute(text(f'DROP INDEX "{index["name"]}"'))
+            connection.execute(text('ALTER TABLE "Users_group" RENAME TO "Users_group_old"'))
+            UsersGroup.__table__.create(connection)
+            connection.execute(text(
+                'INSERT INTO "Users_group" (id, user_id, domain, last_update_date) '
+                'SELECT MIN(id), user_id, CAST(domain AS TEXT), MAX(last_update_date) FROM "Users_group_old" '
+                'GROUP BY domain, user_id'
+            ))
+            connection.execute(text('DROP TABLE "Users_group_old"'))
+            inspector = inspect(connection)
+
+    for table_name, added_columns in ADDED_COLUMNS.items():
+        if table_name not in tables:
+            continue
+        columns: List[str] = [column['name'] for column in inspector.get_columns(table_name)]
+        for column_name, definition in added_columns.items():
+            if column_name not in columns:
+                log.info(f'Add {table_name}.{column_name} column')
+                connection.execute(text(f'ALTER TABLE "{table_name}" ADD COLUMN {column_name} {definition}'))
+
+    # Unique indexes can't be created while table has duplicates
+    connection.execute(text(
+        'DELETE FROM "Groups" WHERE group_id NOT IN (SELECT MIN(group_id) FROM "Groups" GROUP BY domain)'
+    ))
+    connection.execute(text(
+        'DELETE FROM "Users_group" WHERE id NOT IN (SELECT MIN(id) FROM "Users_group" GROUP BY domain, user_id)'
+    ))
+    for table in Base.metadata.sorted_tables:
+        existing_indexes: List[str] = [index['name'] for index in inspector.get_indexes(table.name)]
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                log.info(f'Create index {index.name}')
+                index.create(connection)
+
+
 class Database:
     """
     Сlass for working with the bot's database
     """
 
-    def __init__(self, path_to_database: str) -> None:
+    def __init__(self, path_to_database: str, sqlite_profile: Optional[SqliteProfile] = None) -> None:
         """Constructor"""
         engine = create_engine(path_to_database)
+        if sqlite_profile is not None and engine.dialect.name == 'sqlite':
+            apply_sqlite_profile(engine, sqlite_profile)
         Base.metadata.create_all(engine)
-        self.sql_session = Session(engine)
+        with engine.begin() as connection:
+            upgrade_schema(connection)
+            if sqlite_profile is not None and engine.dialect.name == 'sqlite':
+                check_sqlite_profile(connection, sqlite_profile)
+        self.__bind_session(Session(engine))
+        log.info("DataBase initialized")
+
+    @classmethod
+    def from_session(cls, sql_session: Session) -> 'Database':
+        """
+        Create database object working inside existing session, used by AsyncDatabase
+
+        Args:
+            sql_session (Session): opened session
+
+        Returns:
+            Database: database object without own engine
+        """
+        database = cls.__new__(cls)
+        database.__bind_session(sql_session)
+        return database
+
+    def __bind_session(self, sql_session: Session) -> None:
+        self.sql_session = sql_session
 
         self.groups = Groups
         self.users = Users
         self.users_group = UsersGroup
-        log.info("DataBase initialized")
 
     def is_group_has_member(self, domain: str, user_id: int) -> bool:
-        if not self.is_group_exists(domain) or not self.is_user_exists(user_id):
-            return False
-        return user_id in self.get_group(domain).members
+        return not self.sql_session.query(UsersGroup.id)\
+            .filter(UsersGroup.domain == domain).filter(UsersGroup.user_id == user_id).first() is None
 
     def is_user_exists(self, user_id: int) -> bool:
         return not self.sql_session.query(Users.user_id).filter(Users.user_id == user_id).first() is None
@@ -157,6 +367,44 @@ class Database:
         self.sql_session.add(UsersGroup(domain=domain, user_id=user_id, last_update_date=0))
         self.sql_session.commit()
 
+    def add_subscription(self, domain: str, group_id: int, group_name: str, user_id: int) -> bool:
+        """
+        Subscribes user to group in one transaction, user and group are created if they don't exist.
+        It's safe to call it for the same user or group at the same time, e.g. after double tap
+
+        Args:
+            domain (str): group's short name
+            group_id (int): group id
+            group_name (str): group name
+            user_id (int): telegram id of user
+
+        Returns:
+            bool: False if user is already a member of group
+        """
+        if not isinstance(user_id, int):
+            raise DataBaseTypeError(user_id, int)
+        try:
+            is_added: bool = self.__add_subscription(domain, group_id, group_name, user_id)
+        except IntegrityError:
+            # The same user, group or membership was created by other session between select and insert,
+            # now the rows exist and are not inserted again
+            self.sql_session.rollback()
+            is_added = self.__add_subscription(domain, group_id, group_name, user_id)
+        self.sql_session.commit()
+        return is_added
+
+    def __add_subscription(self, domain: str, group_id: int, group_name: str, user_id: int) -> bool:
+        if not self.is_user_exists(user_id):
+            self.sql_session.add(Users(user_id=user_id))
+        if not self.is_group_exists(domain):
+            self.sql_session.add(Groups(domain=domain, group_id=group_id, date_of_last_post=0, name=group_name))
+        if self.is_group_has_member(domain, user_id):
+            self.sql_session.flush()
+            return False
+        self.sql_session.add(UsersGroup(domain=domain, user_id=user_id, last_update_date=0))
+        self.sql_session.flush()
+        return True
+
     def del_member_of_group(self, domain: str, user_id: int):
         """
         Delete member from group's subscribers
@@ -182,6 +430,9 @@ class Database:
                 f'The user "{user_id}" is not a member of this group "{domain}"')
         self.sql_session.query(UsersGroup)\
             .filter(UsersGroup.domain == domain).filter(UsersGroup.user_id == user_id).delete(False)
+        # Posts of group waiting for delivery are not needed anymore
+        self.sql_session.query(Outbox)\
+            .filter(Outbox.domain == domain).filter(Outbox.user_id == user_id).delete(False)
         self.sql_session.commit()
 
     def get_user(self, user_id: int) -> DataBaseUser:
@@ -250,6 +501,31 @@ class Database:
         for group in groups:
             yield self.get_group(group)
 
+    def load_subscription_snapshot(self) -> List[DataBaseGroup]:
+        """
+        Return all groups with members and date of the last post received by each member.
+        Loads everything by one joined query instead of queries for each group and member
+
+        Returns:
+            List[DataBaseGroup]: list of groups instances with filled members_dates
+        """
+        rows = self.sql_session.query(
+            Groups.domain, Groups.group_id, Groups.name, Groups.date_of_last_post,
+            UsersGroup.user_id, UsersGroup.last_update_date
+        ).outerjoin(UsersGroup, UsersGroup.domain == Groups.domain).order_by(Groups.domain).all()
+
+        groups: Dict[str, DataBaseGroup] = dict()
+        for domain, group_id, name, date_of_last_post, user_id, last_update_date in rows:
+            group: DataBaseGroup = groups.get(domain)
+            if group is None:
+                group = DataBaseGroup(domain, group_id, name, date_of_last_post, [])
+                groups[domain] = group
+            # Group without members has one row with empty member columns
+            if user_id is not None:
+                group.members.append(user_id)
+                group.members_dates[user_id] = last_update_date
+        return list(groups.values())
+
     def get_all_users(self) -> List[DataBaseUser]:
         """
         Return all existed in bot's database groups with information 
@@ -260,13 +536,20 @@ class Database:
         Yields:
             Iterator[List[DataBaseGroup]]: list of groups instances
         """
-        users_ids = list(map(
-            # Extracts the group name from the tuple like ('name',)
-            lambda user: user.user_id,
-            self.sql_session.query(Users).all()
-        ))
-        for user_id in users_ids:
-            yield self.get_user(user_id)
+        # Loads users with their groups by one joined query
+        rows = self.sql_session.query(Users.user_id, UsersGroup.domain, UsersGroup.last_update_date)\
+            .outerjoin(UsersGroup, UsersGroup.user_id == Users.user_id).order_by(Users.user_id).all()
+        users: Dict[int, DataBaseUser] = dict()
+        for user_id, domain, last_update_date in rows:
+            user: DataBaseUser = users.get(user_id)
+            if user is None:
+                user = DataBaseUser(user_id, [])
+                users[user_id] = user
+            # User without groups has one row with empty group columns
+            if domain is not None:
+                user.groups.append(DataBaseUserGroup(domain, last_update_date))
+        for user in users.values():
+            yield user
 
     def update_group_info(self, domain: str, new_post_date: str, new_group_name: str):
         """
@@ -318,6 +601,326 @@ class Database:
 
 
 
+    def bulk_update_user_group_dates(self, domain: str, user_ids: List[int], new_date: int) -> None:
+        """
+        Updates the date of the last group post received by many users at once.
+        All users are updated in one transaction, dates are never moved back
+
+        Args:
+            domain (str): Domain of vk group
+            user_ids (List[int]): Telegram ids of users
+            new_date (int): date received by the users
+        """
+        user_ids = list(user_ids)
+        # Splits ids to stay below SQLite limit of variables in one query
+        for start in range(0, len(user_ids), 500):
+            self.sql_session.query(UsersGroup)\
+                .filter(UsersGroup.domain == domain)\
+                .filter(UsersGroup.user_id.in_(user_ids[start:start + 500]))\
+                .filter(UsersGroup.last_update_date < new_date)\
+                .update({UsersGroup.last_update_date: new_date}, synchronize_session=False)
+        self.sql_session.commit()
+
+    def get_media_files(self, photo_keys: List[str]) -> Dict[str, str]:
+        """
+        Return telegram file ids of uploaded photos and marks them as used
+
+        Args:
+            photo_keys (List[str]): keys of VK photos
+
+        Returns:
+            Dict[str, str]: telegram file ids by keys of found photos
+        """
+        photo_keys = list(photo_keys)
+        media_files: Dict[str, str] = dict()
+        for start in range(0, len(photo_keys), 500):
+            chunk: List[str] = photo_keys[start:start + 500]
+            media_files.update(self.sql_session.query(MediaFiles.photo_key, MediaFiles.file_id)
+                .filter(MediaFiles.photo_key.in_(chunk)).all())
+        if media_files:
+            self.sql_session.query(MediaFiles).filter(MediaFiles.photo_key.in_(list(media_files)))\
+                .update({MediaFiles.last_used: int(time.time())}, synchronize_session=False)
+            self.sql_session.commit()
+        return media_files
+
+    def save_media_files(self, file_ids: Dict[str, str], max_count: int) -> None:
+        """
+        Saves telegram file ids of uploaded photos. Least recently used ones are deleted above max_count
+
+        Args:
+            file_ids (Dict[str, str]): telegram file ids by keys of VK photos
+            max_count (int): max count of saved file ids
+        """
+        now = int(time.time())
+        try:
+            for photo_key, file_id in file_ids.items():
+                self.sql_session.merge(MediaFiles(photo_key=photo_key, file_id=file_id, last_used=now))
+            self.sql_session.flush()
+        except IntegrityError:
+            # The same photo was saved by other worker between select and insert of merge,
+            # now the row exists and merge updates it
+            self.sql_session.rollback()
+            for photo_key, file_id in file_ids.items():
+                self.sql_session.merge(MediaFiles(photo_key=photo_key, file_id=file_id, last_used=now))
+            self.sql_session.flush()
+        extra_count: int = self.sql_session.query(MediaFiles).count() - max_count
+        if extra_count > 0:
+            oldest_keys = self.sql_session.query(MediaFiles.photo_key)\
+                .order_by(MediaFiles.last_used).limit(extra_count).subquery()
+            self.sql_session.query(MediaFiles).filter(MediaFiles.photo_key.in_(select(oldest_keys)))\
+                .delete(synchronize_session=False)
+        self.sql_session.commit()
+
+    def enqueue_post(self, domain: str, post_key: str, payload: str, user_ids: List[int], post_date: int, group_name: str) -> int:
+        """
+        Adds post to outbox for users and updates group info in one transaction,
+        so after restart the post is neither lost nor enqueued again
+
+        Args:
+            domain (str): group's short name
+            post_key (str): unique key of post
+            payload (str): serialized post
+            user_ids (List[int]): Telegram ids of recipients
+            post_date (int): date of post saved as date of the last post of group and recipients
+            group_name (str): new name of group
+
+        Raises:
+            DataBaseGroupError: Called if group is not exists
+
+        Returns:
+            int: count of enqueued recipients, users which already have this post in outbox are skipped
+        """
+        group: Optional[Groups] = self.sql_session.query(Groups).filter(Groups.domain == domain).first()
+        if group is None:
+            raise DataBaseGroupError(domain)
+        user_ids = list(dict.fromkeys(user_ids))
+        queued_ids: set = set()
+        for start in range(0, len(user_ids), 500):
+            queued_ids.update(user_id for user_id, in self.sql_session.query(Outbox.user_id)
+                .filter(Outbox.post_key == post_key)
+                .filter(Outbox.user_id.in_(user_ids[start:start + 500])).all())
+        new_ids: List[int] = [user_id for user_id in user_ids if user_id not in queued_ids]
+        if new_ids:
+            now = int(time.time())
+            self.sql_session.merge(OutboxPosts(post_key=post_key, payload=payload, created_at=now))
+            self.sql_session.add_all([
+                Outbox(user_id=user_id, domain=domain, post_key=post_key, post_date=post_date,
+                       attempts=0, next_attempt_at=now, lease_until=0)
+                for user_id in new_ids
+            ])
+        group.date_of_last_post = post_date
+        group.name = group_name
+        self.sql_session.commit()
+        return len(new_ids)
+
+    def claim_outbox(self, limit: int, lease_time: int) -> List[DataBaseOutboxItem]:
+        """
+        Takes posts ready for delivery and leases them. Only the oldest post of each user may be taken,
+        so user receives posts in order of enqueuing. Posts which lost their payload are deleted,
+        otherwise they would block the next posts of user forever
+
+        Args:
+            limit (int): max count of taken posts
+            lease_time (int): time in seconds after which unfinished post may be taken again
+
+        Returns:
+            List[DataBaseOutboxItem]: leased posts
+        """
+        now = int(time.time())
+        oldest_ids = select(func.min(Outbox.id)).group_by(Outbox.user_id)
+        rows = self.sql_session.query(Outbox, OutboxPosts.payload)\
+            .outerjoin(OutboxPosts, Outbox.post_key == OutboxPosts.post_key)\
+            .filter(Outbox.id.in_(oldest_ids))\
+            .filter(Outbox.next_attempt_at <= now)\
+            .filter(Outbox.lease_until <= now)\
+            .order_by(Outbox.next_attempt_at, Outbox.id)\
+            .limit(limit).all()
+        if not rows:
+            return []
+        lost_ids: List[int] = [row.id for row, payload in rows if payload is None]
+        if lost_ids:
+            log.error(f'Outbox posts {lost_ids} have no payload and are dropped')
+            self.sql_session.query(Outbox).filter(Outbox.id.in_(lost_ids)).delete(synchronize_session=False)
+        rows = [(row, payload) for row, payload in rows if payload is not None]
+        if rows:
+            self.sql_session.query(Outbox).filter(Outbox.id.in_([row.id for row, _ in rows]))\
+                .update({Outbox.lease_until: now + lease_time}, synchronize_session=False)
+        self.sql_session.commit()
+        return [
+            DataBaseOutboxItem(row.id, row.user_id, row.domain, row.post_key, row.post_date, payload, row.attempts)
+            for row, payload in rows
+        ]
+
+    def complete_outbox(self, ids: List[int]) -> None:
+        """
+        Deletes delivered or dropped posts from outbox
+
+        Args:
+            ids (List[int]): ids of outbox rows
+        """
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            self.sql_session.query(Outbox).filter(Outbox.id.in_(ids[start:start + 500]))\
+                .delete(synchronize_session=False)
+        self.sql_session.commit()
+
+    def del_unused_outbox_posts(self, max_created_at: int) -> int:
+        """
+        Deletes posts which have no recipients in outbox. Recently enqueued posts are kept,
+        because their recipients may be added right now by other session
+
+        Args:
+            max_created_at (int): unix time, only posts enqueued earlier are deleted
+
+        Returns:
+            int: count of deleted posts
+        """
+        deleted_count: int = self.sql_session.query(OutboxPosts)\
+            .filter(OutboxPosts.created_at < max_created_at)\
+            .filter(~exists().where(Outbox.post_key == OutboxPosts.post_key))\
+            .delete(synchronize_session=False)
+        self.sql_session.commit()
+        return deleted_count
+
+    def reschedule_outbox(self, next_attempts: Dict[int, int]) -> None:
+        """
+        Returns failed posts to outbox for the next attempt
+
+        Args:
+            next_attempts (Dict[int, int]): unix time of the next attempt by id of outbox row
+        """
+        for outbox_id, next_attempt_at in next_attempts.items():
+            self.sql_session.query(Outbox).filter(Outbox.id == outbox_id).update({
+                Outbox.attempts: Outbox.attempts + 1,
+                Outbox.next_attempt_at: next_attempt_at,
+                Outbox.lease_until: 0,
+            }, synchronize_session=False)
+        self.sql_session.commit()
+
+    def release_outbox(self) -> None:
+        """
+        Releases leases of all posts, called on start when nobody sends them
+        """
+        self.sql_session.query(Outbox).filter(Outbox.lease_until > 0)\
+            .update({Outbox.lease_until: 0}, synchronize_session=False)
+        self.sql_session.commit()
+
+    def get_outbox_size(self) -> int:
+        """
+        Return count of posts waiting for delivery
+        """
+        return self.sql_session.query(Outbox).count()
+
+    def get_newsfeed_cursors(self) -> Dict[int, int]:
+        """
+        Return time up to which newsfeed of groups is read
+
+        Returns:
+            Dict[int, int]: unix time by group id, groups which newsfeed was not read are skipped
+        """
+        return dict(self.sql_session.query(Groups.group_id, Groups.newsfeed_cursor)
+            .filter(Groups.newsfeed_cursor > 0).all())
+
+    def save_newsfeed_cursors(self, cursors: Dict[int, int]) -> None:
+        """
+        Saves time up to which newsfeed of groups is read in one transaction
+
+        Args:
+            cursors (Dict[int, int]): unix time by group id
+        """
+        # Groups read by the same request have the same cursor, so they are saved by one query
+        group_ids: Dict[int, List[int]] = dict()
+        for group_id, cursor in cursors.items():
+            group_ids.setdefault(cursor, list()).append(group_id)
+        for cursor, ids in group_ids.items():
+            for start in range(0, len(ids), 500):
+                self.sql_session.query(Groups).filter(Groups.group_id.in_(ids[start:start + 500]))\
+                    .update({Groups.newsfeed_cursor: cursor}, synchronize_session=False)
+        self.sql_session.commit()
+
+    def get_group_stats(self) -> List[DataBaseGroupStats]:
+        """
+        Return posting statistics of all groups
+
+        Returns:
+            List[DataBaseGroupStats]: statistics of groups which were polled at least once
+        """
+        return [
+            DataBaseGroupStats(row.domain, row.interval, row.last_post_time, row.next_poll_at)
+            for row in self.sql_session.query(GroupStats).all()
+        ]
+
+    def save_group_stats(self, stats: List[DataBaseGroupStats]) -> None:
+        """
+        Saves posting statistics of groups in one transaction
+
+        Args:
+            stats (List[DataBaseGroupStats]): new statistics of groups
+        """
+        for group_stats in stats:
+            self.sql_session.merge(GroupStats(
+                domain=group_stats.domain,
+                interval=group_stats.interval,
+                last_post_time=group_stats.last_post_time,
+                next_poll_at=group_stats.next_poll_at,
+            ))
+        self.sql_session.commit()
+
+    def get_fsm_record(self, chat: str, user: str, min_updated_at: int) -> Optional[DataBaseFsmRecord]:
+        """
+        Return state of conversation with user
+
+        Args:
+            chat (str): id of chat
+            user (str): id of user
+            min_updated_at (int): unix time, older states are expired
+
+        Returns:
+            Optional[DataBaseFsmRecord]: state or None if there is no actual state
+        """
+        row: Optional[FsmStates] = self.sql_session.query(FsmStates)\
+            .filter(FsmStates.chat == chat).filter(FsmStates.user == user)\
+            .filter(FsmStates.updated_at >= min_updated_at).first()
+        if row is None:
+            return None
+        return DataBaseFsmRecord(chat, user, row.state, json.loads(row.data), json.loads(row.bucket))
+
+    def save_fsm_record(self, record: DataBaseFsmRecord) -> None:
+        """
+        Saves state of conversation with user, empty state is deleted
+
+        Args:
+            record (DataBaseFsmRecord): new state
+        """
+        if record.state is None and not record.data and not record.bucket:
+            self.sql_session.query(FsmStates)\
+                .filter(FsmStates.chat == record.chat).filter(FsmStates.user == record.user).delete(False)
+        else:
+            self.sql_session.merge(FsmStates(
+                chat=record.chat,
+                user=record.user,
+                state=record.state,
+                data=json.dumps(record.data, ensure_ascii=False),
+                bucket=json.dumps(record.bucket, ensure_ascii=False),
+                updated_at=int(time.time()),
+            ))
+        self.sql_session.commit()
+
+    def del_expired_fsm_records(self, min_updated_at: int) -> int:
+        """
+        Deletes states of abandoned conversations
+
+        Args:
+            min_updated_at (int): unix time, older states are deleted
+
+        Returns:
+            int: count of deleted states
+        """
+        deleted_count: int = self.sql_session.query(FsmStates)\
+            .filter(FsmStates.updated_at < min_updated_at).delete(False)
+        self.sql_session.commit()
+        return deleted_count
+
     def del_user(self, user_id: int) -> None:
         """
         Delete user from database
@@ -328,8 +931,8 @@ class Database:
         if not self.is_user_exists(user_id):
             raise DataBaseUserError(user_id, f'User "{user_id}" does not exists')
         user_info = self.get_user(user_id)
-        for group_domain in user_info.groups:
-            self.del_member_of_group(group_domain, user_id)
+        for user_group in user_info.groups:
+            self.del_member_of_group(user_group.domain, user_id)
         self.sql_session.query(Users)\
             .filter(Users.user_id == user_id).delete(False)
         self.sql_session.commit()
@@ -345,9 +948,191 @@ class Database:
             raise DataBaseGroupError(domain, f'Group "{domain}" does not exists')
         if self.sql_session.query(UsersGroup).filter(UsersGroup.domain == domain).all():
             raise DataBaseGroupError(domain, "Group has members and can not deleted")
+        self.sql_session.query(GroupStats).filter(GroupStats.domain == domain).delete(False)
         self.sql_session.query(Groups).filter(Groups.domain == domain).delete(False)
         self.sql_session.commit()
 
+
+def get_async_database_url(path_to_database: str) -> URL:
+    """
+    Replaces sync driver in database url by asyncio one
+
+    Args:
+        path_to_database (str): url like sqlite:///databases/release.db
+
+    Returns:
+        URL: url like sqlite+aiosqlite:///databases/release.db
+    """
+    url: URL = make_url(path_to_database)
+    async_drivers: Dict[str, str] = {
+        'sqlite': 'sqlite+aiosqlite',
+        'postgresql': 'postgresql+asyncpg',
+    }
+    if url.drivername in async_drivers:
+        url = url.set(drivername=async_drivers[url.drivername])
+    return url
+
+
+class AsyncDatabase:
+    """
+    Asynchronous variant of Database with the same public methods.
+    Each call is a separate unit of work with own session from connection pool
+    """
+
+    def __init__(self, path_to_database: str, pool_size: int = 5, sqlite_profile: Optional[SqliteProfile] = None) -> None:
+        """
+        Constructor. Call init method before work with database
+
+        Args:
+            path_to_database (str): database url, sqlite and postgresql are supported
+            pool_size (int, optional): count of connections in pool. Defaults to 5.
+            sqlite_profile (Optional[SqliteProfile], optional): pragmas for SQLite connections. Defaults to None.
+        """
+        url: URL = get_async_database_url(path_to_database)
+        self.sqlite_profile: Optional[SqliteProfile] = None
+        if url.get_backend_name() == 'sqlite':
+            self.engine: AsyncEngine = create_async_engine(url)
+            self.sqlite_profile = sqlite_profile
+        else:
+            self.engine: AsyncEngine = create_async_engine(url, pool_size=pool_size, pool_pre_ping=True)
+        if self.sqlite_profile is not None:
+            apply_sqlite_profile(self.engine.sync_engine, self.sqlite_profile)
+        self.__sessionmaker = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def init(self) -> None:
+        """
+        Creates tables and migrates existing ones
+        """
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.run_sync(upgrade_schema)
+            if self.sqlite_profile is not None:
+                await connection.run_sync(check_sqlite_profile, self.sqlite_profile)
+        log.info("DataBase initialized")
+
+    async def close(self) -> None:
+        """
+        Close all connections of pool
+        """
+        await self.engine.dispose()
+
+    async def _run(self, method: Callable, *args) -> Any:
+        """
+        Runs method of Database inside new session
+
+        Args:
+            method (Callable): unbound method of Database class
+
+        Returns:
+            Any: result of method
+        """
+        async with self.__sessionmaker() as session:
+            return await session.run_sync(
+                lambda sql_session: method(Database.from_session(sql_session), *args))
+
+    async def is_group_has_member(self, domain: str, user_id: int) -> bool:
+        return await self._run(Database.is_group_has_member, domain, user_id)
+
+    async def is_user_exists(self, user_id: int) -> bool:
+        return await self._run(Database.is_user_exists, user_id)
+
+    async def is_group_exists(self, domain: str) -> bool:
+        return await self._run(Database.is_group_exists, domain)
+
+    async def create_group(self, domain: str, group_id: int, group_name: str) -> None:
+        await self._run(Database.create_group, domain, group_id, group_name)
+
+    async def create_user(self, user_id: int) -> None:
+        await self._run(Database.create_user, user_id)
+
+    async def add_member_to_group(self, domain: str, user_id: int) -> None:
+        await self._run(Database.add_member_to_group, domain, user_id)
+
+    async def add_subscription(self, domain: str, group_id: int, group_name: str, user_id: int) -> bool:
+        return await self._run(Database.add_subscription, domain, group_id, group_name, user_id)
+
+    async def del_member_of_group(self, domain: str, user_id: int) -> None:
+        await self._run(Database.del_member_of_group, domain, user_id)
+
+    async def get_user(self, user_id: int) -> DataBaseUser:
+        return await self._run(Database.get_user, user_id)
+
+    async def get_group(self, domain: str) -> DataBaseGroup:
+        return await self._run(Database.get_group, domain)
+
+    async def get_all_groups(self) -> List[DataBaseGroup]:
+        return await self._run(lambda database: list(database.get_all_groups()))
+
+    async def load_subscription_snapshot(self) -> List[DataBaseGroup]:
+        return await self._run(Database.load_subscription_snapshot)
+
+    async def get_all_users(self) -> List[DataBaseUser]:
+        return await self._run(lambda database: list(database.get_all_users()))
+
+    async def update_group_info(self, domain: str, new_post_date: str, new_group_name: str) -> None:
+        await self._run(Database.update_group_info, domain, new_post_date, new_group_name)
+
+    async def update_user_group_date(self, user_id: int, domain: str, new_date: int) -> None:
+        await self._run(Database.update_user_group_date, user_id, domain, new_date)
+
+    async def bulk_update_user_group_dates(self, domain: str, user_ids: List[int], new_date: int) -> None:
+        await self._run(Database.bulk_update_user_group_dates, domain, list(user_ids), new_date)
+
+    async def get_media_files(self, photo_keys: List[str]) -> Dict[str, str]:
+        return await self._run(Database.get_media_files, list(photo_keys))
+
+    async def save_media_files(self, file_ids: Dict[str, str], max_count: int) -> None:
+        await self._run(Database.save_media_files, dict(file_ids), max_count)
+
+    async def enqueue_post(self, domain: str, post_key: str, payload: str, user_ids: List[int], post_date: int, group_name: str) -> int:
+        return await self._run(Database.enqueue_post, domain, post_key, payload, list(user_ids), post_date, group_name)
+
+    async def claim_outbox(self, limit: int, lease_time: int) -> List[DataBaseOutboxItem]:
+        return await self._run(Database.claim_outbox, limit, lease_time)
+
+    async def complete_outbox(self, ids: List[int]) -> None:
+        await self._run(Database.complete_outbox, list(ids))
+
+    async def del_unused_outbox_posts(self, max_created_at: int) -> int:
+        return await self._run(Database.del_unused_outbox_posts, max_created_at)
+
+    async def reschedule_outbox(self, next_attempts: Dict[int, int]) -> None:
+        await self._run(Database.reschedule_outbox, dict(next_attempts))
+
+    async def release_outbox(self) -> None:
+        await self._run(Database.release_outbox)
+
+    async def get_outbox_size(self) -> int:
+        return await self._run(Database.get_outbox_size)
+
+    async def get_newsfeed_cursors(self) -> Dict[int, int]:
+        return await self._run(Database.get_newsfeed_cursors)
+
+    async def save_newsfeed_cursors(self, cursors: Dict[int, int]) -> None:
+        await self._run(Database.save_newsfeed_cursors, dict(cursors))
+
+    async def get_group_stats(self) -> List[DataBaseGroupStats]:
+        return await self._run(Database.get_group_stats)
+
+    async def save_group_stats(self, stats: List[DataBaseGroupStats]) -> None:
+        await self._run(Database.save_group_stats, list(stats))
+
+    async def get_fsm_record(self, chat: str, user: str, min_updated_at: int) -> Optional[DataBaseFsmRecord]:
+        return await self._run(Database.get_fsm_record, chat, user, min_updated_at)
+
+    async def save_fsm_record(self, record: DataBaseFsmRecord) -> None:
+        await self._run(Database.save_fsm_record, record)
+
+    async def del_expired_fsm_records(self, min_updated_at: int) -> int:
+        return await self._run(Database.del_expired_fsm_records, min_updated_at)
+
+    async def del_user(self, user_id: int) -> None:
+        await self._run(Database.del_user, user_id)
+
+    async def del_group(self, domain: str) -> None:
+        await self._run(Database.del_group, domain)
+
+
 if __name__ == "__main__":
 
     logging.basicConfig(
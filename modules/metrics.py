@@ -0,0 +1,252 @@
+import abc
+import bisect
+import contextlib
+import logging
+import math
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class MetricsError(Exception):
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs: List[str] = list()
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Metric(abc.ABC):
+    """
+    Base of metrics with labels, values are kept by tuple of label values
+    """
+    type_name = ''
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names: Tuple[str, ...] = tuple(label_names)
+
+    def _get_label_values(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise MetricsError(f'Metric {self.name} has labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines: List[str] = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._render_samples())
+        return lines
+
+    @abc.abstractmethod
+    def _render_samples(self) -> List[str]:
+        """
+        Return lines with values of metric in Prometheus text format
+        """
+
+
+class Counter(_Metric):
+    """
+    Value which only grows, like count of requests
+    """
+    type_name = 'counter'
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, help, label_names)
+        self.__values: Dict[LabelValues, float] = dict()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        label_values: LabelValues = self._get_label_values(labels)
+        self.__values[label_values] = self.__values.get(label_values, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.__values.get(self._get_label_values(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        return [
+            f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}'
+            for label_values, value in self.__values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Value which may go up and down, like size of queue. Value may be read by function at the moment of scrape
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, help, label_names)
+        self.__values: Dict[LabelValues, float] = dict()
+        self.__functions: Dict[LabelValues, Callable[[], float]] = dict()
+
+    def set(self, value: float, **labels) -> None:
+        self.__values[self._get_label_values(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels) -> None:
+        self.__functions[self._get_label_values(labels)] = function
+
+    def get(self, **labels) -> float:
+        label_values: LabelValues = self._get_label_values(labels)
+        if label_values in self.__functions:
+            return self.__functions[label_values]()
+        return self.__values.get(label_values, 0)
+
+    def _render_samples(self) -> List[str]:
+        values: Dict[LabelValues, float] = dict(self.__values)
+        for label_values, function in self.__functions.items():
+            try:
+                values[label_values] = function()
+            except Exception as e:
+                logging.error(f'Can not read metric {self.name}: {e}')
+        return [
+            f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}'
+            for label_values, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of values like durations of requests in buckets
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, label_names)
+        if 'le' in self.label_names:
+            raise MetricsError(f'Histogram {name} can not have label "le"')
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (counts of buckets, sum of values)
+        self.__values: Dict[LabelValues, Tuple[List[int], List[float]]] = dict()
+
+    def observe(self, value: float, **labels) -> None:
+        label_values: LabelValues = self._get_label_values(labels)
+        if label_values not in self.__values:
+            self.__values[label_values] = ([0] * len(self.buckets), [0.0])
+        counts, total = self.__values[label_values]
+        # The first bucket which upper bound is not less than value
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Observes duration of code block in seconds, errors are observed too
+        """
+        started: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get_count(self, **labels) -> int:
+        counts: List[int] = self.__values.get(self._get_label_values(labels), ([0], [0.0]))[0]
+        return sum(counts)
+
+    def _render_samples(self) -> List[str]:
+        lines: List[str] = list()
+        label_names: Tuple[str, ...] = self.label_names + ('le',)
+        for label_values, (counts, total) in self.__values.items():
+            cumulative_count: int = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative_count += count
+                labels: str = _format_labels(label_names, label_values + (_format_value(bucket),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative_count}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total[0])}')
+            lines.append(f'{self.name}_count{labels} {cumulative_count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Set of metrics rendered in Prometheus text format.
+    Metric with the same name is created once, so components may share it
+    """
+
+    def __init__(self) -> None:
+        self.__metrics: Dict[str, _Metric] = dict()
+
+    def counter(self, name: str, help: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.__get_or_create(Counter, name, help, label_names)
+
+    def gauge(self, name: str, help: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.__get_or_create(Gauge, name, help, label_names)
+
+    def histogram(self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.__get_or_create(Histogram, name, help, label_names, buckets)
+
+    def render(self) -> str:
+        """
+        Return all metrics in Prometheus text format
+        """
+        lines: List[str] = list()
+        for metric in self.__metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def __get_or_create(self, metric_class: type, name: str, help: str, label_names: Sequence[str], *args) -> _Metric:
+        metric: Optional[_Metric] = self.__metrics.get(name)
+        if metric is None:
+            metric = metric_class(name, help, label_names, *args)
+            self.__metrics[name] = metric
+        elif not isinstance(metric, metric_class) or metric.label_names != tuple(label_names):
+            raise MetricsError(f'Metric {name} is already registered with other type or labels')
+        return metric
+
+
+class MetricsServer:
+    """
+    Http server which gives metrics for Prometheus on /metrics
+    """
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+        self.__runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str, port: int) -> None:
+        """
+        Starts http server
+
+        Args:
+            host (str): address to listen
+            port (int): port to listen
+        """
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+        logging.info(f'Metrics are available on http://{host}:{port}/metrics')
+
+    async def close(self) -> None:
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
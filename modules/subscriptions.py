@@ -0,0 +1,184 @@
+import logging
+from typing import Dict, List, Set
+
+from data_classes import DataBaseGroup, DataBaseUser, DataBaseUserGroup
+from modules.database import AsyncDatabase, DataBaseGroupError, DataBaseUserError
+
+
+class SubscriptionIndex:
+    """
+    In-memory copy of groups and subscriptions from database.
+    Read-only queries are answered from memory, writes go to database first and then to memory
+    """
+
+    def __init__(self, database: AsyncDatabase) -> None:
+        """
+        Constructor. Call load method before use
+
+        Args:
+            database (AsyncDatabase): durable storage of subscriptions
+        """
+        self.database = database
+        # domain -> group information without members
+        self.__groups: Dict[str, DataBaseGroup] = dict()
+        # domain -> ids of members
+        self.__members: Dict[str, Set[int]] = dict()
+        # user id -> {domain: date of the last post received by user}
+        self.__users: Dict[int, Dict[str, int]] = dict()
+
+    async def load(self) -> None:
+        """
+        Loads all groups, users and subscriptions from database
+        """
+        groups: List[DataBaseGroup] = await self.database.load_subscription_snapshot()
+        users: List[DataBaseUser] = await self.database.get_all_users()
+        self.__groups = {
+            group.domain: DataBaseGroup(group.domain, group.id, group.group_name, group.post_date, [])
+            for group in groups
+        }
+        self.__members = {group.domain: set(group.members) for group in groups}
+        self.__users = {
+            user.user_id: {user_group.domain: user_group.last_update_date for user_group in user.groups}
+            for user in users
+        }
+        logging.info(f'Subscription index loaded {len(self.__groups)} groups and {len(self.__users)} users')
+
+    def is_user_exists(self, user_id: int) -> bool:
+        return user_id in self.__users
+
+    def is_group_exists(self, domain: str) -> bool:
+        return domain in self.__groups
+
+    def is_group_has_member(self, domain: str, user_id: int) -> bool:
+        return user_id in self.__members.get(domain, ())
+
+    def get_user(self, user_id: int) -> DataBaseUser:
+        """get information about user subscribes
+
+        Args:
+            user_id (int): telegram user id
+
+        Raises:
+            DataBaseUserError: called if the user is don't exists in the bot database
+
+        Returns:
+            DataBaseUser: user object with arguments "user_id" and "groups"
+        """
+        if user_id not in self.__users:
+            raise DataBaseUserError(user_id)
+        return DataBaseUser(user_id, [
+            DataBaseUserGroup(domain, last_update_date)
+            for domain, last_update_date in self.__users[user_id].items()
+        ])
+
+    def get_group(self, domain: str) -> DataBaseGroup:
+        """
+        Return information about group like a domain, group id, linux time of last post and members ids
+
+        Args:
+            domain (str): short group's name
+
+        Raises:
+            DataBaseGroupError: Called if group is not exist in bot's database
+
+        Returns:
+            DataBaseGroup: group instance with filled members_dates
+        """
+        if domain not in self.__groups:
+            raise DataBaseGroupError(domain)
+        group: DataBaseGroup = self.__groups[domain]
+        members_dates: Dict[int, int] = {
+            user_id: self.__users[user_id][domain] for user_id in self.__members[domain]
+        }
+        return DataBaseGroup(domain, group.id, group.group_name, group.post_date, list(members_dates), members_dates)
+
+    def get_last_update_date(self, user_id: int, domain: str) -> int:
+        """
+        Return date of the last post of group received by user, 0 if user is not a member of group
+        """
+        return self.__users.get(user_id, dict()).get(domain, 0)
+
+    def get_all_users_ids(self) -> List[int]:
+        return list(self.__users)
+
+    def get_all_domains(self) -> Set[str]:
+        return set(self.__groups)
+
+    async def create_user(self, user_id: int) -> None:
+        await self.database.create_user(user_id)
+        self.__users[user_id] = dict()
+
+    async def create_group(self, domain: str, group_id: int, group_name: str) -> None:
+        await self.database.create_group(domain, group_id, group_name)
+        self.__groups[domain] = DataBaseGroup(domain, group_id, group_name, 0, [])
+        self.__members[domain] = set()
+
+    async def add_member_to_group(self, domain: str, user_id: int) -> None:
+        await self.database.add_member_to_group(domain, user_id)
+        self.__members[domain].add(user_id)
+        self.__users[user_id][domain] = 0
+
+    async def add_subscription(self, domain: str, group_id: int, group_name: str, user_id: int) -> bool:
+        """
+        Subscribes user to group, user and group are created if they don't exist
+
+        Args:
+            domain (str): group's short name
+            group_id (int): group id
+            group_name (str): group name
+            user_id (int): telegram id of user
+
+        Returns:
+            bool: False if user is already a member of group
+        """
+        is_added: bool = await self.database.add_subscription(domain, group_id, group_name, user_id)
+        # Concurrent calls may both get here, so existing entries are kept
+        if domain not in self.__groups:
+            self.__groups[domain] = DataBaseGroup(domain, group_id, group_name, 0, [])
+        self.__members.setdefault(domain, set()).add(user_id)
+        self.__users.setdefault(user_id, dict()).setdefault(domain, 0)
+        return is_added
+
+    async def del_member_of_group(self, domain: str, user_id: int) -> None:
+        await self.database.del_member_of_group(domain, user_id)
+        self.__members[domain].discard(user_id)
+        self.__users[user_id].pop(domain, None)
+
+    async def del_user(self, user_id: int) -> None:
+        await self.database.del_user(user_id)
+        for domain in self.__users.pop(user_id, dict()):
+            self.__members[domain].discard(user_id)
+
+    async def del_group(self, domain: str) -> None:
+        await self.database.del_group(domain)
+        self.__groups.pop(domain, None)
+        self.__members.pop(domain, None)
+
+    async def update_group_info(self, domain: str, new_post_date: int, new_group_name: str) -> None:
+        await self.database.update_group_info(domain, new_post_date, new_group_name)
+        group: DataBaseGroup = self.__groups[domain]
+        group.post_date = new_post_date
+        group.group_name = new_group_name
+
+    async def enqueue_post(self, domain: str, post_key: str, payload: str, user_ids: List[int], post_date: int, group_name: str) -> int:
+        enqueued_count: int = await self.database.enqueue_post(domain, post_key, payload, user_ids, post_date, group_name)
+        group: DataBaseGroup = self.__groups[domain]
+        group.post_date = post_date
+        group.group_name = group_name
+        return enqueued_count
+
+    async def update_user_group_date(self, user_id: int, domain: str, new_date: int) -> None:
+        await self.database.update_user_group_date(user_id, domain, new_date)
+        self.__set_user_group_date(user_id, domain, new_date)
+
+    async def bulk_update_user_group_dates(self, domain: str, user_ids: List[int], new_date: int) -> None:
+        user_ids = list(user_ids)
+        await self.database.bulk_update_user_group_dates(domain, user_ids, new_date)
+        for user_id in user_ids:
+            self.__set_user_group_date(user_id, domain, new_date)
+
+    def __set_user_group_date(self, user_id: int, domain: str, new_date: int) -> None:
+        # Same rule as in database, dates are never moved back
+        user_groups: Dict[str, int] = self.__users.get(user_id, dict())
+        if domain in user_groups and user_groups[domain] < new_date:
+            user_groups[domain] = new_date
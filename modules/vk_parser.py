@@ -1,8 +1,13 @@
+import asyncio
 import time
+from collections import OrderedDict
+import json
 import logging
-from typing import Tuple, List, Optional, Dict, Union
+from typing import Any, Tuple, List, Optional, Dict, Set, Union
+import aiohttp
 from vk_api import vk_api
-from data_classes import VkGroup, VkLink, VkPost, VkVideo
+from data_classes import VkGroup, VkLink, VkPhoto, VkPost, VkVideo
+from modules.metrics import MetricsRegistry
 import requests
 
 class VkGroupInfoError(Exception):
@@ -27,63 +32,180 @@ class VkGroupPostError(Exception):
             return self.message
 
 
-class ApiParser:
+class VkApiError(Exception):
+    def __init__(self, code: int, message: str = None) -> None:
+        self.code = code
+        self.message = message
+
+    def __str__(self) -> str:
+        # Same format as vk_api errors, so '[100]' checks work for both parsers
+        return f'[{self.code}] {self.message}'
+
+
+class GroupInfoCache:
     """
-    Api parser for work with VK
+    Cache of groups information with time to live and eviction of least recently used groups.
+    Each group is available both by domain and by numeric id
     """
 
-    def __init__(self, token: str) -> None:
+    def __init__(self, ttl: float = 21600, max_size: int = 10000) -> None:
         """
         Constructor
+
+        Args:
+            ttl (float, optional): time in seconds after which group information is outdated. Defaults to 21600.
+            max_size (int, optional): max count of stored groups. Defaults to 10000.
         """
-        vk_session = vk_api.VkApi(token=token)
-        self.__api = vk_session.get_api()
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        # group id -> (time of saving, group information)
+        self.__groups: OrderedDict[int, Tuple[float, VkGroup]] = OrderedDict()
+        # domain -> group id
+        self.__domains: Dict[str, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self.__groups)
+
+    def __contains__(self, group_uniq: Union[int, str]) -> bool:
+        """
+        Checks that group is cached and not outdated. Unlike get, it doesn't count hits and misses
+        and doesn't change order of eviction
 
-    def get_last_group_post(self, group_id: int) -> VkPost:
-        """Get lastest post from vk group
+        Args:
+            group_uniq (Union[int, str]): group id or domain
+        """
+        cached: Optional[Tuple[float, VkGroup]] = self.__groups.get(self.__get_group_id(group_uniq))
+        return cached is not None and time.monotonic() - cached[0] <= self.ttl
+
+    def get(self, group_uniq: Union[int, str]) -> Optional[VkGroup]:
+        """
+        Return information about group if it is cached and not outdated
 
         Args:
-            group_id (int): current group id
+            group_uniq (Union[int, str]): group id or domain
 
         Returns:
-            VkPost: VK group post instance
+            Optional[VkGroup]: VK group information instance
         """
-        group_posts = self.get_group_posts(group_id)
-        if len(group_posts) == 1:   # If group have only 1 post
-            return group_posts[0]
-        elif group_posts[0].id > group_posts[1].id:
-            return group_posts[0]
-        else:
-            return group_posts[1]
+        group_id: Optional[int] = self.__get_group_id(group_uniq)
+        cached: Optional[Tuple[float, VkGroup]] = self.__groups.get(group_id)
+        if cached is None or time.monotonic() - cached[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.__groups.move_to_end(group_id)
+        self.hits += 1
+        return cached[1]
+
+    def put(self, group: VkGroup) -> None:
+        """
+        Saves information about group
 
-    def get_group_posts(self, group_id: int, posts_count: int = 3) -> Tuple[VkPost,]:
-        """Receives posts from groups that do not contain advertising.
-        May return fewer posts than specified in posts_count
+        Args:
+            group (VkGroup): VK group information instance
+        """
+        self.__groups[group.id] = (time.monotonic(), group)
+        self.__groups.move_to_end(group.id)
+        if group.domain:
+            self.__domains[group.domain.lower()] = group.id
+        while len(self.__groups) > self.max_size:
+            _, (_, evicted_group) = self.__groups.popitem(last=False)
+            if evicted_group.domain and self.__domains.get(evicted_group.domain.lower()) == evicted_group.id:
+                del self.__domains[evicted_group.domain.lower()]
+
+    def __get_group_id(self, group_uniq: Union[int, str]) -> Optional[int]:
+        if isinstance(group_uniq, int):
+            return group_uniq
+        if group_uniq.isdigit():
+            return int(group_uniq)
+        return self.__domains.get(group_uniq.lower())
+
+
+class BaseApiParser:
+    """
+    Parsing of VK responses shared by sync and async api parsers
+    """
+    # VK allows no more than 25 API calls inside one execute request
+    execute_calls_limit = 25
+    # groups.getById accepts no more than 500 ids
+    group_ids_limit = 500
+
+    @staticmethod
+    def _build_execute_code(calls: List[Tuple[str, Dict]]) -> str:
+        """
+        Build VKScript code for execute method which returns the list of calls results
 
         Args:
-            group_id (int): current group id
-            posts_count (int, optional): max count of parsed posts. Defaults to 3.
+            calls (List[Tuple[str, Dict]]): pairs of API method name and its parameters
+
+        Returns:
+            str: VKScript code
+        """
+        api_calls: List[str] = [f'API.{method}({json.dumps(params)})' for method, params in calls]
+        return f'return [{", ".join(api_calls)}];'
+
+    @staticmethod
+    def _parse_group_info(response: Dict) -> VkGroup:
+        """
+        Pack groups.getById response item into VkGroup object
+
+        Args:
+            response (Dict): group from groups.getById response
+
+        Returns:
+            VkGroup: VK group information instance
+        """
+        return VkGroup(
+            id=response.get('id'),
+            group_name=response.get('name'),
+            is_closed=response.get('is_closed') != 0,
+            domain=response.get('screen_name'),
+            photo=response.get('photo_200')
+        )
+
+    @staticmethod
+    def _get_groups_list(response: Union[List[Dict], Dict]) -> List[Dict]:
+        """
+        Return list of groups from groups.getById response.
+        Newer versions of api wrap the list into 'groups' field
+
+        Args:
+            response (Union[List[Dict], Dict]): groups.getById response
+
+        Returns:
+            List[Dict]: list of groups
+        """
+        if isinstance(response, dict):
+            return response.get('groups', [])
+        return response
+
+    def _parse_wall_response(self, response: Dict) -> Tuple[VkPost,]:
+        """
+        Filter out ads from wall.get response and pack posts into VkPost objects
+
+        Args:
+            response (Dict): wall.get response
 
         Returns:
             Tuple[VkPost]: tuple of VK post instances
         """
-        for i in range(10):
-            try:
-                # Gather posts via VkApi
-                response: dict = self.__api.wall.get(
-                    owner_id=f'-{group_id}', count=posts_count)
-                # with open('response.json', 'w') as f:
-                #     json.dump(response, f)
-                break
-            except requests.ConnectionError:
-                logging.error('Connection error, wait a minute')
-                time.sleep(60)
+        return self._parse_raw_posts(response.get('items'))
+
+    def _parse_raw_posts(self, raw_posts: List[Dict]) -> Tuple[VkPost,]:
+        """
+        Filter out ads from raw posts and pack them into VkPost objects
+
+        Args:
+            raw_posts (List[Dict]): posts from wall.get response
 
+        Returns:
+            Tuple[VkPost]: tuple of VK post instances
+        """
         # Filter out ads
-        received_raw_posts: List[Dict] = response.get('items')
         raw_posts_without_ads: List[Dict] = list(filter(
             lambda post: not post.get('marked_as_ads'),
-            received_raw_posts
+            raw_posts
         ))
         # Pack data into VkPost objects
         posts: Tuple[VkPost] = tuple(map(
@@ -93,32 +215,30 @@ class ApiParser:
 
         return posts
 
-    def get_group_info(self, group_uniq: Union[int, str]) -> VkGroup:
-        """Get information about group
+    @staticmethod
+    def _collect_new_raw_posts(raw_posts: List[Dict], last_post_id: int, new_raw_posts: Dict[int, Dict]) -> bool:
+        """
+        Collects posts published after the last seen post from a page of wall
 
         Args:
-            group_uniq (str): group short name
-
-        Raises:
-            VkGroupInfoError: called when group not exists
+            raw_posts (List[Dict]): page of wall from wall.get response, pinned post goes first, others from the newest
+            last_post_id (int): id of the last seen post
+            new_raw_posts (Dict[int, Dict]): new posts by id, filled by this method
 
         Returns:
-            VkGroup: VK group information instance
+            bool: True if the seen post is reached and the next pages are not needed
         """
-        try:
-            response: dict = self.__api.groups.getById(group_id=group_uniq)[0]
-            return VkGroup(
-                id=response.get('id'),
-                group_name=response.get('name'),
-                is_closed=response.get('is_closed') != 0,
-                domain=response.get('screen_name'),
-                photo=response.get('photo_200')
-            )
-        except Exception as exception:
-            if '[100]' in str(exception):
-                raise VkGroupInfoError(
-                    f'Group with domain "{group_uniq}" does not exists').with_traceback(None)
-            raise exception.with_traceback(None)
+        for raw_post in raw_posts:
+            post_id: int = raw_post.get('id')
+            # Pinned post is out of order, it may be older or newer than others
+            if raw_post.get('is_pinned'):
+                if post_id > last_post_id:
+                    new_raw_posts[post_id] = raw_post
+                continue
+            if post_id <= last_post_id:
+                return True
+            new_raw_posts[post_id] = raw_post
+        return False
 
     def __get_post_data(self, raw_post: Dict) -> VkPost:
         """
@@ -133,7 +253,7 @@ class ApiParser:
         date: int = raw_post.get('date')
         text: str = raw_post.get('text')
         is_pinned: bool = not raw_post.get('is_pinned') is None
-        photos: Optional[List[str]] = self.__parse_photo_links(raw_post)
+        photos: Optional[List[VkPhoto]] = self.__parse_photo_links(raw_post)
         videos: Optional[List[VkVideo]] = self.__parse_videos(raw_post)
         external_link: Optional[List[str]] = self.__parse_external_link(raw_post)
 
@@ -152,23 +272,27 @@ class ApiParser:
         return parsed_post
 
     @staticmethod
-    def __parse_photo_links(raw_post: Dict) -> Optional[List[str]]:
+    def __parse_photo_links(raw_post: Dict) -> Optional[List[VkPhoto]]:
         """
-        Parse raw post and return photos urls
+        Parse raw post and return photos with urls
 
         Args:
             raw_post (Dict): raw post from vk
 
         Returns:
-            Optional[List[str]]: list of photos urls
+            Optional[List[VkPhoto]]: list of photos
         """
         photo_attachments = filter(
             lambda item: item.get('type') == 'photo',
             raw_post.get('attachments', tuple((dict(), )))
         )
-        photos: List[str] = []
+        photos: List[VkPhoto] = []
         for attachment in photo_attachments:
-            photos.append(attachment['photo']['sizes'][-1]['url'])
+            photo: Dict = attachment['photo']
+            photos.append(VkPhoto(
+                url=photo['sizes'][-1]['url'],
+                key=f'{photo.get("owner_id")}_{photo.get("id")}'
+            ))
 
         return photos
 
@@ -229,5 +353,498 @@ class ApiParser:
         return external_link
 
 
+class ApiParser(BaseApiParser):
+    """
+    Api parser for work with VK
+    """
+
+    def __init__(self, token: str) -> None:
+        """
+        Constructor
+        """
+        vk_session = vk_api.VkApi(token=token)
+        self.__api = vk_session.get_api()
+
+    def get_last_group_post(self, group_id: int) -> VkPost:
+        """Get lastest post from vk group
+
+        Args:
+            group_id (int): current group id
+
+        Returns:
+            VkPost: VK group post instance
+        """
+        group_posts = self.get_group_posts(group_id)
+        if len(group_posts) == 1:   # If group have only 1 post
+            return group_posts[0]
+        elif group_posts[0].id > group_posts[1].id:
+            return group_posts[0]
+        else:
+            return group_posts[1]
+
+    def get_group_posts(self, group_id: int, posts_count: int = 3) -> Tuple[VkPost,]:
+        """Receives posts from groups that do not contain advertising.
+        May return fewer posts than specified in posts_count
+
+        Args:
+            group_id (int): current group id
+            posts_count (int, optional): max count of parsed posts. Defaults to 3.
+
+        Returns:
+            Tuple[VkPost]: tuple of VK post instances
+        """
+        for i in range(10):
+            try:
+                # Gather posts via VkApi
+                response: dict = self.__api.wall.get(
+                    owner_id=f'-{group_id}', count=posts_count)
+                # with open('response.json', 'w') as f:
+                #     json.dump(response, f)
+                break
+            except requests.ConnectionError:
+                logging.error('Connection error, wait a minute')
+                time.sleep(60)
+
+        return self._parse_wall_response(response)
+
+    def get_group_info(self, group_uniq: Union[int, str]) -> VkGroup:
+        """Get information about group
+
+        Args:
+            group_uniq (str): group short name
+
+        Raises:
+            VkGroupInfoError: called when group not exists
+
+        Returns:
+            VkGroup: VK group information instance
+        """
+        try:
+            response: dict = self.__api.groups.getById(group_id=group_uniq)[0]
+            return self._parse_group_info(response)
+        except Exception as exception:
+            if '[100]' in str(exception):
+                raise VkGroupInfoError(
+                    f'Group with domain "{group_uniq}" does not exists').with_traceback(None)
+            raise exception.with_traceback(None)
+
+
+class AsyncApiParser(BaseApiParser):
+    """
+    Asynchronous api parser for work with VK.
+    All requests go through one shared aiohttp session and don't block the event loop
+    """
+    api_url = 'https://api.vk.com/method/'
+    api_version = '5.131'
+    # VK allows 3 requests per second for user token
+    requests_delay = 0.34
+    # VK error codes after which the request should be repeated
+    retry_error_codes = (
+        1,  # Unknown error
+        6,  # Too many requests per second
+        9,  # Flood control
+        10  # Internal server error
+    )
+
+    def __init__(self, token: str, connections_limit: int = 10, api_url: str = None, group_info_ttl: float = 21600,
+                 metrics: Optional[MetricsRegistry] = None) -> None:
+        """
+        Constructor
+
+        Args:
+            token (str): VK api token
+            connections_limit (int, optional): max count of simultaneous connections in pool. Defaults to 10.
+            api_url (str, optional): base url of VK api methods. Defaults to https://api.vk.com/method/.
+            group_info_ttl (float, optional): time in seconds while groups information is cached. Defaults to 21600.
+            metrics (Optional[MetricsRegistry], optional): registry for metrics of requests. Defaults to None.
+        """
+        self.group_info_cache = GroupInfoCache(group_info_ttl)
+        metrics = metrics or MetricsRegistry()
+        self.__requests_counter = metrics.counter(
+            'vk_requests_total', 'Requests to VK api by method and result', ('method', 'result'))
+        self.__requests_duration = metrics.histogram(
+            'vk_request_duration_seconds', 'Duration of requests to VK api', ('method',))
+        self.__errors_counter = metrics.counter('errors_total', 'Errors by type', ('type',))
+        self.__token = token
+        self.__connections_limit = connections_limit
+        self.__session: Optional[aiohttp.ClientSession] = None
+        self.__requests_lock: Optional[asyncio.Lock] = None
+        self.__last_request_time: float = 0
+        if api_url is not None:
+            self.api_url = api_url
+
+    async def close(self) -> None:
+        """
+        Close connection pool
+        """
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
+
+    async def get_last_group_post(self, group_id: int) -> VkPost:
+        """Get lastest post from vk group
+
+        Args:
+            group_id (int): current group id
+
+        Returns:
+            VkPost: VK group post instance
+        """
+        group_posts = await self.get_group_posts(group_id)
+        if len(group_posts) == 1:   # If group have only 1 post
+            return group_posts[0]
+        elif group_posts[0].id > group_posts[1].id:
+            return group_posts[0]
+        else:
+            return group_posts[1]
+
+    async def get_group_posts(self, group_id: int, posts_count: int = 3) -> Tuple[VkPost,]:
+        """Receives posts from groups that do not contain advertising.
+        May return fewer posts than specified in posts_count
+
+        Args:
+            group_id (int): current group id
+            posts_count (int, optional): max count of parsed posts. Defaults to 3.
+
+        Returns:
+            Tuple[VkPost]: tuple of VK post instances
+        """
+        response: dict = await self._call('wall.get', owner_id=-group_id, count=posts_count)
+        return self._parse_wall_response(response)
+
+    async def get_many_group_posts(self, group_ids: List[int], posts_count: int = 3) -> Dict[int, Tuple[VkPost,]]:
+        """Receives posts from many groups at once.
+        Packs up to 25 wall.get calls into one execute request, so one request covers 25 groups
+
+        Args:
+            group_ids (List[int]): ids of groups
+            posts_count (int, optional): max count of parsed posts for each group. Defaults to 3.
+
+        Returns:
+            Dict[int, Tuple[VkPost]]: tuples of VK post instances by group id.
+                Group gets an empty tuple if VK can't return its wall
+        """
+        group_ids = list(group_ids)
+        group_posts: Dict[int, Tuple[VkPost,]] = dict()
+        for start in range(0, len(group_ids), self.execute_calls_limit):
+            chunk: List[int] = group_ids[start:start + self.execute_calls_limit]
+            code: str = self._build_execute_code(
+                [('wall.get', {'owner_id': -group_id, 'count': posts_count}) for group_id in chunk]
+            )
+            responses: List[Optional[dict]] = await self._call('execute', code=code)
+            for group_id, response in zip(chunk, responses):
+                # Execute returns false instead of response for failed calls (closed or deleted group)
+                if not response:
+                    logging.warning(f"Can't get wall of group {group_id}")
+                    group_posts[group_id] = tuple()
+                    continue
+                group_posts[group_id] = self._parse_wall_response(response)
+        return group_posts
+
+    async def get_many_new_group_posts(self, last_post_ids: Dict[int, int], first_page_size: int = 3,
+                                       page_size: int = 20, max_posts: int = 100) -> Dict[int, Tuple[VkPost,]]:
+        """Receives posts published after the last seen post of each group.
+        The first small page of each wall is taken, walls with more new posts are paged until the seen post.
+        Pages of different groups are packed into execute requests by 25.
+        Group without seen posts (last post id is 0) gets only its latest post
+
+        Args:
+            last_post_ids (Dict[int, int]): id of the last seen post by group id
+            first_page_size (int, optional): count of posts in the first page, one of them may be pinned. Defaults to 3.
+            page_size (int, optional): count of posts in next pages, no more than 100. Defaults to 20.
+            max_posts (int, optional): max count of new posts of group, older ones are skipped. Defaults to 100.
+
+        Returns:
+            Dict[int, Tuple[VkPost]]: new posts from the oldest by group id.
+                Group gets an empty tuple if it has no new posts or VK can't return its wall
+        """
+        new_raw_posts: Dict[int, Dict[int, Dict]] = {group_id: dict() for group_id in last_post_ids}
+        # Offsets of the next pages of groups which are not reached the seen post yet
+        offsets: Dict[int, int] = {group_id: 0 for group_id in last_post_ids}
+        while offsets:
+            pages: List[Tuple[int, int]] = list(offsets.items())
+            offsets = dict()
+            for start in range(0, len(pages), self.execute_calls_limit):
+                chunk: List[Tuple[int, int]] = pages[start:start + self.execute_calls_limit]
+                code: str = self._build_execute_code([
+                    ('wall.get', {'owner_id': -group_id, 'offset': offset, 'count': page_size if offset else first_page_size})
+                    for group_id, offset in chunk
+                ])
+                responses: List[Optional[dict]] = await self._call('execute', code=code)
+                for (group_id, offset), response in zip(chunk, responses):
+                    # Execute returns false instead of response for failed calls (closed or deleted group)
+                    if not response:
+                        logging.warning(f"Can't get wall of group {group_id}")
+                        new_raw_posts[group_id].clear()
+                        continue
+                    raw_posts: List[Dict] = response.get('items') or []
+                    last_post_id: int = last_post_ids[group_id]
+                    if last_post_id <= 0:
+                        latest_posts: List[Dict] = [raw_post for raw_post in raw_posts if not raw_post.get('is_pinned')]
+                        new_raw_posts[group_id] = {post['id']: post for post in latest_posts[:1]}
+                        continue
+                    # New post published between pages shifts the wall, so posts are collected by id without duplicates
+                    is_seen_reached: bool = self._collect_new_raw_posts(raw_posts, last_post_id, new_raw_posts[group_id])
+                    next_offset: int = offset + len(raw_posts)
+                    if is_seen_reached or not raw_posts or next_offset >= response.get('count', 0):
+                        continue
+                    if len(new_raw_posts[group_id]) >= max_posts:
+                        logging.warning(f'Group {group_id} has more than {max_posts} new posts, older ones are skipped')
+                        continue
+                    offsets[group_id] = next_offset
+        return {
+            group_id: self._parse_raw_posts(
+                [raw_posts[post_id] for post_id in sorted(raw_posts)[-max_posts:]])
+            for group_id, raw_posts in new_raw_posts.items()
+        }
+
+    async def get_group_info(self, group_uniq: Union[int, str], fallback: Optional[VkGroup] = None) -> VkGroup:
+        """Get information about group. Information is cached for group_info_ttl seconds
+
+        Args:
+            group_uniq (str): group short name or id
+            fallback (Optional[VkGroup], optional): returned if VK is unavailable, e.g. group from database. Defaults to None.
+
+        Raises:
+            VkGroupInfoError: called when group not exists
+
+        Returns:
+            VkGroup: VK group information instance
+        """
+        group: Optional[VkGroup] = self.group_info_cache.get(group_uniq)
+        if group is not None:
+            return group
+        try:
+            # Don't wait long for VK if there is a saved information
+            attempts: int = 10 if fallback is None else 2
+            response: List[dict] = self._get_groups_list(
+                await self._call('groups.getById', attempts, group_id=group_uniq))
+        except VkApiError as exception:
+            if exception.code == 100:
+                self.__errors_counter.inc(type=VkGroupInfoError.__name__)
+                raise VkGroupInfoError(
+                    f'Group with domain "{group_uniq}" does not exists').with_traceback(None)
+            if fallback is not None:
+                logging.warning(f'Use saved information about group "{group_uniq}": {exception}')
+                return fallback
+            raise exception.with_traceback(None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            if fallback is not None:
+                logging.warning(f'Use saved information about group "{group_uniq}": {exception}')
+                return fallback
+            raise
+        group = self._parse_group_info(response[0])
+        self.group_info_cache.put(group)
+        return group
+
+    async def prefetch_groups_info(self, group_ids: List[int]) -> None:
+        """Fills cache by information about groups which are not cached yet.
+        Asks up to 500 groups by one request
+
+        Args:
+            group_ids (List[int]): ids of groups
+        """
+        missing_ids: List[int] = [
+            group_id for group_id in set(group_ids) if group_id not in self.group_info_cache
+        ]
+        for start in range(0, len(missing_ids), self.group_ids_limit):
+            chunk: List[int] = missing_ids[start:start + self.group_ids_limit]
+            response: List[dict] = self._get_groups_list(
+                await self._call('groups.getById', group_ids=','.join(map(str, chunk))))
+            for raw_group in response:
+                self.group_info_cache.put(self._parse_group_info(raw_group))
+
+    async def _call(self, method: str, attempts: int = 10, **params) -> Any:
+        """
+        Call VK api method. Connection errors and VK flood errors are repeated with exponential backoff
+
+        Args:
+            method (str): name of api method like 'wall.get'
+            attempts (int, optional): max count of attempts. Defaults to 10.
+
+        Raises:
+            VkApiError: called when VK returns error
+
+        Returns:
+            Any: 'response' field of VK answer
+        """
+        data: Dict[str, str] = {key: str(value) for key, value in params.items()}
+        data['access_token'] = self.__token
+        data['v'] = self.api_version
+        session: aiohttp.ClientSession = self.__get_session()
+        for attempt in range(attempts):
+            retry_delay: float = min(2 ** attempt, 60)
+            await self.__wait_requests_limit()
+            started: float = time.perf_counter()
+            try:
+                async with session.post(self.api_url + method, data=data) as http_response:
+                    http_response.raise_for_status()
+                    response: dict = await http_response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                self.__count_request(method, type(exception).__name__, started)
+                if attempt == attempts - 1:
+                    self.__errors_counter.inc(type=type(exception).__name__)
+                    raise
+                logging.error(f'Connection error "{exception}", wait {retry_delay} seconds')
+                await asyncio.sleep(retry_delay)
+                continue
+
+            error: Optional[dict] = response.get('error')
+            if error is None:
+                self.__count_request(method, 'ok', started)
+                return response.get('response')
+            self.__count_request(method, f'error_{error.get("error_code")}', started)
+            if error.get('error_code') in self.retry_error_codes and attempt != attempts - 1:
+                logging.warning(f'VK error "{error.get("error_msg")}", wait {retry_delay} seconds')
+                await asyncio.sleep(retry_delay)
+                continue
+            self.__errors_counter.inc(type=VkApiError.__name__)
+            raise VkApiError(error.get('error_code'), error.get('error_msg'))
+
+    def __count_request(self, method: str, result: str, started: float) -> None:
+        self.__requests_counter.inc(method=method, result=result)
+        self.__requests_duration.observe(time.perf_counter() - started, method=method)
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        """
+        Return shared session, creates it on first call inside running event loop
+
+        Returns:
+            aiohttp.ClientSession: http session with connection pool
+        """
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.__connections_limit),
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+        return self.__session
+
+    async def __wait_requests_limit(self) -> None:
+        """
+        Waits until VK requests per second limit allows the next request
+        """
+        if self.__requests_lock is None:
+            self.__requests_lock = asyncio.Lock()
+        async with self.__requests_lock:
+            loop = asyncio.get_running_loop()
+            delay: float = self.requests_delay - (loop.time() - self.__last_request_time)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.__last_request_time = loop.time()
+
+
+class NewsfeedReader:
+    """
+    Receives posts of many groups by newsfeed.get instead of reading each wall.
+    One newsfeed.get call covers up to 100 groups and execute packs 25 calls, so one request covers 2500 groups.
+    Time of the last request of each group is kept as cursor, the next request asks only posts after it.
+    Cursors may be saved and restored by owner, so reading continues after restart.
+    Newsfeed is available only with user access token
+    """
+
+    def __init__(self, parser: AsyncApiParser, lookback: int = 86400, overlap: int = 300,
+                 sources_limit: int = 100, pages_limit: int = 10) -> None:
+        """
+        Constructor
+
+        Args:
+            parser (AsyncApiParser): parser which sends requests to VK
+            lookback (int, optional): time in seconds to look back for group without cursor. Defaults to 86400.
+            overlap (int, optional): time in seconds added before cursor, posts may appear in newsfeed
+                with delay. Defaults to 300.
+            sources_limit (int, optional): count of groups in one newsfeed.get call. Defaults to 100.
+            pages_limit (int, optional): max count of pages of one call, 100 posts in page. Defaults to 10.
+        """
+        self.parser = parser
+        self.lookback = lookback
+        self.overlap = overlap
+        self.sources_limit = sources_limit
+        self.pages_limit = pages_limit
+        # Group id -> unix time of the last successful request, groups without cursor are read for lookback time
+        self.cursors: Dict[int, int] = dict()
+
+    @property
+    def groups_per_request(self) -> int:
+        """
+        Count of groups covered by one execute request
+        """
+        return self.sources_limit * BaseApiParser.execute_calls_limit
+
+    async def get_many_group_posts(self, group_ids: List[int]) -> Dict[int, Tuple[VkPost,]]:
+        """Receives posts published since the previous request of each group.
+        Posts may repeat ones received before, because cursors are overlapped
+
+        Args:
+            group_ids (List[int]): ids of groups
+
+        Returns:
+            Dict[int, Tuple[VkPost]]: posts from the newest like in wall by group id, empty tuple if group has no new posts
+        """
+        now: int = int(time.time())
+        # Groups polled together have the same cursor, so they are asked by the same call
+        group_ids = sorted(set(group_ids), key=lambda group_id: self.cursors.get(group_id, 0))
+        # (source ids, start time, cursor of next page)
+        calls: List[Tuple[List[int], int, Optional[str]]] = list()
+        for start in range(0, len(group_ids), self.sources_limit):
+            chunk: List[int] = group_ids[start:start + self.sources_limit]
+            start_time: int = min(self.cursors.get(group_id, now - self.lookback) for group_id in chunk) - self.overlap
+            calls.append((chunk, start_time, None))
+
+        raw_posts: Dict[int, Dict[int, Dict]] = {group_id: dict() for group_id in group_ids}
+        # Cursors of these groups are kept, so their posts are asked again by the next request
+        failed_ids: Set[int] = set()
+        for page in range(self.pages_limit):
+            next_calls: List[Tuple[List[int], int, Optional[str]]] = list()
+            for start in range(0, len(calls), BaseApiParser.execute_calls_limit):
+                chunk_calls = calls[start:start + BaseApiParser.execute_calls_limit]
+                code: str = BaseApiParser._build_execute_code([
+                    ('newsfeed.get', self.__get_params(source_ids, start_time, start_from))
+                    for source_ids, start_time, start_from in chunk_calls
+                ])
+                responses: List[Optional[dict]] = await self.parser._call('execute', code=code)
+                for (source_ids, start_time, start_from), response in zip(chunk_calls, responses):
+                    if not response:
+                        logging.warning(f"Can't get newsfeed of {len(source_ids)} groups")
+                        failed_ids.update(source_ids)
+                        continue
+                    for item in response.get('items') or []:
+                        group_id: int = -item.get('source_id', 0)
+                        if item.get('type', 'post') == 'post' and group_id in raw_posts:
+                            raw_posts[group_id][item['post_id']] = self.__to_wall_post(item)
+                    if response.get('next_from'):
+                        next_calls.append((source_ids, start_time, response['next_from']))
+            calls = next_calls
+            if not calls:
+                break
+        else:
+            logging.warning(f'Newsfeed has more than {self.pages_limit} pages, older posts are skipped')
+
+        for group_id in group_ids:
+            if group_id not in failed_ids:
+                self.cursors[group_id] = now
+        return {
+            group_id: self.parser._parse_raw_posts([posts[post_id] for post_id in sorted(posts, reverse=True)])
+            for group_id, posts in raw_posts.items()
+        }
+
+    @staticmethod
+    def __get_params(source_ids: List[int], start_time: int, start_from: Optional[str]) -> Dict:
+        params: Dict = {
+            'filters': 'post',
+            'source_ids': ','.join(str(-group_id) for group_id in source_ids),
+            'start_time': start_time,
+            'count': 100,
+        }
+        if start_from is not None:
+            params['start_from'] = start_from
+        return params
+
+    @staticmethod
+    def __to_wall_post(item: Dict) -> Dict:
+        """
+        Newsfeed item has post_id and source_id instead of id, owner_id and from_id of wall post
+        """
+        return dict(item, id=item['post_id'], owner_id=item['source_id'], from_id=item['source_id'])
+
+
 if __name__ == "__main__":
     pass
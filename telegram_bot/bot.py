@@ -3,22 +3,36 @@ import configparser
 import logging
 import re
 import urllib.parse
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import time
 
 import aiogram
+import aiohttp
 from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.dispatcher.storage import BaseStorage
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup, Chat, User
 from aiogram.types.input_media import MediaGroup
 
 from modules import database
+from modules.metrics import Histogram, MetricsRegistry, MetricsServer
+from modules import subscriptions
 from modules import vk_parser
-from data_classes import DataBaseGroup, DataBaseUser, TelegramPost, VkGroup, VkPost, DataBaseUserGroup
+from data_classes import DataBaseGroup, DataBaseGroupStats, DataBaseOutboxItem, DataBaseUser, ProfileReport, TelegramPost, VkGroup, VkPhoto, VkPost, DataBaseUserGroup
 from tools import split_text
+from .delivery import DeliveryScheduler
+from .fsm_storage import DatabaseStorage
+from .outbox import OutboxConsumer, decode_post, encode_post
+from .polling import AdaptivePollingScheduler
+from .profiling import CycleProfiler
+from .webhook import WebhookServer
+from .media_cache import MediaFileCache
+from .post_cache import PostCache
+from . import renderer
 
 
 class States(StatesGroup):
@@ -54,11 +68,32 @@ class Keyboard:
 
 
 class TelegramBot:
-    def __init__(self, database_path: str, telegram_token: str, vk_token: str, admin_id: int) -> None:
-        # Set limits for counts of chars in messages sended by telegram bot. See tools.py split_text method
+    def __init__(self, database_path: str, telegram_token: str, vk_token: str, admin_id: int, update_concurrency: int = 4,
+                 sqlite_profile: Optional[database.SqliteProfile] = None, group_info_ttl: int = 21600, update_timer: int = 600,
+                 media_files_limit: int = 50000, outbox_workers: int = 30, outbox_max_attempts: int = 10,
+                 polling_scheduler: Optional[AdaptivePollingScheduler] = None, fsm_storage: str = 'memory',
+                 fsm_state_ttl: int = 86400, telegram_api_url: Optional[str] = None, vk_api_url: Optional[str] = None,
+                 profiler: Optional[CycleProfiler] = None, fetch_mode: str = 'latest',
+                 ingestion_engine: str = 'wall') -> None:
+        # Set limits for counts of visible chars in messages sended by telegram bot. See tools.py split_text method
         self.post_char_limit = 4000 
         self.capture_char_limit = 1000
 
+        # Count of groups processed in parallel during update
+        self.update_concurrency = max(1, update_concurrency)
+        # Groups are polled each update_timer seconds if there is no adaptive scheduler
+        self.polling_scheduler = polling_scheduler
+        # Profiles update cycles by settings or by admin command
+        self.profiler = profiler or CycleProfiler()
+        # "latest" sends only the latest post of group, "incremental" sends all posts published since the last update
+        self.fetch_mode = fetch_mode
+        # Max time in seconds between checks of adaptive scheduler, due groups are collected into one update
+        self.polling_tick = 30
+        # Statistics of groups changed during update, saved after it
+        self.__polling_stats: List[DataBaseGroupStats] = list()
+        # Count of posts taken from outbox at once and count of delivered posts saved to database at once
+        self.delivery_batch_size = 100
+
         # set available commands, need only for /commands
         self.user_commands = {
             "/start":"Отправляет преветственное сообщение",
@@ -68,21 +103,80 @@ class TelegramBot:
         self.admin_commands = {
             "/shutdown":"Останавливает бота",
             "/panel":"Панель управления ботом",
-            "/announce":"Массовая рассылка сообщения всем пользователям"
+            "/announce":"Массовая рассылка сообщения всем пользователям",
+            "/profile":"Профилирует следующее обновление, можно указать количество обновлений"
         }
 
         # Creates instances
         self.admin_id = admin_id
-        self.database = database.Database(database_path)
-        self.bot_api = Bot(token=telegram_token)
-        self.bot_dispatcher = Dispatcher(self.bot_api, storage=MemoryStorage())
-        self.vk_api_parser = vk_parser.ApiParser(vk_token)
+        self.database = database.AsyncDatabase(database_path, sqlite_profile=sqlite_profile)
+        self.subscriptions = subscriptions.SubscriptionIndex(self.database)
+        # Other api servers are used by local telegram bot api server and by benchmarks
+        if telegram_api_url is None:
+            self.bot_api = Bot(token=telegram_token)
+        else:
+            self.bot_api = Bot(token=telegram_token, server=TelegramAPIServer.from_base(telegram_api_url))
+        # States of conversations kept in database survive restarts and are shared by processes of bot
+        if fsm_storage == 'database':
+            storage: BaseStorage = DatabaseStorage(self.database, fsm_state_ttl)
+        else:
+            storage = MemoryStorage()
+        self.bot_dispatcher = Dispatcher(self.bot_api, storage=storage)
+        # Metrics of update cycle and delivery, available by http if metrics_port is set
+        self.metrics = MetricsRegistry()
+        # Gives metrics to Prometheus, set by run method
+        self.metrics_server: Optional[MetricsServer] = None
+        self.vk_api_parser = vk_parser.AsyncApiParser(
+            vk_token, api_url=vk_api_url, group_info_ttl=group_info_ttl, metrics=self.metrics)
+        self.delivery = DeliveryScheduler(metrics=self.metrics)
+        # Posts of many groups are taken from newsfeed by one request instead of walls, needs user token
+        self.newsfeed_reader: Optional[vk_parser.NewsfeedReader] = None
+        if ingestion_engine == 'newsfeed':
+            self.newsfeed_reader = vk_parser.NewsfeedReader(self.vk_api_parser, lookback=max(update_timer * 2, 3600))
+        # Cursors of newsfeed saved by previous run are loaded by the first update cycle
+        self.__is_newsfeed_loaded: bool = False
+        self.media_cache = MediaFileCache(self.database, media_files_limit)
+        # Receives updates in webhook run mode, set by run method
+        self.webhook_server: Optional[WebhookServer] = None
+        # Posts are fresh until the next update
+        self.post_cache = PostCache(update_timer)
+        # New posts are saved to outbox by update cycle and sent by its consumer
+        self.outbox = OutboxConsumer(
+            self.database, self._deliver_outbox_item, self.subscriptions.bulk_update_user_group_dates,
+            workers_count=outbox_workers, batch_size=self.delivery_batch_size, max_attempts=outbox_max_attempts,
+            metrics=self.metrics)
+        self.__reg_metrics()
 
         # Registers bot event handlers
         self._reg_main_menu_handlers()
         self._reg_states_handlers()
 
 
+    def __reg_metrics(self) -> None:
+        """
+        Creates metrics of update cycle and caches
+        """
+        self.__cycle_duration: Histogram = self.metrics.histogram(
+            'update_cycle_duration_seconds', 'Duration of update of groups')
+        self.__phase_duration: Histogram = self.metrics.histogram(
+            'update_phase_duration_seconds', 'Duration of phases of update and delivery of post', ('phase',))
+        self.__updated_groups_counter = self.metrics.counter('updated_groups_total', 'Groups which received new post')
+        self.__errors_counter = self.metrics.counter('errors_total', 'Errors by type', ('type',))
+        cache_hits = self.metrics.gauge('cache_hits', 'Count of hits of cache', ('cache',))
+        cache_misses = self.metrics.gauge('cache_misses', 'Count of misses of cache', ('cache',))
+        cache_hit_ratio = self.metrics.gauge('cache_hit_ratio', 'Part of requests served by cache', ('cache',))
+        caches = {
+            'group_info': self.vk_api_parser.group_info_cache,
+            'post': self.post_cache,
+            'media': self.media_cache,
+        }
+        for name, cache in caches.items():
+            # Values are read at the moment of scrape, so caches don't depend on metrics
+            cache_hits.set_function(lambda cache=cache: cache.hits, cache=name)
+            cache_misses.set_function(lambda cache=cache: cache.misses, cache=name)
+            cache_hit_ratio.set_function(
+                lambda cache=cache: cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0, cache=name)
+
     def _reg_main_menu_handlers(self) -> None:
         """
         Registrate commands and buttons handlers from bot's main menu
@@ -105,6 +199,8 @@ class TelegramBot:
             self.__on_command_announce, is_admin, commands=['announce'])
         self.bot_dispatcher.register_message_handler(
             self.__on_command_shutdown, is_admin, commands=['shutdown'])
+        self.bot_dispatcher.register_message_handler(
+            self.__on_command_profile, is_admin, commands=['profile'])
         self.bot_dispatcher.register_message_handler(
             self.__on_command_me, commands="me")
         self.bot_dispatcher.register_message_handler(
@@ -138,7 +234,7 @@ class TelegramBot:
             msg_text += "\nАдминские:\n"
             for key in self.admin_commands.keys():
                 msg_text += f"{key} - {self.admin_commands.get(key)}\n"
-        await message.answer(msg_text)
+        await self._reply(message, msg_text)
         
 
 
@@ -158,7 +254,7 @@ class TelegramBot:
             "P.S.\n"\
             "ссылка на группу - https://vk.com/eastwindiscoming\n"\
             "ее короткое имя - eastwindiscoming"
-        await message.answer(
+        await self._reply(message,
             help_message, 
             reply_markup=Keyboard.main_menu, 
             disable_web_page_preview=True
@@ -173,8 +269,8 @@ class TelegramBot:
         Args:
             message (types.Message): message instance from user
         """
-        await message.reply("Введите ссылку на группу которую хотите добавить", 
-        reply_markup=Keyboard.cancel)
+        await self._reply(message, "Введите ссылку на группу которую хотите добавить", 
+        reply_markup=Keyboard.cancel, reply=True)
         await States.add_group.set() # Set state of waiting while user enter group
 
     async def __on_del_group_button(self, message: types.Message) -> None:
@@ -186,23 +282,23 @@ class TelegramBot:
             message (types.Message): message instance from user
         """
         # Checks if the user is not in the database
-        if not self.database.is_user_exists(message.from_user.id):
-            await message.reply('Вы не являетесь пользователем бота, вам просто нечего удалять')
+        if not self.subscriptions.is_user_exists(message.from_user.id):
+            await self._reply(message, 'Вы не являетесь пользователем бота, вам просто нечего удалять', reply=True)
             return
-        user_groups: List[str] = self.database.get_user(
+        user_groups: List[str] = self.subscriptions.get_user(
             message.from_user.id).groups
         if not user_groups:
-            await message.reply('Вы не подписаны ни на одну группу и вам нечего удалять')
+            await self._reply(message, 'Вы не подписаны ни на одну группу и вам нечего удалять', reply=True)
             return
 
         groups_list: List[str] = list()
         for index, user_group in enumerate(user_groups, 1): # Gen list of vk groups of user with html markup
-            group = self.database.get_group(user_group.domain)
+            group = self.subscriptions.get_group(user_group.domain)
             groups_list.append(f"""{index}. '<a href="https://vk.com/{group.domain}">{group.group_name}</a>'""")
 
         msg: str = f"\n\nВведите номер группы из списка которую хотите удалить\
                     \nДиапозон ввода от 1 до {len(user_groups)}"
-        await message.answer(
+        await self._reply(message,
             '\n'.join(groups_list) + msg,
             reply_markup=Keyboard.cancel,
             parse_mode='HTML',
@@ -218,33 +314,33 @@ class TelegramBot:
             message (types.Message): message from user
         """
         user_id: int = message.from_user.id
-        if not self.database.is_user_exists(user_id):
-            await message.reply('Вы не являетесь пользователем бота, вам просто нечего обновлять')
+        if not self.subscriptions.is_user_exists(user_id):
+            await self._reply(message, 'Вы не являетесь пользователем бота, вам просто нечего обновлять', reply=True)
             return  
-        msg = await message.answer("Ожидайте...")
+        msg = await self._reply(message, "Ожидайте...")
         # Get info about user from database
-        user: DataBaseUser = self.database.get_user(user_id)
+        user: DataBaseUser = self.subscriptions.get_user(user_id)
         # Initializes the counter of updated groups (may differ from the total number of groups in the database)
         update_counter: int = 0
 
         for user_group in user.groups:
             # Get info about group from database
-            db_group: DataBaseGroup = self.database.get_group(user_group.domain)  
+            db_group: DataBaseGroup = self.subscriptions.get_group(user_group.domain)  
 
             await msg.delete()
-            msg = await message.answer(f"Провереряю '{db_group.group_name}'")
+            msg = await self._reply(message, f"Провереряю '{db_group.group_name}'")
             # Get post from vk for telegram
             telegram_post: TelegramPost = await self._get_post(db_group)
             # Check fresh post
             if telegram_post.date > user_group.last_update_date:
                 # Send post to user
-                await self._send_post(telegram_post.texts, telegram_post.media, user_id)
+                await self._send_post(telegram_post, user_id, DeliveryScheduler.PRIORITY_INTERACTIVE)
                 # Updates the date of the last post received by the user
-                self.database.update_user_group_date(user_id, user_group.domain, telegram_post.date)
+                await self.subscriptions.update_user_group_date(user_id, user_group.domain, telegram_post.date)
                 # Update counter
                 update_counter += 1
         await msg.delete()
-        await message.answer(f"Обновлено {update_counter} групп")
+        await self._reply(message, f"Обновлено {update_counter} групп")
         logging.info(f"User '{user_id}' manual update {update_counter} groups")
 
     async def __on_cancel_button(self, message: types.Message, state: FSMContext) -> None:
@@ -253,7 +349,7 @@ class TelegramBot:
         Called if user press 'Отмена' button
         """
         await state.finish()
-        await message.answer('Возврат на главный экран', reply_markup=Keyboard.main_menu)
+        await self._reply(message, 'Возврат на главный экран', reply_markup=Keyboard.main_menu)
 
     async def __on_add_group_state(self, message: types.Message, state: FSMContext) -> None:
         """
@@ -272,22 +368,22 @@ class TelegramBot:
 
         if not raw_path:
             # Empty group_name if user input https://vk.com
-            await message.reply('Ссылка не содержит короткого имени группы или ее id\nПопробуйте снова')
+            await self._reply(message, 'Ссылка не содержит короткого имени группы или ее id\nПопробуйте снова', reply=True)
             return
         try:
             if raw_path.startswith('wall-'): # link to wall post of group
                 group_id = re.findall(r'-(.+)_', raw_path)[0] # parse group id
-                group_info: VkGroup = self.vk_api_parser.get_group_info(group_id) # Get info about group
+                group_info: VkGroup = await self.vk_api_parser.get_group_info(group_id) # Get info about group
                 group_domain = group_info.domain 
             else: # If just group domain
                 group_domain = raw_path
-                group_info: VkGroup = self.vk_api_parser.get_group_info(group_domain)
+                group_info: VkGroup = await self.vk_api_parser.get_group_info(group_domain)
         except vk_parser.VkGroupInfoError:
-            await message.reply('Такой группы не существует\nПопробуйте снова')
+            await self._reply(message, 'Такой группы не существует\nПопробуйте снова', reply=True)
             return
 
-        if self.database.is_group_has_member(group_domain, user_id):
-            await message.reply('Вы уже подписаны на группу', reply_markup=Keyboard.main_menu)
+        if self.subscriptions.is_group_has_member(group_domain, user_id):
+            await self._reply(message, 'Вы уже подписаны на группу', reply_markup=Keyboard.main_menu, reply=True)
             await state.finish()
             return
 
@@ -295,24 +391,22 @@ class TelegramBot:
             group_domain = group_info.domain
 
         if group_info.is_closed:
-            await message.reply('Это приватная группа и бот не может ее обработать')
+            await self._reply(message, 'Это приватная группа и бот не может ее обработать', reply=True)
             return
 
-        if not self.database.is_user_exists(user_id):
-            self.database.create_user(user_id)
-
-        if not self.database.is_group_exists(group_domain):
-            self.database.create_group(group_domain, group_info.id, group_info.group_name)
-
-        self.database.add_member_to_group(group_domain, user_id)
-        await message.answer(
+        # User and group are created in the same transaction, so concurrent adds don't conflict
+        if not await self.subscriptions.add_subscription(group_domain, group_info.id, group_info.group_name, user_id):
+            await self._reply(message, 'Вы уже подписаны на группу', reply_markup=Keyboard.main_menu, reply=True)
+            await state.finish()
+            return
+        await self._reply(message,
             f'Группа "{group_info.group_name}" успешно добавлена в ваши подписки\n'\
              'Для проверки вам отправляется закрепленный или в случае его отсупствия последний пост группы', 
             reply_markup=Keyboard.main_menu)
-        group = self.database.get_group(group_domain)
+        group = self.subscriptions.get_group(group_domain)
         telegram_post = await self._get_post(group, True)
-        await self._send_post(telegram_post.texts, telegram_post.media, user_id)
-        self.database.update_user_group_date(user_id, group_domain, telegram_post.date)
+        await self._send_post(telegram_post, user_id, DeliveryScheduler.PRIORITY_INTERACTIVE)
+        await self.subscriptions.update_user_group_date(user_id, group_domain, telegram_post.date)
         await state.finish()
 
     async def __on_del_group_state(self, message: types.Message, state: FSMContext) -> None:
@@ -323,25 +417,25 @@ class TelegramBot:
             state (FSMContext): current state of bot
         """
         user_id: int = message.from_user.id
-        groups: List[DataBaseUserGroup] = self.database.get_user(user_id).groups
+        groups: List[DataBaseUserGroup] = self.subscriptions.get_user(user_id).groups
 
         if not message.text.isdigit():
-            await message.answer(
+            await self._reply(message,
                 'Вы должны ввести порядковый номер группы из указанного выше списка\nПопробуйте еще'
             )
             return
 
         group_index: int = int(message.text) - 1 
         if not group_index in range(len(groups)):
-            await message.reply(f'Вы ввели число которого нет в списке\nПопробуйте еще')
+            await self._reply(message, f'Вы ввели число которого нет в списке\nПопробуйте еще', reply=True)
             return
 
         logging.info(f"User '{user_id}' delete '{groups[group_index].domain}' group")
-        self.database.del_member_of_group(groups[group_index].domain, user_id)
-        await message.reply('Группа успешно удалена', reply_markup=Keyboard.main_menu)
+        await self.subscriptions.del_member_of_group(groups[group_index].domain, user_id)
+        await self._reply(message, 'Группа успешно удалена', reply_markup=Keyboard.main_menu, reply=True)
         await state.finish()
 
-    def _generate_post(self, vk_post: VkPost, full_group_name: str) -> Tuple[str, MediaGroup]:
+    def _generate_post(self, vk_post: VkPost, full_group_name: str) -> Tuple[str, Tuple[VkPhoto, ...]]:
         """
         Generate message text and media group for telegram post
 
@@ -350,107 +444,322 @@ class TelegramBot:
             full_group_name (str): long name of group
 
         Returns:
-            Tuple[str, MediaGroup]: data for telegram post
+            Tuple[str, Tuple[VkPhoto, ...]]: text and photos for telegram post
         """
-        media = MediaGroup()
-        text_of_post: str = f'<a href="https://vk.com/wall{vk_post.owner_id}_{vk_post.id}">{full_group_name}</a>\n\n' # Link to post
+        media: List[VkPhoto] = list()
+        text_of_post: str = renderer.link( # Link to post
+            f'https://vk.com/wall{vk_post.owner_id}_{vk_post.id}', full_group_name) + '\n\n'
 
         if vk_post.text:
-            temp_post_text = vk_post.text
-            # Parse vk hyper links markup and convert to html
-            hyper_links = re.findall(r'(\[.*\|.*\])', temp_post_text) # Get hyper link from vk markup
-            for link in hyper_links:
-                group_domain, hyper_text = re.findall(r'\[(.*?)\|(.*)\]', link)[0] # Parse hyper link
-                temp_post_text = temp_post_text.replace(   # Convert to html and replace text
-                    link, 
-                    f'<a href="https://vk.com/{group_domain}">{hyper_text}</a>'
-                )
-            text_of_post += temp_post_text + '\n'
+            # Convert vk markup to html
+            text_of_post += renderer.render_vk_text(vk_post.text) + '\n'
 
         if vk_post.videos:
             for video in vk_post.videos:
                 # Paste video like hyper link because i so lazy to get video from vk
-                text_of_post += f'<a href="{video.url}">{video.title}</a>\n'
+                text_of_post += renderer.link(video.url, video.title) + '\n'
 
         if vk_post.photos:
-            for photo in vk_post.photos:
-                media.attach_photo(photo)
+            media.extend(vk_post.photos)
 
         if vk_post.external_link != None: # External link it is link from previev
-            text_of_post += f'<a href="{vk_post.external_link.url}">{vk_post.external_link.title}</a>\n'
+            text_of_post += renderer.link(vk_post.external_link.url, vk_post.external_link.title) + '\n'
             if vk_post.external_link.photo:
-                media.attach_photo(vk_post.external_link.photo)
+                # Photo of link has no VK key, so it is identified by url
+                media.append(VkPhoto(vk_post.external_link.photo, vk_post.external_link.photo))
+
+        return text_of_post, tuple(media)
+
+    async def _reply(self, message: types.Message, text: str, reply: bool = False, **kwargs) -> types.Message:
+        """
+        Answers user through delivery scheduler, so answers are counted in rate limits of bot
+        and go ahead of posts waiting for delivery
+
+        Args:
+            message (types.Message): message from user
+            text (str): text of answer
+            reply (bool, optional): quote message of user. Defaults to False.
+            **kwargs: other arguments of types.Message.answer, e.g. reply_markup
 
-        return text_of_post, media
+        Returns:
+            types.Message: sent message
+        """
+        return await self.delivery.send(
+            message.chat.id, lambda: message.answer(text, reply=reply, **kwargs), DeliveryScheduler.PRIORITY_INTERACTIVE)
 
-    async def _send_post(self, post_texts: List[str], post_media: MediaGroup, user_id: int) -> None:
+    async def _send_post(self, telegram_post: TelegramPost, user_id: int, priority: int = DeliveryScheduler.PRIORITY_BULK) -> None:
         """
-        Send prepared post from vk to user in telegram 
+        Send prepared post from vk to user in telegram through delivery scheduler.
+        Photos uploaded before are sent by telegram file id
 
         Args:
-            post_texts (List[str]): splited post text
-            post_media (MediaGroup): photo group for post
+            telegram_post (TelegramPost): rendered post
             user_id (int): id of user
+            priority (int, optional): priority of delivery. Defaults to DeliveryScheduler.PRIORITY_BULK.
         """
+        file_ids: Dict[str, str] = await self.media_cache.get_many(
+            [photo.key for photo in telegram_post.photos])
         try:
-            chat = await self.bot_api.get_chat(user_id)
-        except:
+            for index, post_text in enumerate(telegram_post.texts): 
+                if not telegram_post.photos or index != 0:  # Sends media only in the first iteration
+                    await self.delivery.send(
+                        user_id, lambda: self.bot_api.send_message(user_id,  post_text, 'HTML'), priority)
+
+                elif len(telegram_post.photos) == 1:
+                    vk_photo: VkPhoto = telegram_post.photos[0]
+                    photo: str = file_ids.get(vk_photo.key, vk_photo.url)
+                    message: types.Message = await self.delivery.send(
+                        user_id, lambda: self.bot_api.send_photo(user_id, photo, post_text, 'HTML'), priority)
+                    await self.__save_uploaded_photos(telegram_post.photos, [message], file_ids)
+
+                else:
+                    # Media group is built for each user, so the shared post is not changed
+                    post_media = MediaGroup()
+                    for photo_index, vk_photo in enumerate(telegram_post.photos):
+                        post_media.attach_photo(
+                            file_ids.get(vk_photo.key, vk_photo.url),
+                            caption=post_text if photo_index == 0 else None,
+                            parse_mode='HTML' if photo_index == 0 else None
+                        )
+                    messages: List[types.Message] = await self.delivery.send(
+                        user_id, lambda: self.bot_api.send_media_group(user_id, post_media), priority)
+                    await self.__save_uploaded_photos(telegram_post.photos, messages, file_ids)
+        except (aiogram.utils.exceptions.ChatNotFound, aiogram.utils.exceptions.UserDeactivated):
             logging.warning(f'Chat with user {user_id} does not exists. The user will be deleted from the database')
-            self.database.del_user(user_id)
-            return
-        for index, post_text in enumerate(post_texts): 
-            if not post_media.media or index != 0:  # Sends media only in the first iteration
-                await self.bot_api.send_message(user_id,  post_text, 'HTML')
+            if self.subscriptions.is_user_exists(user_id):
+                await self.subscriptions.del_user(user_id)
 
-            elif len(post_media.media) == 1:
-                photo = post_media.media[0].media
-                await self.bot_api.send_photo(user_id, photo, post_text, 'HTML')
+    async def __save_uploaded_photos(self, photos: Tuple[VkPhoto, ...], messages: List[types.Message], known_file_ids: Dict[str, str]) -> None:
+        """
+        Saves telegram file ids of photos uploaded for the first time
 
-            else:
-                post_media.media[0].caption = post_text
-                post_media.media[0].parse_mode = 'HTML'
-                await self.bot_api.send_media_group(user_id, post_media)
+        Args:
+            photos (Tuple[VkPhoto, ...]): sent photos
+            messages (List[types.Message]): sent messages in the same order as photos
+            known_file_ids (Dict[str, str]): file ids of photos which were sent by file id
+        """
+        new_file_ids: Dict[str, str] = {
+            # The last size is the original photo
+            photo.key: message.photo[-1].file_id
+            for photo, message in zip(photos, messages)
+            if message.photo and photo.key not in known_file_ids
+        }
+        await self.media_cache.put_many(new_file_ids)
 
-    async def posting(self) -> None:
+    async def posting(self, domains: Optional[List[str]] = None) -> None:
         """
-        Sends each user in the database a latest post from the VK groups to which he is subscribed
+        Enqueues for each user in the database a latest post from the VK groups to which he is subscribed,
+        the posts are sent by outbox consumer. Groups are processed in parallel by a pool of workers,
+        the size of pool is set by update_concurrency
+
+        Args:
+            domains (Optional[List[str]], optional): groups for update, all groups if None. Defaults to None.
         """
-        # Initializes the counter of updated groups (may differ from the total number of groups in the database)
-        update_counter: int = 0
-        groups: List[DataBaseGroup] = self.database.get_all_groups()
-        for group in groups:
-            
+        started: float = time.perf_counter()
+        if domains is None:
+            with self.__phase_duration.time(phase='db_load'):
+                loaded_groups: List[DataBaseGroup] = await self.database.load_subscription_snapshot()
+        else:
+            # Few groups are taken from subscription index instead of loading the whole database
+            loaded_groups = [
+                self.subscriptions.get_group(domain) for domain in domains if self.subscriptions.is_group_exists(domain)
+            ]
+        groups: List[DataBaseGroup] = list()
+        for group in loaded_groups:
             # Deletes a group from the database if it has no users
             if not group.members:
-                self.database.del_group(group.domain)
+                try:
+                    await self.subscriptions.del_group(group.domain)
+                except database.DataBaseGroupError as e:
+                    # User may subscribe or group may be deleted after loading, the group is updated next time
+                    logging.warning(f"Can't delete group without members: {e}")
                 continue
-            
-            # Get post from group and parse them
-            telegram_post: TelegramPost = await self._get_post(group)
-            # Skips sending a post if it has already been sent before
-            if telegram_post.date <= group.post_date:
+            groups.append(group)
+        # Fills cache of groups names by bulk requests instead of request for each group
+        try:
+            with self.__phase_duration.time(phase='vk_fetch'):
+                await self.vk_api_parser.prefetch_groups_info([group.id for group in groups])
+        except (vk_parser.VkApiError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Can't prefetch groups info: {e}")
+
+        # Domains of updated groups (may differ from the total number of groups in the database)
+        updated_groups: List[str] = list()
+        # Fills queue by jobs for gathering walls of groups via batched requests.
+        # Each of this jobs adds to queue jobs for updating of received groups
+        jobs_queue: asyncio.Queue = asyncio.Queue()
+        chunk_size: int = vk_parser.BaseApiParser.execute_calls_limit
+        if self.newsfeed_reader is not None:
+            chunk_size = self.newsfeed_reader.groups_per_request
+            if not self.__is_newsfeed_loaded:
+                # Newsfeed is read from where previous run stopped
+                with self.__phase_duration.time(phase='db_load'):
+                    self.newsfeed_reader.cursors.update(await self.database.get_newsfeed_cursors())
+                self.__is_newsfeed_loaded = True
+        for start in range(0, len(groups), chunk_size):
+            chunk: List[DataBaseGroup] = groups[start:start + chunk_size]
+            jobs_queue.put_nowait(lambda chunk=chunk: self._fetch_groups_walls(chunk, jobs_queue, updated_groups))
+
+        workers: List[asyncio.Task] = [
+            asyncio.create_task(self._posting_worker(jobs_queue)) for _ in range(self.update_concurrency)
+        ]
+        await jobs_queue.join()
+        for worker in workers:
+            worker.cancel()
+        if self.newsfeed_reader is not None:
+            # Cursors are saved after posts are enqueued, so posts which were read before crash are read again
+            cursors: Dict[int, int] = self.newsfeed_reader.cursors
+            with self.__phase_duration.time(phase='commit'):
+                await self.database.save_newsfeed_cursors(
+                    {group.id: cursors[group.id] for group in groups if group.id in cursors})
+        self.__updated_groups_counter.inc(len(updated_groups))
+        self.__cycle_duration.observe(time.perf_counter() - started)
+        logging.info(f'Updated {len(updated_groups)} groups')
+
+    async def _posting_worker(self, jobs_queue: asyncio.Queue) -> None:
+        """
+        Runs jobs of update cycle from queue until it will be cancelled
+
+        Args:
+            jobs_queue (asyncio.Queue): queue of coroutine functions
+        """
+        while True:
+            job = await jobs_queue.get()
+            try:
+                await job()
+            except Exception as e:
+                # One failed group must not break the whole update cycle
+                self.__errors_counter.inc(type=type(e).__name__)
+                logging.error(e)
+            finally:
+                jobs_queue.task_done()
+
+    async def _fetch_groups_walls(self, groups: List[DataBaseGroup], jobs_queue: asyncio.Queue, updated_groups: List[str]) -> None:
+        """
+        Gathers walls of groups by one batched request and adds jobs for updating of each group
+
+        Args:
+            groups (List[DataBaseGroup]): groups for update
+            jobs_queue (asyncio.Queue): queue of update cycle jobs
+            updated_groups (List[str]): domains of groups which received new post
+        """
+        is_incremental: bool = self.fetch_mode == 'incremental'
+        with self.__phase_duration.time(phase='vk_fetch'):
+            if self.newsfeed_reader is not None:
+                # Newsfeed gives all posts since the previous request, not the top of wall
+                walls: Dict[int, Tuple[VkPost]] = await self.newsfeed_reader.get_many_group_posts(
+                    [group.id for group in groups])
+            elif is_incremental:
+                walls = await self.vk_api_parser.get_many_new_group_posts(
+                    {group.id: group.post_date for group in groups})
+            else:
+                walls = await self.vk_api_parser.get_many_group_posts([group.id for group in groups], 4)
+        if self.polling_scheduler is not None:
+            now: float = time.time()
+            is_complete: bool = is_incremental or self.newsfeed_reader is not None
+            for group in groups:
+                self.__polling_stats.append(self.polling_scheduler.observe(
+                    group.domain, walls.get(group.id, ()), now, is_complete=is_complete))
+        update_group = self._update_group_incrementally if is_incremental else self._update_group
+        for group in groups:
+            # Skips a group if vk returned nothing from its wall
+            if not walls.get(group.id):
                 continue
-            # Update counter (needed for a pretty line in the logs)
-            update_counter += 1
-            
-            # Send post to all member of group
-            for user in group.members:
-                # Compares if the user received the same post (for example, if he recently subscribed to a group and received as an example the last post from its wall)
-                # If anyone is interested, yes, i love long line coments and code >:D
-                user_group: DataBaseUserGroup = list(filter(lambda x: x.domain == group.domain, self.database.get_user(user).groups))[0]
-                if user_group.last_update_date >= telegram_post.date:
-                    continue
-                try:
-                    await self._send_post(telegram_post.texts, telegram_post.media, user)
-                    self.database.update_user_group_date(user, group.domain, telegram_post.date)
-                except aiogram.utils.exceptions.BotBlocked:
-                    # Delete user if it stop and block bot in telegram
-                    if self.database.is_user_exists(user):
-                        logging.warning(f'Bot blocked by user {user}. The user will be deleted from the database')
-                        self.database.del_user(user)
+            jobs_queue.put_nowait(
+                lambda group=group: update_group(group, walls[group.id], updated_groups))
+
+    async def _update_group(self, group: DataBaseGroup, vk_posts: Tuple[VkPost], updated_groups: List[str]) -> None:
+        """
+        Enqueues new post of group for all its members and updates group info
+
+        Args:
+            group (DataBaseGroup): group from database
+            vk_posts (Tuple[VkPost]): received posts from group wall
+            updated_groups (List[str]): domains of groups which received new post
+        """
+        # Get post from group and parse them
+        telegram_post: TelegramPost = await self._get_post(group, vk_posts=vk_posts)
+        # Skips sending a post if it has already been sent before
+        if telegram_post.date <= group.post_date:
+            return
+        # Update counter (needed for a pretty line in the logs)
+        updated_groups.append(group.domain)
+        await self.__enqueue_post(group, telegram_post)
+        self.outbox.wake_up()
+
+    async def _update_group_incrementally(self, group: DataBaseGroup, vk_posts: Tuple[VkPost], updated_groups: List[str]) -> None:
+        """
+        Enqueues all new posts of group from the oldest, so members receive them in order of publication
 
-            self.database.update_group_info(group.domain, telegram_post.date, telegram_post.group_name)
-        logging.info(f'Updated {update_counter} groups')
+        Args:
+            group (DataBaseGroup): group from database
+            vk_posts (Tuple[VkPost]): posts published after the last seen post of group
+            updated_groups (List[str]): domains of groups which received new post
+        """
+        last_post_date: int = group.post_date
+        vk_posts = tuple(sorted(vk_posts, key=lambda post: post.id))
+        # Group without seen posts gets only its latest post like in the other fetch mode
+        if not last_post_date:
+            vk_posts = tuple(post for post in vk_posts if not post.is_pinned)[-1:]
+        for vk_post in vk_posts:
+            if vk_post.id <= last_post_date:
+                continue
+            # Each post is saved at once, so posts enqueued before an error are not sent again
+            telegram_post: TelegramPost = await self._render_post(group, vk_post, is_cached=not vk_post.is_pinned)
+            await self.__enqueue_post(group, telegram_post)
+            last_post_date = telegram_post.date
+            self.outbox.wake_up()
+        if last_post_date > group.post_date:
+            updated_groups.append(group.domain)
+
+    async def __enqueue_post(self, group: DataBaseGroup, telegram_post: TelegramPost) -> None:
+        """
+        Saves post to outbox for members of group who didn't receive it
+
+        Args:
+            group (DataBaseGroup): group from database
+            telegram_post (TelegramPost): rendered post
+        """
+        # Compares if the user received the same post (for example, if he recently subscribed to a group and received as an example the last post from its wall)
+        # If anyone is interested, yes, i love long line coments and code >:D
+        recipients: List[int] = [
+            user for user in group.members
+            # User may be deleted by other worker after group was loaded
+            if group.members_dates[user] < telegram_post.date and self.subscriptions.is_user_exists(user)
+        ]
+        # Recipients and new date of group are saved in one transaction, so after restart
+        # the post is neither lost nor enqueued again
+        with self.__phase_duration.time(phase='commit'):
+            await self.subscriptions.enqueue_post(
+                group.domain, f'{group.id}_{telegram_post.date}', encode_post(telegram_post),
+                recipients, telegram_post.date, telegram_post.group_name)
+
+    async def _deliver_outbox_item(self, item: DataBaseOutboxItem) -> bool:
+        """
+        Sends post from outbox to user
+
+        Args:
+            item (DataBaseOutboxItem): post waiting for delivery
+
+        Returns:
+            bool: False if post was dropped because user unsubscribed, already received it or blocked bot
+        """
+        # User may unsubscribe after post was enqueued
+        if not self.subscriptions.is_group_has_member(item.domain, item.user_id):
+            return False
+        # User may receive the post by manual check after it was enqueued
+        if self.subscriptions.get_last_update_date(item.user_id, item.domain) >= item.post_date:
+            return False
+        try:
+            with self.__phase_duration.time(phase='send'):
+                await self._send_post(decode_post(item.payload), item.user_id)
+        except aiogram.utils.exceptions.BotBlocked:
+            # Delete user if it stop and block bot in telegram
+            if self.subscriptions.is_user_exists(item.user_id):
+                logging.warning(f'Bot blocked by user {item.user_id}. The user will be deleted from the database')
+                await self.subscriptions.del_user(item.user_id)
+            return False
+        # User is deleted by _send_post if his chat does not exist
+        return self.subscriptions.is_user_exists(item.user_id)
 
     def run(config_file_path: str):
         """
@@ -469,12 +778,63 @@ class TelegramBot:
         telegram_token = config.get("Bot", "telegram_token")
         vk_token = config.get("Bot", "vk_token")
         database_path = config.get("Bot", "database_path")
+        update_concurrency = config.getint("Bot", "update_concurrency", fallback=4)
+        sqlite_profile: Optional[database.SqliteProfile] = None
+        if config.getboolean("Bot", "sqlite_tuning", fallback=False):
+            default_profile = database.SqliteProfile()
+            sqlite_profile = database.SqliteProfile(
+                cache_size=config.getint("Bot", "sqlite_cache_size", fallback=default_profile.cache_size),
+                mmap_size=config.getint("Bot", "sqlite_mmap_size", fallback=default_profile.mmap_size),
+                busy_timeout=config.getint("Bot", "sqlite_busy_timeout", fallback=default_profile.busy_timeout),
+            )
+
+        group_info_ttl = config.getint("Bot", "group_info_ttl", fallback=21600)
+        media_files_limit = config.getint("Bot", "media_files_limit", fallback=50000)
+        outbox_workers = config.getint("Bot", "outbox_workers", fallback=30)
+        outbox_max_attempts = config.getint("Bot", "outbox_max_attempts", fallback=10)
+        polling_scheduler: Optional[AdaptivePollingScheduler] = None
+        fetch_mode = config.get("Bot", "fetch_mode", fallback="latest")
+        if fetch_mode not in ("latest", "incremental"):
+            raise ValueError(f'Unknown fetch_mode "{fetch_mode}", use "latest" or "incremental"')
+        ingestion_engine = config.get("Bot", "ingestion_engine", fallback="wall")
+        if ingestion_engine not in ("wall", "newsfeed"):
+            raise ValueError(f'Unknown ingestion_engine "{ingestion_engine}", use "wall" or "newsfeed"')
+        polling_mode = config.get("Bot", "polling_mode", fallback="fixed")
+        if polling_mode == "adaptive":
+            polling_scheduler = AdaptivePollingScheduler(
+                update_timer,
+                min_interval=config.getint("Bot", "polling_min_interval", fallback=60),
+                max_interval=config.getint("Bot", "polling_max_interval", fallback=21600),
+            )
+        elif polling_mode != "fixed":
+            raise ValueError(f'Unknown polling_mode "{polling_mode}", use "fixed" or "adaptive"')
+        fsm_storage = config.get("Bot", "fsm_storage", fallback="memory")
+        if fsm_storage not in ("memory", "database"):
+            raise ValueError(f'Unknown fsm_storage "{fsm_storage}", use "memory" or "database"')
+        fsm_state_ttl = config.getint("Bot", "fsm_state_ttl", fallback=86400)
+        profiler = CycleProfiler(
+            directory=config.get("Bot", "profiling_dir", fallback="profiles"),
+            always=config.getboolean("Bot", "profiling", fallback=False),
+            slow_cycle_threshold=config.getfloat("Bot", "profiling_threshold", fallback=0),
+            top_count=config.getint("Bot", "profiling_top", fallback=15),
+            # Adaptive polling updates few groups each tick, so ticks of one update_timer are profiled together
+            period=update_timer if polling_mode == "adaptive" else 0,
+            report_interval=config.getint("Bot", "profiling_report_interval", fallback=3600),
+        )
+        run_mode = config.get("Bot", "run_mode", fallback="polling")
+        if run_mode not in ("polling", "webhook"):
+            raise ValueError(f'Unknown run_mode "{run_mode}", use "polling" or "webhook"')
 
         # Initialize bot class
         logging.info('Init bot class')
-        telegram_bot = TelegramBot(database_path, telegram_token, vk_token, admin_id)
+        telegram_bot = TelegramBot(database_path, telegram_token, vk_token, admin_id, update_concurrency, sqlite_profile,
+                                   group_info_ttl, update_timer, media_files_limit, outbox_workers, outbox_max_attempts,
+                                   polling_scheduler, fsm_storage, fsm_state_ttl, profiler=profiler,
+                                   fetch_mode=fetch_mode, ingestion_engine=ingestion_engine)
         loop = asyncio.get_event_loop()
         telegram_bot.loop = loop # Need for shutdown bot by method
+        loop.run_until_complete(telegram_bot.database.init())
+        loop.run_until_complete(telegram_bot.subscriptions.load())
 
         # Get bot name
         bot_info: User = loop.run_until_complete(asyncio.gather(
@@ -496,10 +856,38 @@ class TelegramBot:
         except:
             logging.warning("Bot can not send launch message to admin. It's normal if you launch bot first time and don't start chat with him")
 
-        # Launch bot poling and infinit vk parser loop
+        # Metrics are disabled by default, they should not be open to the internet
+        metrics_port = config.getint("Bot", "metrics_port", fallback=0)
+        if metrics_port:
+            telegram_bot.metrics_server = MetricsServer(telegram_bot.metrics)
+            loop.run_until_complete(telegram_bot.metrics_server.start(
+                config.get("Bot", "metrics_host", fallback="127.0.0.1"), metrics_port))
+
+        # Launch bot poling or webhook and infinit vk parser loop
         logging.info(f'Launch bot "@{bot_info.username}"')
-        loop.create_task(telegram_bot.bot_dispatcher.start_polling(timeout=40, relax=0.5))
-        loop.create_task(telegram_bot._launch_vk_update(update_timer))
+        if run_mode == "webhook":
+            webhook_secret = config.get("Bot", "webhook_secret", fallback="") or None
+            telegram_bot.webhook_server = WebhookServer(
+                telegram_bot.bot_dispatcher,
+                path=config.get("Bot", "webhook_path", fallback="/webhook"),
+                secret=webhook_secret,
+                concurrency=config.getint("Bot", "webhook_concurrency", fallback=100),
+            )
+            loop.run_until_complete(telegram_bot.webhook_server.start(
+                config.get("Bot", "webhook_host", fallback="0.0.0.0"),
+                config.getint("Bot", "webhook_port", fallback=8080),
+            ))
+            loop.run_until_complete(telegram_bot.bot_api.set_webhook(
+                config.get("Bot", "webhook_url"), secret_token=webhook_secret))
+        else:
+            # Telegram doesn't give updates by polling while webhook is set
+            loop.run_until_complete(telegram_bot.bot_api.delete_webhook())
+            loop.create_task(telegram_bot.bot_dispatcher.start_polling(timeout=40, relax=0.5))
+        loop.create_task(telegram_bot.outbox.run())
+        if telegram_bot.polling_scheduler is None:
+            loop.create_task(telegram_bot._launch_vk_update(update_timer))
+        else:
+            loop.create_task(telegram_bot._launch_adaptive_vk_update())
         loop.run_forever()
 
     async def _launch_vk_update(self, update_timer: int):
@@ -514,7 +902,7 @@ class TelegramBot:
             try:
                 # Run update. Check all vk groups, parse and send to users to telegram
                 logging.info("Update...")
-                await self.posting()    
+                await self._profiled_posting()
                 # Calc time of next update
                 next_update_time = datetime.fromtimestamp(time.time() + update_timer).time()
                 logging.info(f"Next update in '{next_update_time.hour}:{next_update_time.minute}:{next_update_time.second}'")
@@ -524,6 +912,66 @@ class TelegramBot:
                 # I don't remember why it's needed. But I'll leave it just in case.
                 logging.error(e)
 
+    async def _profiled_posting(self, domains: Optional[List[str]] = None) -> None:
+        """
+        Runs update cycle through profiler and sends summary of profile to admin if cycle was profiled
+
+        Args:
+            domains (Optional[List[str]], optional): groups for update, all groups if None. Defaults to None.
+        """
+        report: Optional[ProfileReport] = await self.profiler.run(lambda: self.posting(domains))
+        # Profiles made by settings are reported rarely, the others are only saved
+        if report is None or not self.profiler.should_report(report):
+            return
+        text: str = f'Профиль обновлений ({report.cycles_count}) за {report.duration:.1f} с '\
+                    f'сохранен в {renderer.escape(report.path)}\n<pre>'
+        # Summary is cut by lines to fit in one message
+        for line in report.summary.splitlines():
+            escaped_line: str = renderer.escape(line) + '\n'
+            if len(text) + len(escaped_line) > self.post_char_limit:
+                break
+            text += escaped_line
+        try:
+            await self.delivery.send(
+                self.admin_id, lambda: self.bot_api.send_message(self.admin_id, text + '</pre>', 'HTML'),
+                DeliveryScheduler.PRIORITY_INTERACTIVE)
+        except aiogram.utils.exceptions.TelegramAPIError as e:
+            logging.warning(f"Can't send profile to admin: {e}")
+
+    async def _launch_adaptive_vk_update(self) -> None:
+        """
+        Launch update process where each group is polled on its own interval chosen by polling scheduler
+        """
+        self.polling_scheduler.load(await self.database.get_group_stats(), time.time())
+        while True:
+            try:
+                now: float = time.time()
+                # Follows groups added and deleted by users
+                domains: set = self.subscriptions.get_all_domains()
+                for domain in domains.difference(self.polling_scheduler.stats):
+                    self.polling_scheduler.add(domain, now)
+                for domain in set(self.polling_scheduler.stats).difference(domains):
+                    self.polling_scheduler.remove(domain)
+
+                due_domains: List[str] = self.polling_scheduler.pop_due(now)
+                if due_domains:
+                    logging.info(f"Update {len(due_domains)} groups...")
+                    try:
+                        await self._profiled_posting(due_domains)
+                    finally:
+                        # Groups which were not polled because of errors are polled again after their usual interval
+                        for domain in due_domains:
+                            if domain in self.polling_scheduler and self.polling_scheduler.stats[domain].next_poll_at <= now:
+                                self.__polling_stats.append(self.polling_scheduler.observe(domain, (), now))
+                    stats, self.__polling_stats = self.__polling_stats, list()
+                    await self.database.save_group_stats(
+                        [group_stats for group_stats in stats if group_stats.domain in self.polling_scheduler])
+            except Exception as e:
+                logging.error(e)
+            next_poll_time: Optional[int] = self.polling_scheduler.get_next_poll_time()
+            delay: float = self.polling_tick if next_poll_time is None else next_poll_time - time.time()
+            await asyncio.sleep(min(max(delay, 1), self.polling_tick))
+
     async def __on_command_announce(self, message: types.Message, state: FSMContext):
         """
         Launch when admin type command /announce for sending message to all bot users
@@ -539,10 +987,11 @@ class TelegramBot:
             announcement = message
 
         if announcement is not None:
-            announce_copy = await announcement.send_copy(self.admin_id) # Send admin example of announcment message
-            await announce_copy.reply(
+            announce_copy = await self.delivery.send( # Send admin example of announcment message
+                self.admin_id, lambda: announcement.send_copy(self.admin_id), DeliveryScheduler.PRIORITY_INTERACTIVE)
+            await self._reply(announce_copy,
                 "Вы уверены что хотите отправить это сообщение всем своим пользователям?", 
-                reply_markup=Keyboard.yes_or_no)
+                reply_markup=Keyboard.yes_or_no, reply=True)
 
             async with state.proxy() as data:
                 data['announce_id'] = announce_copy.message_id # Save id of announcement copy msg
@@ -550,7 +999,7 @@ class TelegramBot:
             return
 
         # If admin enter command withoud arguments and reply
-        await message.answer('Ожидаю текста для рассылки', reply_markup=Keyboard.cancel)
+        await self._reply(message, 'Ожидаю текста для рассылки', reply_markup=Keyboard.cancel)
         await States.pre_announcement.set()
 
     async def __on_state_announcement(self, message: types.Message, state: FSMContext):
@@ -562,31 +1011,49 @@ class TelegramBot:
             state (FSMContext): bot state
         """
         if message.text.lower() == "да": # If admin tap on yes button
-            await message.answer("Отправляю", reply_markup=Keyboard.cancel)
+            await self._reply(message, "Отправляю", reply_markup=Keyboard.cancel)
 
             # Get id of announcement message
             async with state.proxy() as data:
                 announce_msg_id: int = data['announce_id'] 
 
             # Get list of all users in database
-            users: List[DataBaseUser] = self.database.get_all_users()
-            counter: int = 0 # Create counter for log
-            for user in users:
-                if user.user_id == self.admin_id:
-                    continue # Skip send announce to admin
-                try:
-                    # Sends a full copy of the message to the user on behalf of the bot
-                    await self.bot_api.copy_message(user.user_id, self.admin_id, announce_msg_id)
-                    counter += 1
-                except:
-                    logging.error(f'Cant send to {user.user_id}')
-            await message.answer("Отправленно", reply_markup=Keyboard.main_menu)
+            users_ids: List[int] = self.subscriptions.get_all_users_ids()
+            # Sends a full copy of the message to the users on behalf of the bot.
+            # Delivery scheduler keeps rate limits, so all copies are scheduled at once
+            results: List[bool] = await asyncio.gather(*(
+                self.__send_announcement(user_id, announce_msg_id)
+                for user_id in users_ids if user_id != self.admin_id # Skip send announce to admin
+            ))
+            counter: int = results.count(True) # Create counter for log
+            await self._reply(message, "Отправленно", reply_markup=Keyboard.main_menu)
             logging.info(f"Send announcement to {counter} users")
 
         else: # If admin send no or somthing else 
-            await message.answer("Отмена", reply_markup=Keyboard.main_menu)
+            await self._reply(message, "Отмена", reply_markup=Keyboard.main_menu)
         await state.finish()
 
+    async def __send_announcement(self, user_id: int, announce_msg_id: int) -> bool:
+        """
+        Sends a copy of announcement message to user
+
+        Args:
+            user_id (int): id of user
+            announce_msg_id (int): id of announcement message in admin chat
+
+        Returns:
+            bool: is message delivered
+        """
+        try:
+            await self.delivery.send(
+                user_id, lambda: self.bot_api.copy_message(user_id, self.admin_id, announce_msg_id))
+            return True
+        except (aiogram.utils.exceptions.BotBlocked, aiogram.utils.exceptions.ChatNotFound, aiogram.utils.exceptions.UserDeactivated):
+            logging.warning(f'Cant send to {user_id}, user is unavailable')
+        except aiogram.utils.exceptions.TelegramAPIError as e:
+            logging.error(f'Cant send to {user_id}: {e}')
+        return False
+
     async def __on_state_pre_announcement(self, message: types.Message, state: FSMContext):
         """
         Waiting announcement from admin
@@ -595,16 +1062,17 @@ class TelegramBot:
             message (types.Message): message from admin with announcement
             state (FSMContext): bot's state
         """
-        announce_copy = await message.send_copy(message.from_user.id)
-        await announce_copy.reply(
+        announce_copy = await self.delivery.send(
+            message.from_user.id, lambda: message.send_copy(message.from_user.id), DeliveryScheduler.PRIORITY_INTERACTIVE)
+        await self._reply(announce_copy,
             "Вы уверены что хотите отправить это сообщение всем своим пользователям?", 
-            reply_markup=Keyboard.yes_or_no)
+            reply_markup=Keyboard.yes_or_no, reply=True)
 
         async with state.proxy() as data:
             data['msg_id'] = message.message_id
         await States.announcement.set()
         
-    async def _get_post(self, group: DataBaseGroup, pinned: bool = False) -> TelegramPost:
+    async def _get_post(self, group: DataBaseGroup, pinned: bool = False, vk_posts: Optional[Tuple[VkPost]] = None) -> TelegramPost:
         """
         Get post from vk via vk_parser
         if pinned is true - try get last pinned wall post
@@ -612,22 +1080,78 @@ class TelegramBot:
         Args:
             group (DataBaseGroup): a group for which you need to get a post
             pinned (bool, optional): Is it necessary to get a fastened post. Defaults to False.
+            vk_posts (Optional[Tuple[VkPost]], optional): already received group posts. Defaults to None.
 
         Returns:
             TelegramPost: Prepared for sending post
         """
-        vk_posts = self.vk_api_parser.get_group_posts(group.id, 4)
+        if vk_posts is None:
+            if not pinned:
+                # Manual checks reuse the posts received by update cycle or by other users
+                return await self.post_cache.get_or_load(group.id, lambda: self.__load_latest_post(group))
+            vk_posts = await self.vk_api_parser.get_group_posts(group.id, 4)
         vk_post: VkPost = max(vk_posts, key= lambda post: post.date)
         if pinned:
             pinned_posts = list(filter(lambda post: post.is_pinned == True, vk_posts))
             if pinned_posts:
                 vk_post = pinned_posts[0]
-        group_info: VkGroup = self.vk_api_parser.get_group_info(group.domain)
+        else:
+            # Skips rendering if the latest post is already rendered
+            cached_post: Optional[TelegramPost] = self.post_cache.get_rendered(group.id, vk_post.id)
+            if cached_post is not None:
+                return cached_post
+        return await self._render_post(group, vk_post, is_cached=not pinned)
+
+    async def _render_post(self, group: DataBaseGroup, vk_post: VkPost, is_cached: bool = True) -> TelegramPost:
+        """
+        Prepares VK post for sending
+
+        Args:
+            group (DataBaseGroup): group of post
+            vk_post (VkPost): post from VK
+            is_cached (bool, optional): saves post as the latest rendered post of group. Defaults to True.
+
+        Returns:
+            TelegramPost: Prepared for sending post
+        """
+        # Saved domain may differ from screen name of group, e.g. club123 or old name after renaming,
+        # so group is found by id which is cached by prefetch. Name from database is used if VK is unavailable
+        group_info: VkGroup = await self.vk_api_parser.get_group_info(
+            group.id or group.domain, fallback=VkGroup(group_name=group.group_name, id=group.id, domain=group.domain))
         full_group_name: str = group_info.group_name
-        post_text, post_media = self._generate_post(vk_post, full_group_name)
-        limit = self.capture_char_limit if post_media.media else self.post_char_limit # Char limits of tg bot api
-        splited_post_text: List[str] = split_text(post_text, limit, self.post_char_limit)
-        return TelegramPost(vk_post.id, full_group_name, splited_post_text, post_media)
+        with self.__phase_duration.time(phase='render'):
+            post_text, post_photos = self._generate_post(vk_post, full_group_name)
+            limit = self.capture_char_limit if post_photos else self.post_char_limit # Char limits of tg bot api
+            splited_post_text: Tuple[str, ...] = tuple(split_text(post_text, limit, self.post_char_limit))
+        telegram_post = TelegramPost(vk_post.id, full_group_name, splited_post_text, post_photos)
+        if is_cached:
+            self.post_cache.put(group.id, telegram_post)
+        return telegram_post
+
+    async def __load_latest_post(self, group: DataBaseGroup) -> TelegramPost:
+        """
+        Receives wall of group and prepares its latest post
+
+        Args:
+            group (DataBaseGroup): a group for which you need to get a post
+
+        Returns:
+            TelegramPost: Prepared for sending post
+        """
+        vk_posts: Tuple[VkPost] = await self.vk_api_parser.get_group_posts(group.id, 4)
+        return await self._get_post(group, vk_posts=vk_posts)
+
+    async def __on_command_profile(self, message: types.Message) -> None:
+        """
+        Profiles next update cycles, count of cycles may be given as argument of command
+
+        Args:
+            message (types.Message): message from admin with /profile command
+        """
+        argument: str = message.get_args().strip()
+        cycles_count: int = int(argument) if argument.isdigit() and int(argument) > 0 else 1
+        self.profiler.request(cycles_count)
+        await self._reply(message, f"Профилирую следующие обновления: {cycles_count}. Отчет придет в этот чат")
 
     async def __on_command_shutdown(self, message: types.Message) -> None:
         """
@@ -636,17 +1160,25 @@ class TelegramBot:
         Args:
             message (types.Message): message from admin
         """
-        await message.reply("Вы точно уверены?", reply_markup=Keyboard.yes_or_no)
+        await self._reply(message, "Вы точно уверены?", reply_markup=Keyboard.yes_or_no, reply=True)
         await States.shutdown.set()
         
     
     async def __on_shutdown_state(self, message: types.Message, state: FSMContext) -> None:
         if message.text.lower() != "да":
-            await message.answer("Отмена", reply_markup=Keyboard.main_menu)
+            await self._reply(message, "Отмена", reply_markup=Keyboard.main_menu)
         else:
             # Stop and close infinit loop from run method
-            await message.answer("Отключаюсь", reply_markup=Keyboard.main_menu)
+            await self._reply(message, "Отключаюсь", reply_markup=Keyboard.main_menu)
             logging.info("Bot stopping by admin command")
+            if self.webhook_server is not None:
+                await self.webhook_server.close()
+            await self.vk_api_parser.close()
+            await self.outbox.close()
+            if self.metrics_server is not None:
+                await self.metrics_server.close()
+            await self.delivery.close()
+            await self.database.close()
             self.loop.stop()
             self.loop.close()
         await state.finish()
@@ -658,7 +1190,7 @@ class TelegramBot:
         Args:
             message (types.Message): message from user
         """
-        user_info: DataBaseUser = self.database.get_user(message.from_user.id)
+        user_info: DataBaseUser = self.subscriptions.get_user(message.from_user.id)
         msg_text: str = f"Привет {message.from_user.first_name}!\nВот какую информацию я храню о тебе \n"
         msg_text += f"Айди пользователя: {user_info.user_id} - Уникальный для каждого, с помощью него я могу писать тебе и могу получить никнейм, информацию в 'о себе', фото профиля и тд.\n"
         msg_text += f"Список 'доменов' групп и дата их последнего обновления:\n"
@@ -666,7 +1198,7 @@ class TelegramBot:
         for i, group in enumerate(user_info.groups, 1):
             msg_text += f"{i}. {group.domain} | {group.last_update_date}\n"
         msg_text += "И на этом все"
-        await message.answer(msg_text)
+        await self._reply(message, msg_text)
 
     async def __on_command_reset(self, message: types.Message) -> None:
         """
@@ -675,11 +1207,11 @@ class TelegramBot:
         Args:
             message (types.Message): message from user
         """
-        if self.database.is_user_exists(message.from_user.id):
-            await message.reply("Вы уверены что хотите удалить информацию о себе? Это сбросит все ваши подписки и удалит вас из бота.", reply_markup=Keyboard.yes_or_no)
+        if self.subscriptions.is_user_exists(message.from_user.id):
+            await self._reply(message, "Вы уверены что хотите удалить информацию о себе? Это сбросит все ваши подписки и удалит вас из бота.", reply_markup=Keyboard.yes_or_no, reply=True)
             await States.reset.set()
         else:
-            await message.reply("Вы и так не являетесь пользователем бота, мне нечего удалять")
+            await self._reply(message, "Вы и так не являетесь пользователем бота, мне нечего удалять", reply=True)
 
     async def __on_reset_state(self, message: types.Message, state: FSMContext) -> None:
         """
@@ -690,13 +1222,13 @@ class TelegramBot:
             state (FSMContext): state of bot
         """
         if message.text.lower() == "да":
-            user_groups = self.database.get_user(message.from_user.id).groups
+            user_groups = self.subscriptions.get_user(message.from_user.id).groups
             for group in user_groups:
-                self.database.del_member_of_group(group.domain, message.from_user.id)
-            self.database.del_user(message.from_user.id)
-            await message.answer("Готово", reply_markup=Keyboard.main_menu)
+                await self.subscriptions.del_member_of_group(group.domain, message.from_user.id)
+            await self.subscriptions.del_user(message.from_user.id)
+            await self._reply(message, "Готово", reply_markup=Keyboard.main_menu)
         else:
-            await message.answer("Отмена", reply_markup=Keyboard.main_menu)
+            await self._reply(message, "Отмена", reply_markup=Keyboard.main_menu)
         await state.finish()
 
 
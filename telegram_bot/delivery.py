@@ -0,0 +1,327 @@
+import asyncio
+import collections
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from aiogram.utils.exceptions import RetryAfter
+
+from modules.metrics import MetricsRegistry
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Tokens may be reserved in advance,
+    so each caller gets own delay and callers are served in order of reservation
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Constructor
+
+        Args:
+            rate (float): count of tokens added per second
+            capacity (float): max count of stored tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at: float = 0
+        # Time of event loop when the last pause ends
+        self.paused_until: float = 0
+
+    def reserve(self, now: float) -> float:
+        """
+        Takes one token
+
+        Args:
+            now (float): current time of event loop
+
+        Returns:
+            float: delay in seconds after which the token may be used
+        """
+        self.__refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    def pause(self, seconds: float, now: float) -> None:
+        """
+        Don't give out tokens for some time
+
+        Args:
+            seconds (float): duration of pause
+            now (float): current time of event loop
+        """
+        self.__refill(now)
+        # Next reserved token will be available right after the pause,
+        # tokens reserved further than the pause are kept, so several pauses don't add up
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def refund(self, now: float) -> None:
+        """
+        Returns reserved token which was not used
+
+        Args:
+            now (float): current time of event loop
+        """
+        self.__refill(now)
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_idle(self, now: float) -> bool:
+        """
+        Checks that bucket is full and may be dropped without losing its state
+
+        Args:
+            now (float): current time of event loop
+        """
+        self.__refill(now)
+        return self.tokens >= self.capacity
+
+    def __refill(self, now: float) -> None:
+        if self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class _Delivery:
+    """
+    Request to telegram waiting in delivery queue
+    """
+
+    def __init__(self, priority: int, sequence: int, chat_id: int, request: Callable[[], Awaitable], future: asyncio.Future) -> None:
+        self.priority = priority
+        self.sequence = sequence
+        self.chat_id = chat_id
+        self.request = request
+        self.future = future
+        # Is the token of chat bucket already taken for this delivery
+        self.chat_token_reserved = False
+
+    def __lt__(self, other: '_Delivery') -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class DeliveryScheduler:
+    """
+    Sends requests to telegram with respect of global and per chat rate limits.
+    Interactive requests go ahead of bulk ones, requests answered by RetryAfter are rescheduled
+    """
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_BULK = 1
+
+    def __init__(
+        self,
+        messages_per_second: float = 30,
+        chat_messages_per_second: float = 1,
+        group_chat_messages_per_minute: float = 20,
+        chat_burst: int = 3,
+        workers_count: int = 30,
+        global_flood_chats: int = 3,
+        global_flood_window: float = 10,
+        metrics: Optional[MetricsRegistry] = None
+    ) -> None:
+        """
+        Constructor
+
+        Args:
+            messages_per_second (float, optional): global limit of bot. Defaults to 30.
+            chat_messages_per_second (float, optional): limit for private chat. Defaults to 1.
+            group_chat_messages_per_minute (float, optional): limit for group chat. Defaults to 20.
+            chat_burst (int, optional): count of messages which may be sent to one chat without delay. Defaults to 3.
+            workers_count (int, optional): max count of simultaneous requests. Defaults to 30.
+            global_flood_chats (int, optional): count of chats answered by RetryAfter within global_flood_window
+                after which all chats are paused. Defaults to 3.
+            global_flood_window (float, optional): time in seconds in which RetryAfter answers are counted. Defaults to 10.
+            metrics (Optional[MetricsRegistry], optional): registry for metrics of requests. Defaults to None.
+        """
+        self.chat_rate = chat_messages_per_second
+        self.group_chat_rate = group_chat_messages_per_minute / 60
+        self.chat_burst = chat_burst
+        self.workers_count = workers_count
+        self.global_flood_chats = global_flood_chats
+        self.global_flood_window = global_flood_window
+        self.global_bucket = TokenBucket(messages_per_second, messages_per_second)
+        self.chat_buckets: Dict[int, TokenBucket] = dict()
+        # (time of event loop, chat id) of recent RetryAfter answers
+        self.__floods: Deque[Tuple[float, int]] = collections.deque()
+        self.__sequence = itertools.count()
+        self.__queue: Optional[asyncio.PriorityQueue] = None
+        self.__workers: List[asyncio.Task] = list()
+        metrics = metrics or MetricsRegistry()
+        self.__requests_counter = metrics.counter('telegram_requests_total', 'Requests to telegram by result', ('result',))
+        self.__requests_duration = metrics.histogram('telegram_request_duration_seconds', 'Duration of requests to telegram')
+        self.__errors_counter = metrics.counter('errors_total', 'Errors by type', ('type',))
+        metrics.gauge('delivery_queue_size', 'Requests to telegram waiting in queue').set_function(lambda: self.queue_size)
+
+    @property
+    def queue_size(self) -> int:
+        """
+        Count of requests waiting in queue
+        """
+        return 0 if self.__queue is None else self.__queue.qsize()
+
+    async def send(self, chat_id: int, request: Callable[[], Awaitable], priority: int = PRIORITY_BULK) -> Any:
+        """
+        Schedules request to telegram and waits its result
+
+        Args:
+            chat_id (int): id of chat which receives message
+            request (Callable[[], Awaitable]): function which makes request, e.g. lambda: bot.send_message(...)
+            priority (int, optional): PRIORITY_INTERACTIVE or PRIORITY_BULK. Defaults to PRIORITY_BULK.
+
+        Returns:
+            Any: result of request
+        """
+        self.__start()
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.__queue.put_nowait(_Delivery(priority, next(self.__sequence), chat_id, request, future))
+        return await future
+
+    async def close(self) -> None:
+        """
+        Stop workers. Requests left in queue are not sent
+        """
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+        self.__workers.clear()
+
+    def __start(self) -> None:
+        """
+        Starts workers on first request inside running event loop
+        """
+        if self.__workers:
+            return
+        self.__queue = asyncio.PriorityQueue()
+        self.__workers = [asyncio.create_task(self.__worker()) for _ in range(self.workers_count)]
+
+    async def __worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            delivery: Optional[_Delivery] = await self.__queue.get()
+            if not self.__is_ready(delivery):
+                continue
+
+            delay: float = self.global_bucket.reserve(loop.time())
+            while delay > 0:
+                # Global token is waited before the delivery is chosen,
+                # so interactive requests which come during the wait go ahead of bulk ones
+                self.__queue.put_nowait(delivery)
+                await asyncio.sleep(delay)
+                delivery = self.__get_ready_nowait()
+                if delivery is None:
+                    # Other workers took the deliveries, the token is left for them
+                    self.global_bucket.refund(loop.time())
+                    break
+                # Bot wide flood wait may start during the wait
+                delay = self.global_bucket.paused_until - loop.time()
+            if delivery is None:
+                continue
+
+            started: float = loop.time()
+            try:
+                result: Any = await delivery.request()
+            except asyncio.CancelledError:
+                delivery.future.cancel()
+                raise
+            except Exception as exception:
+                self.__count_request(type(exception).__name__, started)
+                self.__fail(delivery, exception)
+            else:
+                self.__count_request('ok', started)
+                if not delivery.future.done():
+                    delivery.future.set_result(result)
+
+    def __is_ready(self, delivery: _Delivery) -> bool:
+        """
+        Checks that delivery may be sent now. Delivery is delayed without blocking worker if chat limit is reached
+
+        Args:
+            delivery (_Delivery): delivery taken from queue
+
+        Returns:
+            bool: False if caller is cancelled or delivery is returned to queue after delay
+        """
+        if delivery.future.done():
+            return False
+        if not delivery.chat_token_reserved:
+            delivery.chat_token_reserved = True
+            loop = asyncio.get_running_loop()
+            delay: float = self.__get_chat_bucket(delivery.chat_id).reserve(loop.time())
+            if delay > 0:
+                loop.call_later(delay, self.__queue.put_nowait, delivery)
+                return False
+        return True
+
+    def __get_ready_nowait(self) -> Optional[_Delivery]:
+        """
+        Return the most urgent delivery which may be sent now or None if there is no such delivery
+        """
+        while not self.__queue.empty():
+            delivery: _Delivery = self.__queue.get_nowait()
+            if self.__is_ready(delivery):
+                return delivery
+        return None
+
+    def __fail(self, delivery: _Delivery, exception: Exception) -> None:
+        """
+        Reschedules delivery answered by RetryAfter or passes error to caller
+
+        Args:
+            delivery (_Delivery): failed delivery
+            exception (Exception): error of request
+        """
+        self.__errors_counter.inc(type=type(exception).__name__)
+        if isinstance(exception, RetryAfter):
+            logging.warning(f'Flood control for chat {delivery.chat_id}, retry in {exception.timeout} seconds')
+            now: float = asyncio.get_running_loop().time()
+            self.__get_chat_bucket(delivery.chat_id).pause(exception.timeout, now)
+            if self.__is_global_flood(delivery.chat_id, now):
+                logging.warning(f'Flood control for several chats, all chats are paused for {exception.timeout} seconds')
+                self.global_bucket.pause(exception.timeout, now)
+            # Delivery will wait the end of pause on the next reservation of chat token
+            delivery.chat_token_reserved = False
+            self.__queue.put_nowait(delivery)
+        elif not delivery.future.done():
+            delivery.future.set_exception(exception)
+
+    def __is_global_flood(self, chat_id: int, now: float) -> bool:
+        """
+        Checks that flood control is bot wide. Limit of one chat pauses only this chat,
+        but RetryAfter in several chats at once means that the global limit is reached
+
+        Args:
+            chat_id (int): id of chat answered by RetryAfter
+            now (float): current time of event loop
+        """
+        self.__floods.append((now, chat_id))
+        while self.__floods[0][0] < now - self.global_flood_window:
+            self.__floods.popleft()
+        return len({flood_chat_id for _, flood_chat_id in self.__floods}) >= self.global_flood_chats
+
+    def __count_request(self, result: str, started: float) -> None:
+        self.__requests_counter.inc(result=result)
+        self.__requests_duration.observe(asyncio.get_running_loop().time() - started)
+
+    def __get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        """
+        Return rate limiter of chat. Drops limiters of idle chats to keep memory flat
+
+        Args:
+            chat_id (int): id of chat
+        """
+        bucket: Optional[TokenBucket] = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= 10000:
+                now: float = asyncio.get_running_loop().time()
+                self.chat_buckets = {
+                    id: bucket for id, bucket in self.chat_buckets.items() if not bucket.is_idle(now)
+                }
+            # Group chats have negative ids and much lower limit
+            rate: float = self.chat_rate if chat_id > 0 else self.group_chat_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
@@ -0,0 +1,119 @@
+import copy
+import logging
+import time
+from typing import AnyStr, Dict, Optional, Union
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from data_classes import DataBaseFsmRecord
+from modules.database import AsyncDatabase
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    FSM storage in bot's database. States survive restarts and may be shared by several processes of bot.
+    States which were not changed during ttl are expired and deleted from time to time
+    """
+
+    def __init__(self, database: AsyncDatabase, state_ttl: int = 86400, cleanup_interval: int = 600) -> None:
+        """
+        Constructor
+
+        Args:
+            database (AsyncDatabase): bot's database
+            state_ttl (int, optional): time in seconds after which unchanged state is expired. Defaults to 86400.
+            cleanup_interval (int, optional): min time in seconds between deletions of expired states. Defaults to 600.
+        """
+        self.database = database
+        self.state_ttl = state_ttl
+        self.cleanup_interval = cleanup_interval
+        self.__last_cleanup: float = 0
+
+    async def close(self) -> None:
+        # Database is closed by bot
+        pass
+
+    async def wait_closed(self) -> None:
+        pass
+
+    async def get_state(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                        default: Optional[str] = None) -> Optional[str]:
+        record: Optional[DataBaseFsmRecord] = await self.__get_record(chat, user)
+        if record is None:
+            return self.resolve_state(default)
+        return record.state
+
+    async def get_data(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                       default: Optional[Dict] = None) -> Dict:
+        record: Optional[DataBaseFsmRecord] = await self.__get_record(chat, user)
+        if record is None:
+            return copy.deepcopy(default or {})
+        return record.data
+
+    async def set_state(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                        state: Optional[AnyStr] = None) -> None:
+        record: DataBaseFsmRecord = await self.__get_or_create_record(chat, user)
+        record.state = self.resolve_state(state)
+        await self.__save(record)
+
+    async def set_data(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                       data: Dict = None) -> None:
+        record: DataBaseFsmRecord = await self.__get_or_create_record(chat, user)
+        record.data = copy.deepcopy(data or {})
+        await self.__save(record)
+
+    async def update_data(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                          data: Dict = None, **kwargs) -> None:
+        record: DataBaseFsmRecord = await self.__get_or_create_record(chat, user)
+        record.data.update(data or {}, **kwargs)
+        await self.__save(record)
+
+    async def reset_state(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                          with_data: Optional[bool] = True) -> None:
+        record: DataBaseFsmRecord = await self.__get_or_create_record(chat, user)
+        record.state = None
+        if with_data:
+            record.data = dict()
+        await self.__save(record)
+
+    def has_bucket(self) -> bool:
+        return True
+
+    async def get_bucket(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                         default: Optional[dict] = None) -> Dict:
+        record: Optional[DataBaseFsmRecord] = await self.__get_record(chat, user)
+        if record is None:
+            return copy.deepcopy(default or {})
+        return record.bucket
+
+    async def set_bucket(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                         bucket: Dict = None) -> None:
+        record: DataBaseFsmRecord = await self.__get_or_create_record(chat, user)
+        record.bucket = copy.deepcopy(bucket or {})
+        await self.__save(record)
+
+    async def update_bucket(self, *, chat: Union[str, int, None] = None, user: Union[str, int, None] = None,
+                            bucket: Dict = None, **kwargs) -> None:
+        record: DataBaseFsmRecord = await self.__get_or_create_record(chat, user)
+        record.bucket.update(bucket or {}, **kwargs)
+        await self.__save(record)
+
+    async def __get_record(self, chat: Union[str, int, None], user: Union[str, int, None]) -> Optional[DataBaseFsmRecord]:
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        return await self.database.get_fsm_record(chat, user, int(time.time() - self.state_ttl))
+
+    async def __get_or_create_record(self, chat: Union[str, int, None], user: Union[str, int, None]) -> DataBaseFsmRecord:
+        record: Optional[DataBaseFsmRecord] = await self.__get_record(chat, user)
+        if record is None:
+            chat, user = map(str, self.check_address(chat=chat, user=user))
+            record = DataBaseFsmRecord(chat, user)
+        return record
+
+    async def __save(self, record: DataBaseFsmRecord) -> None:
+        await self.database.save_fsm_record(record)
+        now: float = time.time()
+        if now - self.__last_cleanup >= self.cleanup_interval:
+            self.__last_cleanup = now
+            deleted_count: int = await self.database.del_expired_fsm_records(int(now - self.state_ttl))
+            if deleted_count:
+                logging.info(f'Deleted {deleted_count} expired FSM states')
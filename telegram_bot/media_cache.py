@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from modules.database import AsyncDatabase
+
+
+class MediaFileCache:
+    """
+    Telegram file ids of already uploaded VK photos.
+    Photo sent by file id is not downloaded by Telegram from VK again.
+    Recently used file ids are kept in memory, all of them are saved in database,
+    so they survive restarts
+    """
+
+    def __init__(self, database: Optional[AsyncDatabase] = None, max_size: int = 50000, memory_size: int = 5000) -> None:
+        """
+        Constructor
+
+        Args:
+            database (Optional[AsyncDatabase], optional): persistent storage of file ids. Defaults to None.
+            max_size (int, optional): max count of file ids saved in database. Defaults to 50000.
+            memory_size (int, optional): max count of file ids kept in memory. Defaults to 5000.
+        """
+        self.database = database
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.hits: int = 0
+        self.misses: int = 0
+        # key of photo -> telegram file id
+        self.__file_ids: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__file_ids)
+
+    async def get_many(self, photo_keys: List[str]) -> Dict[str, str]:
+        """
+        Return telegram file ids of uploaded photos, looks in database for photos missing in memory
+
+        Args:
+            photo_keys (List[str]): keys of VK photos
+
+        Returns:
+            Dict[str, str]: telegram file ids by keys of found photos
+        """
+        file_ids: Dict[str, str] = dict()
+        missing_keys: List[str] = list()
+        for photo_key in photo_keys:
+            file_id: Optional[str] = self.__file_ids.get(photo_key)
+            if file_id is None:
+                missing_keys.append(photo_key)
+                continue
+            self.__file_ids.move_to_end(photo_key)
+            file_ids[photo_key] = file_id
+        if missing_keys and self.database is not None:
+            saved_file_ids: Dict[str, str] = await self.database.get_media_files(missing_keys)
+            self.__remember(saved_file_ids)
+            file_ids.update(saved_file_ids)
+        self.hits += len(file_ids)
+        self.misses += len(photo_keys) - len(file_ids)
+        return file_ids
+
+    async def put_many(self, file_ids: Dict[str, str]) -> None:
+        """
+        Saves telegram file ids of uploaded photos
+
+        Args:
+            file_ids (Dict[str, str]): telegram file ids by keys of VK photos
+        """
+        if not file_ids:
+            return
+        self.__remember(file_ids)
+        if self.database is not None:
+            await self.database.save_media_files(file_ids, self.max_size)
+
+    def __remember(self, file_ids: Dict[str, str]) -> None:
+        for photo_key, file_id in file_ids.items():
+            self.__file_ids[photo_key] = file_id
+            self.__file_ids.move_to_end(photo_key)
+        while len(self.__file_ids) > self.memory_size:
+            self.__file_ids.popitem(last=False)
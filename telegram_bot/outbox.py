@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from data_classes import DataBaseOutboxItem, TelegramPost, VkPhoto
+from modules.database import AsyncDatabase
+from modules.metrics import MetricsRegistry
+
+
+def encode_post(telegram_post: TelegramPost) -> str:
+    """
+    Serializes rendered post for outbox
+
+    Args:
+        telegram_post (TelegramPost): rendered post
+
+    Returns:
+        str: json payload
+    """
+    return json.dumps({
+        'date': telegram_post.date,
+        'group_name': telegram_post.group_name,
+        'texts': list(telegram_post.texts),
+        'photos': [[photo.url, photo.key] for photo in telegram_post.photos],
+    }, ensure_ascii=False)
+
+
+@functools.lru_cache(maxsize=256)
+def decode_post(payload: str) -> TelegramPost:
+    """
+    Restores rendered post from outbox. Post is immutable, so recipients of the same post share one object
+
+    Args:
+        payload (str): json payload
+
+    Returns:
+        TelegramPost: rendered post
+    """
+    data: dict = json.loads(payload)
+    return TelegramPost(
+        data['date'], data['group_name'], tuple(data['texts']),
+        tuple(VkPhoto(url, key) for url, key in data['photos'])
+    )
+
+
+class OutboxConsumer:
+    """
+    Sends posts from persistent outbox by a pool of workers.
+    Posts are leased while being sent and are taken again after crash, so delivery is at least once.
+    Only the oldest post of user is taken, so user receives posts in order of enqueuing.
+    Failed posts are retried with exponential backoff
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        deliver: Callable[[DataBaseOutboxItem], Awaitable[bool]],
+        on_delivered: Callable[[str, List[int], int], Awaitable],
+        workers_count: int = 30,
+        batch_size: int = 100,
+        lease_time: int = 600,
+        poll_interval: float = 5,
+        max_attempts: int = 10,
+        retry_delay: int = 5,
+        max_retry_delay: int = 3600,
+        cleanup_interval: int = 3600,
+        metrics: Optional[MetricsRegistry] = None
+    ) -> None:
+        """
+        Constructor
+
+        Args:
+            database (AsyncDatabase): database with outbox
+            deliver (Callable[[DataBaseOutboxItem], Awaitable[bool]]): sends post, returns False if post was dropped
+                without delivery (e.g. user unsubscribed), raises exception if post must be retried
+            on_delivered (Callable[[str, List[int], int], Awaitable]): saves date of post delivered to users,
+                called with domain, ids of users and date of post
+            workers_count (int, optional): count of posts sent at the same time. Defaults to 30.
+            batch_size (int, optional): max count of posts taken from database at once. Defaults to 100.
+            lease_time (int, optional): time in seconds after which unfinished post is taken again. Defaults to 600.
+            poll_interval (float, optional): time in seconds between checks of outbox without wake up. Defaults to 5.
+            max_attempts (int, optional): count of attempts after which post is dropped. Defaults to 10.
+            retry_delay (int, optional): delay in seconds before the first retry, it doubles with each attempt. Defaults to 5.
+            max_retry_delay (int, optional): max delay in seconds before retry. Defaults to 3600.
+            cleanup_interval (int, optional): time in seconds between deletions of posts without recipients,
+                only posts enqueued earlier than this time are deleted. Defaults to 3600.
+            metrics (Optional[MetricsRegistry], optional): registry for metrics of deliveries. Defaults to None.
+        """
+        self.database = database
+        self.deliver = deliver
+        self.on_delivered = on_delivered
+        self.workers_count = workers_count
+        self.batch_size = batch_size
+        self.lease_time = lease_time
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.cleanup_interval = cleanup_interval
+        self.__last_cleanup: float = time.time()
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__wakeup: Optional[asyncio.Event] = None
+        self.__task: Optional[asyncio.Task] = None
+        self.__in_progress: int = 0
+        # Results of deliveries which are not saved to database yet
+        self.__delivered: List[DataBaseOutboxItem] = list()
+        self.__finished_ids: List[int] = list()
+        self.__retries: Dict[int, int] = dict()
+        metrics = metrics or MetricsRegistry()
+        self.__deliveries_counter = metrics.counter(
+            'outbox_deliveries_total', 'Posts taken from outbox by result of delivery', ('result',))
+        metrics.gauge('outbox_queue_size', 'Posts taken from outbox and waiting for worker').set_function(lambda: self.queue_size)
+        # Counting rows of outbox is a query, so the gauge is refreshed by consumer loop instead of each scrape
+        self.__pending_gauge = metrics.gauge('outbox_pending', 'Posts waiting for delivery in database outbox')
+
+    @property
+    def queue_size(self) -> int:
+        """
+        Count of posts taken from outbox and waiting for worker
+        """
+        return 0 if self.__queue is None else self.__queue.qsize()
+
+    def wake_up(self) -> None:
+        """
+        Checks outbox right now, called after enqueuing of posts
+        """
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+
+    async def run(self) -> None:
+        """
+        Releases posts leased by previous run and sends posts from outbox until close
+        """
+        self.__task = asyncio.current_task()
+        self.__queue = asyncio.Queue()
+        self.__wakeup = asyncio.Event()
+        await self.database.release_outbox()
+        workers: List[asyncio.Task] = [asyncio.create_task(self.__worker()) for _ in range(self.workers_count)]
+        try:
+            while True:
+                self.__wakeup.clear()
+                try:
+                    await self.__flush()
+                    free_count: int = self.batch_size - self.__queue.qsize()
+                    if free_count > 0:
+                        for item in await self.database.claim_outbox(free_count, self.lease_time):
+                            self.__queue.put_nowait(item)
+                    self.__pending_gauge.set(await self.database.get_outbox_size())
+                    await self.__cleanup()
+                except Exception as e:
+                    logging.error(f'Outbox error: {e}')
+                # Results are saved more often while posts are being sent
+                is_busy: bool = self.__in_progress > 0 or not self.__queue.empty()
+                try:
+                    await asyncio.wait_for(self.__wakeup.wait(), 1 if is_busy else self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Posts which were being sent stay leased and will be sent again after restart
+            try:
+                await self.__flush()
+            except Exception as e:
+                logging.error(f'Outbox error: {e}')
+
+    async def close(self) -> None:
+        """
+        Stops sending and saves results of finished deliveries
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+
+    async def __worker(self) -> None:
+        while True:
+            item: DataBaseOutboxItem = await self.__queue.get()
+            self.__in_progress += 1
+            try:
+                is_delivered: bool = await self.deliver(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.__fail(item, e)
+            else:
+                self.__finished_ids.append(item.id)
+                if is_delivered:
+                    self.__delivered.append(item)
+                self.__deliveries_counter.inc(result='delivered' if is_delivered else 'dropped')
+            finally:
+                self.__in_progress -= 1
+            if self.__queue.empty() or len(self.__finished_ids) + len(self.__retries) >= self.batch_size:
+                self.__wakeup.set()
+
+    def __fail(self, item: DataBaseOutboxItem, exception: Exception) -> None:
+        """
+        Schedules next attempt of failed post or drops it after max attempts
+
+        Args:
+            item (DataBaseOutboxItem): failed post
+            exception (Exception): error of delivery
+        """
+        if item.attempts + 1 >= self.max_attempts:
+            logging.error(f'Post {item.post_key} is not delivered to user {item.user_id} after {item.attempts + 1} attempts: {exception}')
+            self.__finished_ids.append(item.id)
+            self.__deliveries_counter.inc(result='failed')
+            return
+        self.__deliveries_counter.inc(result='retry')
+        delay: int = min(self.retry_delay * 2 ** item.attempts, self.max_retry_delay)
+        logging.warning(f'Post {item.post_key} is not delivered to user {item.user_id}, retry in {delay} seconds: {exception}')
+        self.__retries[item.id] = int(time.time()) + delay
+
+    async def __cleanup(self) -> None:
+        """
+        Deletes old posts which were delivered to all recipients. It's done rarely and apart from
+        completion of deliveries, so it doesn't race with enqueuing of new recipients
+        """
+        now: float = time.time()
+        if now - self.__last_cleanup < self.cleanup_interval:
+            return
+        self.__last_cleanup = now
+        deleted_count: int = await self.database.del_unused_outbox_posts(int(now - self.cleanup_interval))
+        if deleted_count:
+            logging.info(f'Deleted {deleted_count} delivered posts from outbox')
+
+    async def __flush(self) -> None:
+        """
+        Saves results of deliveries to database in batches
+        """
+        delivered, self.__delivered = self.__delivered, list()
+        finished_ids, self.__finished_ids = self.__finished_ids, list()
+        retries, self.__retries = self.__retries, dict()
+        try:
+            # Users of the same post are saved by one query
+            posts: Dict[Tuple[str, int], List[int]] = dict()
+            for item in delivered:
+                posts.setdefault((item.domain, item.post_date), list()).append(item.user_id)
+            for (domain, post_date), user_ids in posts.items():
+                await self.on_delivered(domain, user_ids, post_date)
+            delivered = list()
+            if finished_ids:
+                await self.database.complete_outbox(finished_ids)
+                finished_ids = list()
+            if retries:
+                await self.database.reschedule_outbox(retries)
+        except Exception:
+            # Results are kept for the next flush
+            self.__delivered.extend(delivered)
+            self.__finished_ids.extend(finished_ids)
+            retries.update(self.__retries)
+            self.__retries = retries
+            raise
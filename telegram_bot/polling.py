@@ -0,0 +1,157 @@
+import heapq
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from data_classes import DataBaseGroupStats, VkPost
+
+
+class AdaptivePollingScheduler:
+    """
+    Decides when each group is polled. Poll interval of group follows the average interval
+    between its posts (exponential moving average), so active groups are polled often and quiet ones rarely.
+    Time of each poll is shifted randomly, so the load is spread evenly instead of bursts
+    """
+
+    def __init__(
+        self,
+        default_interval: float,
+        min_interval: float = 60,
+        max_interval: float = 21600,
+        poll_factor: float = 0.25,
+        smoothing: float = 0.3,
+        jitter: float = 0.1
+    ) -> None:
+        """
+        Constructor
+
+        Args:
+            default_interval (float): interval between posts of group without statistics in seconds
+            min_interval (float, optional): min interval between polls of group in seconds. Defaults to 60.
+            max_interval (float, optional): max interval between polls of group in seconds. Defaults to 21600.
+            poll_factor (float, optional): poll interval as part of interval between posts. Defaults to 0.25.
+            smoothing (float, optional): weight of the last interval in average. Defaults to 0.3.
+            jitter (float, optional): max random deviation of poll interval as part of it. Defaults to 0.1.
+        """
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.poll_factor = poll_factor
+        self.smoothing = smoothing
+        self.jitter = jitter
+        self.stats: Dict[str, DataBaseGroupStats] = dict()
+        # (time of poll, domain), entries of removed or rescheduled groups are skipped on pop
+        self.__heap: List[Tuple[int, str]] = list()
+
+    def __contains__(self, domain: str) -> bool:
+        return domain in self.stats
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def load(self, stats: Iterable[DataBaseGroupStats], now: float) -> None:
+        """
+        Loads statistics saved by previous run. Polls missed while bot was stopped are spread over the nearest interval
+
+        Args:
+            stats (Iterable[DataBaseGroupStats]): statistics of groups
+            now (float): current unix time
+        """
+        for group_stats in stats:
+            if group_stats.next_poll_at < now:
+                group_stats.next_poll_at = int(now + random.uniform(0, min(self.__get_poll_interval(group_stats, now), self.default_interval)))
+            self.stats[group_stats.domain] = group_stats
+            heapq.heappush(self.__heap, (group_stats.next_poll_at, group_stats.domain))
+
+    def add(self, domain: str, now: float) -> None:
+        """
+        Adds group without statistics, its first poll is at random time during default interval
+
+        Args:
+            domain (str): short group's name
+            now (float): current unix time
+        """
+        group_stats = DataBaseGroupStats(domain, self.default_interval, 0, int(now + random.uniform(0, self.default_interval)))
+        self.stats[domain] = group_stats
+        heapq.heappush(self.__heap, (group_stats.next_poll_at, domain))
+
+    def remove(self, domain: str) -> None:
+        self.stats.pop(domain, None)
+
+    def pop_due(self, now: float) -> List[str]:
+        """
+        Return groups which must be polled now
+
+        Args:
+            now (float): current unix time
+
+        Returns:
+            List[str]: domains of groups
+        """
+        domains: List[str] = list()
+        while self.__heap and self.__heap[0][0] <= now:
+            poll_time, domain = heapq.heappop(self.__heap)
+            if self.__is_actual(poll_time, domain):
+                domains.append(domain)
+        return domains
+
+    def get_next_poll_time(self) -> Optional[int]:
+        """
+        Return unix time of the nearest poll or None if there are no groups
+        """
+        while self.__heap and not self.__is_actual(*self.__heap[0]):
+            heapq.heappop(self.__heap)
+        return self.__heap[0][0] if self.__heap else None
+
+    def observe(self, domain: str, vk_posts: Iterable[VkPost], now: float, is_complete: bool = False) -> DataBaseGroupStats:
+        """
+        Updates average interval between posts by received wall and schedules the next poll of group
+
+        Args:
+            domain (str): short group's name
+            vk_posts (Iterable[VkPost]): received posts of group wall, empty if wall was not received
+            now (float): current unix time
+            is_complete (bool, optional): vk_posts have all posts after the last observed one. Defaults to False.
+
+        Returns:
+            DataBaseGroupStats: new statistics of group
+        """
+        group_stats: Optional[DataBaseGroupStats] = self.stats.get(domain)
+        if group_stats is None:
+            group_stats = DataBaseGroupStats(domain, self.default_interval)
+            self.stats[domain] = group_stats
+        # Pinned post may be much older than others
+        dates: List[int] = sorted(post.date for post in vk_posts if post.date and not post.is_pinned)
+        new_dates: List[int] = [date for date in dates if date > group_stats.last_post_time]
+        previous_date: int = group_stats.last_post_time
+        # Default interval is replaced by the first measured one
+        has_history: bool = group_stats.last_post_time > 0
+        # If all received posts are new, some posts between them and the last seen one may be missed
+        if new_dates and len(new_dates) == len(dates) and not is_complete:
+            previous_date = 0
+        for date in new_dates:
+            if previous_date:
+                interval: float = max(date - previous_date, 1)
+                if has_history:
+                    group_stats.interval = self.smoothing * interval + (1 - self.smoothing) * group_stats.interval
+                else:
+                    group_stats.interval = interval
+                    has_history = True
+            previous_date = date
+        if new_dates:
+            group_stats.last_post_time = new_dates[-1]
+
+        poll_interval: float = self.__get_poll_interval(group_stats, now)
+        group_stats.next_poll_at = int(now + poll_interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+        heapq.heappush(self.__heap, (group_stats.next_poll_at, domain))
+        return group_stats
+
+    def __get_poll_interval(self, group_stats: DataBaseGroupStats, now: float) -> float:
+        # Group silent longer than its average interval is considered slower
+        expected_interval: float = group_stats.interval
+        if group_stats.last_post_time:
+            expected_interval = max(expected_interval, now - group_stats.last_post_time)
+        return min(max(expected_interval * self.poll_factor, self.min_interval), self.max_interval)
+
+    def __is_actual(self, poll_time: int, domain: str) -> bool:
+        group_stats: Optional[DataBaseGroupStats] = self.stats.get(domain)
+        return group_stats is not None and group_stats.next_poll_at == poll_time
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from data_classes import TelegramPost
+
+
+class PostCache:
+    """
+    Rendered latest posts of groups shared by update cycle and manual checks.
+    Concurrent loads of the same group wait for one request instead of making own
+    """
+
+    def __init__(self, freshness: float) -> None:
+        """
+        Constructor
+
+        Args:
+            freshness (float): time in seconds while cached post is considered the latest post of group
+        """
+        self.freshness = freshness
+        self.hits: int = 0
+        self.misses: int = 0
+        # group id -> (time of saving, rendered post), post is identified by group id and its post id
+        self.__posts: Dict[int, Tuple[float, TelegramPost]] = dict()
+        self.__loading: Dict[int, asyncio.Future] = dict()
+
+    def get(self, group_id: int) -> Optional[TelegramPost]:
+        """
+        Return latest post of group if it was received during freshness window
+
+        Args:
+            group_id (int): id of vk group
+
+        Returns:
+            Optional[TelegramPost]: rendered post
+        """
+        cached: Optional[Tuple[float, TelegramPost]] = self.__posts.get(group_id)
+        if cached is None or time.monotonic() - cached[0] > self.freshness:
+            return None
+        return cached[1]
+
+    def get_rendered(self, group_id: int, post_id: int) -> Optional[TelegramPost]:
+        """
+        Return rendered post if it is still the latest post of group
+
+        Args:
+            group_id (int): id of vk group
+            post_id (int): id of the latest post on group wall
+
+        Returns:
+            Optional[TelegramPost]: rendered post
+        """
+        telegram_post: Optional[TelegramPost] = self.get(group_id)
+        if telegram_post is None or telegram_post.date != post_id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return telegram_post
+
+    def put(self, group_id: int, telegram_post: TelegramPost) -> None:
+        """
+        Saves rendered latest post of group
+
+        Args:
+            group_id (int): id of vk group
+            telegram_post (TelegramPost): rendered post
+        """
+        self.__posts[group_id] = (time.monotonic(), telegram_post)
+
+    async def get_or_load(self, group_id: int, loader: Callable[[], Awaitable[TelegramPost]]) -> TelegramPost:
+        """
+        Return fresh latest post of group or loads it. Only one load of group runs at the same time
+
+        Args:
+            group_id (int): id of vk group
+            loader (Callable[[], Awaitable[TelegramPost]]): function which receives and renders post
+
+        Returns:
+            TelegramPost: rendered post
+        """
+        telegram_post: Optional[TelegramPost] = self.get(group_id)
+        if telegram_post is not None:
+            self.hits += 1
+            return telegram_post
+        if group_id in self.__loading:
+            self.hits += 1
+            return await asyncio.shield(self.__loading[group_id])
+
+        self.misses += 1
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.__loading[group_id] = future
+        try:
+            telegram_post = await loader()
+            self.put(group_id, telegram_post)
+            future.set_result(telegram_post)
+            return telegram_post
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exception:
+            future.set_exception(exception)
+            # Retrieves exception, so asyncio doesn't log it if nobody else waits the load
+            future.exception()
+            raise
+        finally:
+            del self.__loading[group_id]
@@ -0,0 +1,163 @@
+import cProfile
+import logging
+import os
+import pstats
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from data_classes import ProfileReport
+
+# (file, line, function) -> (primitive calls, total calls, own time, cumulative time, callers)
+StatsTable = Dict[Tuple[str, int, str], Tuple[int, int, float, float, dict]]
+
+
+def summarize_stats(stats: pstats.Stats, top_count: int = 15) -> str:
+    """
+    Return top functions by own time and by cumulative time in compact text for telegram message
+
+    Args:
+        stats (pstats.Stats): collected profile
+        top_count (int, optional): count of functions in each top. Defaults to 15.
+
+    Returns:
+        str: text of summary
+    """
+    table: StatsTable = stats.stats
+    lines: List[str] = list()
+    for title, index in (('Own time', 2), ('Cumulative time', 3)):
+        lines.append(f'{title}, s | calls | function')
+        top: List[tuple] = sorted(table.items(), key=lambda item: item[1][index], reverse=True)[:top_count]
+        for (file_name, line, function), (_, calls, own_time, cumulative_time, _) in top:
+            spent_time: float = own_time if index == 2 else cumulative_time
+            lines.append(f'{spent_time:.3f} | {calls} | {_format_function(file_name, line, function)}')
+        lines.append('')
+    return '\n'.join(lines).strip()
+
+
+def _format_function(file_name: str, line: int, function: str) -> str:
+    # Built-in functions have no file
+    if file_name == '~':
+        return function
+    parts: List[str] = file_name.replace('\\', '/').split('/')
+    # Package and module are enough to find the function
+    return f'{"/".join(parts[-2:])}:{line}({function})'
+
+
+class CycleProfiler:
+    """
+    Profiles update cycles by cProfile. Cycle is profiled if profiling is always on, if admin requested it
+    or if the previous cycle was longer than threshold. Profile is saved to timestamped file.
+    Short cycles which follow each other, like ticks of adaptive polling, may be joined in one profile by period.
+    Other tasks running during the cycle, like sending of posts, are profiled too
+    """
+
+    def __init__(self, directory: str = 'profiles', always: bool = False, slow_cycle_threshold: float = 0,
+                 top_count: int = 15, period: float = 0, report_interval: float = 0) -> None:
+        """
+        Constructor
+
+        Args:
+            directory (str, optional): directory for profile files. Defaults to 'profiles'.
+            always (bool, optional): profile each cycle. Defaults to False.
+            slow_cycle_threshold (float, optional): duration of cycle in seconds after which the next cycle is profiled,
+                0 disables it. Defaults to 0.
+            top_count (int, optional): count of functions in summary. Defaults to 15.
+            period (float, optional): time in seconds during which cycles are joined in one profile,
+                0 makes profile of each cycle. Defaults to 0.
+            report_interval (float, optional): min time in seconds between reports of profiles which were not
+                requested by admin, see should_report. Defaults to 0.
+        """
+        self.directory = directory
+        self.always = always
+        self.slow_cycle_threshold = slow_cycle_threshold
+        self.top_count = top_count
+        self.period = period
+        self.report_interval = report_interval
+        # Count of next profiles which will be made
+        self.requested_count: int = 0
+        # Profile which is being collected, it's kept between cycles of one period
+        self.__profile: Optional[cProfile.Profile] = None
+        self.__started_at: float = 0
+        self.__duration: float = 0
+        self.__cycles_count: int = 0
+        self.__is_requested: bool = False
+        self.__last_report_at: Optional[float] = None
+
+    def request(self, cycles_count: int = 1) -> None:
+        """
+        Profiles next cycles, or next periods if cycles are joined by period
+
+        Args:
+            cycles_count (int, optional): count of cycles. Defaults to 1.
+        """
+        self.requested_count = max(self.requested_count, cycles_count)
+
+    async def run(self, cycle: Callable[[], Awaitable]) -> Optional[ProfileReport]:
+        """
+        Runs update cycle, profiles it if needed
+
+        Args:
+            cycle (Callable[[], Awaitable]): coroutine function of update cycle
+
+        Returns:
+            Optional[ProfileReport]: profile of cycles or None if profile is not finished or cycle was not profiled
+        """
+        if self.__profile is None and not self.always and self.requested_count <= 0:
+            started: float = time.perf_counter()
+            await cycle()
+            self.__check_duration(time.perf_counter() - started)
+            return None
+
+        if self.__profile is None:
+            self.__profile = cProfile.Profile()
+            self.__started_at = time.monotonic()
+            self.__duration = 0
+            self.__cycles_count = 0
+            self.__is_requested = self.requested_count > 0
+            self.requested_count = max(self.requested_count - 1, 0)
+        profile: cProfile.Profile = self.__profile
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            await cycle()
+        finally:
+            profile.disable()
+            self.__duration += time.perf_counter() - started
+            self.__cycles_count += 1
+            is_finished: bool = time.monotonic() - self.__started_at >= self.period
+            if is_finished:
+                report: ProfileReport = self.__save(profile)
+                self.__profile = None
+                logging.info(f'Profile of {report.cycles_count} update cycles is saved to {report.path}')
+        # Profiled cycle is slower itself, so it doesn't request the next profile
+        return report if is_finished else None
+
+    def should_report(self, report: ProfileReport) -> bool:
+        """
+        Checks that report may be sent to admin. Requested profiles are always reported, others are reported
+        not more often than report_interval. Positive answer is counted as sent report
+
+        Args:
+            report (ProfileReport): finished profile
+        """
+        now: float = time.monotonic()
+        if not report.is_requested and self.__last_report_at is not None \
+                and now - self.__last_report_at < self.report_interval:
+            return False
+        self.__last_report_at = now
+        return True
+
+    def __check_duration(self, duration: float) -> None:
+        # Slow cycle can't be profiled afterwards, so the next one is profiled
+        if self.slow_cycle_threshold and duration > self.slow_cycle_threshold:
+            logging.warning(f'Update cycle took {duration:.1f} seconds, the next cycle will be profiled')
+            self.request()
+
+    def __save(self, profile: cProfile.Profile) -> ProfileReport:
+        os.makedirs(self.directory, exist_ok=True)
+        path: str = os.path.join(self.directory, f'posting_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}.prof')
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path)
+        return ProfileReport(
+            path, self.__duration, summarize_stats(stats, self.top_count), self.__cycles_count, self.__is_requested)
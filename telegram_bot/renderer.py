@@ -0,0 +1,82 @@
+import html
+import re
+from typing import List, Match, Optional, Pattern
+
+# One pattern for all VK markup, so text is converted by a single pass
+VK_MARKUP: Pattern = re.compile(
+    # Hyper link like [id1|Pavel], [club1|VK] or [https://vk.com/dev|docs]
+    r'\[(?P<target>[^\[\]|\n]+)\|(?P<text>[^\[\]\n]*)\]'
+    # Url without trailing punctuation
+    r'|(?P<url>https?://[^\s<>"\[\]]*[^\s<>"\[\].,!?;:)\'])'
+    # Hashtag of group section like #news@vk
+    r'|(?P<hashtag>#\w+)@(?P<hashtag_domain>[\w.]+)'
+)
+
+
+def escape(text: str) -> str:
+    """
+    Escapes text for telegram HTML parse mode
+
+    Args:
+        text (str): plain text
+
+    Returns:
+        str: escaped text
+    """
+    return html.escape(text, quote=False)
+
+
+def link(url: str, text: Optional[str]) -> str:
+    """
+    Creates telegram HTML hyper link
+
+    Args:
+        url (str): target of link
+        text (Optional[str]): plain text of link, url is shown if text is empty
+
+    Returns:
+        str: html hyper link with escaped url and text
+    """
+    return f'<a href="{html.escape(url, quote=True)}">{escape(text or url)}</a>'
+
+
+def vk_url(target: str) -> str:
+    """
+    Converts target of VK hyper link to url
+
+    Args:
+        target (str): url, domain or id like id1 or club1
+
+    Returns:
+        str: url of target
+    """
+    if target.startswith(('http://', 'https://')):
+        return target
+    return f'https://vk.com/{target}'
+
+
+def render_vk_text(text: str) -> str:
+    """
+    Converts text of VK post with VK markup to escaped telegram HTML in one linear pass
+
+    Args:
+        text (str): text of VK post
+
+    Returns:
+        str: text for telegram HTML parse mode
+    """
+    parts: List[str] = list()
+    position: int = 0
+    match: Match
+    for match in VK_MARKUP.finditer(text):
+        parts.append(escape(text[position:match.start()]))
+        if match.group('target') is not None:
+            parts.append(link(vk_url(match.group('target')), match.group('text')))
+        elif match.group('url') is not None:
+            parts.append(link(match.group('url'), match.group('url')))
+        else:
+            tag: str = match.group('hashtag')[1:]
+            parts.append(link(f'https://vk.com/{match.group("hashtag_domain")}/{tag}', match.group()))
+        position = match.end()
+    parts.append(escape(text[position:]))
+    return ''.join(parts)
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Set
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Receives updates from telegram by webhook. Each update is acknowledged at once and processed in background,
+    updates of different chats are processed concurrently, updates of one chat keep their order
+    """
+
+    def __init__(self, dispatcher: Dispatcher, path: str = '/webhook', secret: Optional[str] = None, concurrency: int = 100) -> None:
+        """
+        Constructor
+
+        Args:
+            dispatcher (Dispatcher): dispatcher of bot which processes updates
+            path (str, optional): path of webhook endpoint. Defaults to '/webhook'.
+            secret (Optional[str], optional): secret token sent by telegram in header of each request. Defaults to None.
+            concurrency (int, optional): max count of updates processed at the same time. Defaults to 100.
+        """
+        self.dispatcher = dispatcher
+        self.path = path
+        self.secret = secret
+        self.concurrency = concurrency
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__runner: Optional[web.AppRunner] = None
+        self.__tasks: Set[asyncio.Task] = set()
+        # The last update of chat being processed, next update of chat waits it
+        self.__chat_tails: Dict[int, asyncio.Task] = dict()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def start(self, host: str, port: int) -> None:
+        """
+        Starts http server
+
+        Args:
+            host (str): address to listen
+            port (int): port to listen
+        """
+        self.__runner = web.AppRunner(self.make_app())
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+        logging.info(f'Webhook is listening on {host}:{port}{self.path}')
+
+    async def close(self) -> None:
+        """
+        Stops http server and waits updates being processed
+        """
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+        # Server may be closed by an update, e.g. by shutdown command, it doesn't wait itself
+        tasks: List[asyncio.Task] = [task for task in self.__tasks if task is not asyncio.current_task()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        Handler of webhook request, answers before the update is processed
+        """
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        try:
+            update = types.Update(**await request.json())
+        except (ValueError, TypeError):
+            return web.Response(status=400)
+
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.concurrency)
+        chat_id: Optional[int] = self.__get_chat_id(update)
+        previous_task: Optional[asyncio.Task] = self.__chat_tails.get(chat_id) if chat_id is not None else None
+        task: asyncio.Task = asyncio.create_task(self.__process(update, previous_task))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        if chat_id is not None:
+            self.__chat_tails[chat_id] = task
+            task.add_done_callback(lambda task: self.__forget_chat_tail(chat_id, task))
+        return web.Response()
+
+    async def __process(self, update: types.Update, previous_task: Optional[asyncio.Task]) -> None:
+        if previous_task is not None:
+            await asyncio.wait([previous_task])
+        async with self.__semaphore:
+            # Handlers get bot and dispatcher from context like in polling mode
+            Bot.set_current(self.dispatcher.bot)
+            Dispatcher.set_current(self.dispatcher)
+            try:
+                await self.dispatcher.process_update(update)
+            except Exception as e:
+                logging.error(f'Update {update.update_id} is not processed: {e}')
+
+    def __forget_chat_tail(self, chat_id: int, task: asyncio.Task) -> None:
+        if self.__chat_tails.get(chat_id) is task:
+            del self.__chat_tails[chat_id]
+
+    @staticmethod
+    def __get_chat_id(update: types.Update) -> Optional[int]:
+        message: Optional[types.Message] = update.message or update.edited_message
+        if message is not None:
+            return message.chat.id
+        if update.callback_query is not None:
+            return update.callback_query.from_user.id
+        return None
+
+
+async def replay_updates(url: str, updates: List[dict], secret: Optional[str] = None, concurrency: int = 10) -> None:
+    """
+    Posts recorded updates to webhook like telegram does, used for local testing
+
+    Args:
+        url (str): url of webhook
+        updates (List[dict]): updates in format of telegram bot api
+        secret (Optional[str], optional): secret token of webhook. Defaults to None.
+        concurrency (int, optional): count of requests at the same time. Defaults to 10.
+    """
+    headers: Dict[str, str] = {SECRET_HEADER: secret} if secret else dict()
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+    statuses: Dict[int, int] = dict()
+    latencies: List[float] = list()
+
+    async def sender(session: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            update: dict = queue.get_nowait()
+            started: float = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    started: float = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*[sender(session) for _ in range(concurrency)])
+    elapsed: float = time.perf_counter() - started
+    latencies.sort()
+    print(f'Posted {len(updates)} updates in {elapsed:.2f} s ({len(updates) / elapsed:.0f} per second), statuses {statuses}')
+    if latencies:
+        print(f'Acknowledge latency: median {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+              f'max {latencies[-1] * 1000:.1f} ms')
+
+
+def generate_updates(count: int, users_count: int) -> List[dict]:
+    """
+    Generate /start messages from different users
+
+    Args:
+        count (int): count of updates
+        users_count (int): count of users sending messages
+    """
+    updates: List[dict] = list()
+    for update_id in range(1, count + 1):
+        user_id: int = update_id % users_count + 1
+        user: dict = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+        updates.append({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+                'from': user,
+                'text': '/start',
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+            },
+        })
+    return updates
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Posts recorded telegram updates to webhook of bot')
+    parser.add_argument('updates', nargs='?', help='file with one update in json per line')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook', help='url of webhook')
+    parser.add_argument('--secret', default=None, help='secret token of webhook')
+    parser.add_argument('--generate', type=int, default=0, help='post this count of generated /start messages')
+    parser.add_argument('--users', type=int, default=100, help='count of users of generated messages')
+    parser.add_argument('--concurrency', type=int, default=10, help='count of requests at the same time')
+    args = parser.parse_args()
+
+    if args.updates:
+        with open(args.updates, encoding='utf-8') as updates_file:
+            recorded_updates: List[dict] = [json.loads(line) for line in updates_file if line.strip()]
+    else:
+        recorded_updates = generate_updates(args.generate, args.users)
+    asyncio.run(replay_updates(args.url, recorded_updates, args.secret, args.concurrency))
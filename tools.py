@@ -1,30 +1,164 @@
-from typing import List
-
-def split_text(text: str, first_limit: int, other_limits: int) -> List[str]:
-        """
-        Separates text in a post to bypass telegram character limit
-
-        Args:
-            text (str): source text for separate
-            first_limit (int): character limit for first message
-            other_limits (int): character limit for other message
-
-        Returns:
-            List[str]: _description_
-        """
-        splited_texts = list()
-        while True:
-            if splited_texts:
-                limit = other_limits
-            else:
-                limit = first_limit
-
-            if len(text) > limit:
-                space_index: int = text[:limit].rfind(' ')
-                if space_index == -1:
-                    space_index = limit # if text without spaces
-                splited_texts.append(text[:space_index])
-                text = text[space_index:].strip()
-            else:
-                splited_texts.append(text)
-                return splited_texts
\ No newline at end of file
+import re
+from typing import Iterator, Optional, Pattern, Tuple
+
+# Tag, character entity or piece of plain text of telegram HTML.
+# Length of text pieces is bounded, so a cut never scans the whole rest of text
+HTML_TOKEN: Pattern = re.compile(r'<[^<>]*>|&#?\w+;|[^<&]{1,4096}|[<&]')
+TAG_NAME: Pattern = re.compile(r'</?\s*([a-zA-Z0-9-]+)')
+WHITESPACES = ' \n\t'
+
+# Open tags as pairs of tag name and source of opening tag
+OpenTags = Tuple[Tuple[str, str], ...]
+
+
+def utf16_length(text: str) -> int:
+    """
+    Return length of text in UTF-16 code units, telegram counts limits in them
+
+    Args:
+        text (str): plain text
+    """
+    return len(text.encode('utf-16-le')) // 2
+
+
+def split_text(text: str, first_limit: int, other_limits: int) -> Iterator[str]:
+    """
+    Separates text in a post to bypass telegram character limit.
+    Text is read by offsets in one pass and messages are generated lazily.
+    Limits are counted in UTF-16 code units of visible text, so tags are free and character entity is one unit.
+    Text is never cut inside tag or entity, tags opened before a cut are closed at the end of message
+    and opened again at the beginning of next one. Cut is made on the last whitespace if possible
+
+    Args:
+        text (str): source text for separate in telegram HTML markup
+        first_limit (int): character limit for first message
+        other_limits (int): character limit for other message
+
+    Yields:
+        Iterator[str]: messages with balanced tags
+    """
+    limit: int = first_limit
+    position: int = 0
+    open_tags: OpenTags = ()
+    is_first: bool = True
+    while True:
+        end, next_position, end_open_tags, visible = _find_message_end(text, position, open_tags, limit)
+        is_last: bool = next_position >= len(text)
+        body: str = text[position:end]
+        if not is_last:
+            body = body.rstrip()
+        # Rest of text without visible characters, like closing tags, is not sent
+        if visible or is_first:
+            yield (''.join(tag for _, tag in open_tags) + body
+                   + ''.join(f'</{name}>' for name, _ in reversed(end_open_tags)))
+        if is_last:
+            return
+
+        # Whitespaces at the beginning of message are skipped
+        while next_position < len(text) and text[next_position] in WHITESPACES:
+            next_position += 1
+        if next_position >= len(text):
+            return
+        position = next_position
+        open_tags = end_open_tags
+        limit = other_limits
+        is_first = False
+
+
+def _find_message_end(text: str, start: int, open_tags: OpenTags, limit: int) -> Tuple[int, int, OpenTags, int]:
+    """
+    Finds where the message starting at the offset must be cut
+
+    Args:
+        text (str): source text in telegram HTML markup
+        start (int): offset of message beginning
+        open_tags (OpenTags): tags opened before the message
+        limit (int): limit of visible characters in UTF-16 code units
+
+    Returns:
+        Tuple[int, int, OpenTags, int]: end offset of message, offset of next message,
+        tags open at the end of message and count of visible characters (may be approximate but not zero if any)
+    """
+    visible: int = 0
+    # The last whitespace where message may be cut
+    break_end: Optional[int] = None
+    break_open_tags: OpenTags = open_tags
+
+    for match in HTML_TOKEN.finditer(text, start):
+        token: str = match.group()
+        token_start: int = match.start()
+        is_text: bool = token[0] not in '<&'
+        if len(token) > 1 and not is_text:
+            if token[0] == '<':
+                open_tags = _apply_tag(open_tags, token)
+                continue
+            units: int = 1  # Character entity
+        else:
+            units = utf16_length(token)
+
+        if visible + units <= limit:
+            if is_text:
+                whitespace: int = max(token.rfind(' '), token.rfind('\n'))
+                if whitespace != -1 and (visible or token[:whitespace].strip()):
+                    break_end = token_start + whitespace
+                    break_open_tags = open_tags
+            visible += units
+            continue
+
+        # Limit is reached inside this token
+        fit: int = 0
+        if is_text:
+            fit = _count_fitting_chars(token, limit - visible, units)
+            whitespace = max(token.rfind(' ', 0, fit + 1), token.rfind('\n', 0, fit + 1))
+            if whitespace != -1 and (visible or token[:whitespace].strip()):
+                return token_start + whitespace, token_start + whitespace + 1, open_tags, visible or 1
+        if break_end is not None:
+            return break_end, break_end + 1, break_open_tags, 1
+        if fit:
+            return token_start + fit, token_start + fit, open_tags, visible + fit
+        if not visible:
+            # Limit is less than one character, the character is sent anyway to avoid an endless loop
+            end: int = token_start + 1 if is_text else match.end()
+            return end, end, open_tags, 1
+        return token_start, token_start, open_tags, visible
+    return len(text), len(text), open_tags, visible
+
+
+def _count_fitting_chars(token: str, room: int, units: int) -> int:
+    """
+    Return count of first characters of plain text which fit in the room of UTF-16 code units
+
+    Args:
+        token (str): plain text
+        room (int): free UTF-16 code units
+        units (int): length of the whole text in UTF-16 code units
+    """
+    if units == len(token):  # No characters outside of basic plane
+        return room
+    used: int = 0
+    for index, char in enumerate(token):
+        used += 2 if ord(char) > 0xFFFF else 1
+        if used > room:
+            return index
+    return len(token)
+
+
+def _apply_tag(open_tags: OpenTags, tag: str) -> OpenTags:
+    """
+    Return open tags after the tag
+
+    Args:
+        open_tags (OpenTags): tags open before the tag
+        tag (str): source of opening or closing tag
+    """
+    name_match = TAG_NAME.match(tag)
+    if name_match is None or tag.endswith('/>'):
+        return open_tags
+    name: str = name_match.group(1).lower()
+    if not tag.startswith('</'):
+        return open_tags + ((name, tag),)
+    # Closing tag closes the nearest opening tag with the same name
+    for index in range(len(open_tags) - 1, -1, -1):
+        if open_tags[index][0] == name:
+            return open_tags[:index]
+    return open_tags